@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Async database layer benchmark
+Serves one tenant's first invoice page (the GET /invoices query: buyer joined,
+items selected in) from two otherwise identical async routes. One uses the
+synchronous Session, the way every handler used to. The other uses the
+AsyncSession from database.get_async_db. Each route is driven in-process at
+increasing numbers of in-flight requests, and the report shows throughput
+and latency.
+
+--latency-ms adds a sleep to every statement, inside the driver connection,
+standing in for the network round trip to Postgres. A blocking session holds
+the event loop for the whole round trip, so its throughput stays at the
+one-request level. Once more requests are in flight than the pool has
+connections, its checkout blocks the loop that would return them. The
+async session keeps the loop free and scales until the pool runs out. Pass
+--latency-ms 0 to measure the local SQLite file as is, or --database-url to
+run against a real Postgres.
+
+    python benchmarks/bench_async_db.py --invoices 5000 --concurrency 1 4 16 64
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+USER_ID = 900000
+PAGE_SIZE = 20
+
+
+def add_statement_latency(engine, seconds: float, is_async: bool):
+    """Sleep for ``seconds`` on every statement, on whatever thread the driver runs it."""
+    from sqlalchemy import event
+    from sqlalchemy.util import await_only
+
+    def delay(statement):
+        time.sleep(seconds)
+
+    @event.listens_for(engine, "connect")
+    def install(dbapi_connection, connection_record):
+        driver = connection_record.driver_connection
+        if is_async:
+            await_only(driver.set_trace_callback(delay))  # aiosqlite runs the callback on its own thread
+        else:
+            driver.set_trace_callback(delay)
+
+
+def build_app():
+    from fastapi import Depends, FastAPI
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.orm import Session, joinedload, selectinload
+
+    from database import get_async_db, get_db
+    from models import Invoice
+
+    def page_query():
+        return (
+            select(Invoice)
+            .where(Invoice.user_id == USER_ID)
+            .options(joinedload(Invoice.buyer), selectinload(Invoice.items))
+            .order_by(Invoice.date.desc(), Invoice.id.desc())
+            .limit(PAGE_SIZE)
+        )
+
+    app = FastAPI()
+
+    @app.get("/sync")
+    async def sync_page(db: Session = Depends(get_db)):
+        return [inv.id for inv in db.scalars(page_query()).all()]
+
+    @app.get("/async")
+    async def async_page(db: AsyncSession = Depends(get_async_db)):
+        return [inv.id for inv in (await db.scalars(page_query())).all()]
+
+    return app
+
+
+async def drive(client, path: str, concurrency: int, total: int):
+    """Issue ``total`` requests with ``concurrency`` in flight; return (requests/s, per-request seconds)."""
+    timings = []
+    remaining = iter(range(total))
+
+    async def worker():
+        for _ in remaining:
+            start = time.perf_counter()
+            resp = await client.get(path)
+            timings.append(time.perf_counter() - start)
+            assert resp.status_code == 200, resp.text
+
+    start = time.perf_counter()
+    workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        for task in workers:  # after a failure, stop the others before the next run starts
+            task.cancel()
+    return total / (time.perf_counter() - start), sorted(timings)
+
+
+async def run(args):
+    import httpx
+    from sqlalchemy.exc import TimeoutError
+
+    from database import async_engine
+
+    app = build_app()
+    transport = httpx.ASGITransport(app=app)
+    print(f"{'session':>8} {'in flight':>10} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9}")
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path in ("/sync", "/async"):
+            await client.get(path)  # warm up connections
+            for concurrency in args.concurrency:
+                try:
+                    rate, timings = await drive(client, path, concurrency, max(args.requests, concurrency * 4))
+                except TimeoutError as e:
+                    print(f"{path[1:]:>8} {concurrency:>10}   {e.code}: pool exhausted, event loop blocked")
+                    break
+                p50 = timings[len(timings) // 2] * 1000
+                p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000
+                print(f"{path[1:]:>8} {concurrency:>10} {rate:>9.1f} {p50:>9.2f} {p99:>9.2f}")
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark sync vs async sessions under concurrent requests")
+    parser.add_argument("--invoices", type=int, default=5000, help="Invoices in the benchmark tenant")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64], help="Requests in flight")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per concurrency level")
+    parser.add_argument("--latency-ms", type=float, default=2.0, help="Simulated round trip per statement (SQLite only)")
+    parser.add_argument("--database-url", default=None, help="Defaults to a scratch SQLite file")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="bench_async_")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{scratch}/bench.db"
+
+    from database import Base, DATABASE_URL, async_engine, engine
+    import models  # noqa: F401  (registers the tables on Base)
+    from bench_dashboard_summary import populate
+
+    Base.metadata.create_all(bind=engine)
+    populate(engine, USER_ID, args.invoices)
+    if args.latency_ms and DATABASE_URL.startswith("sqlite"):
+        add_statement_latency(engine, args.latency_ms / 1000, is_async=False)
+        add_statement_latency(async_engine.sync_engine, args.latency_ms / 1000, is_async=True)
+        engine.dispose()  # reconnect so the seeding connection picks up the latency too
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
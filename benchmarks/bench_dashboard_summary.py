@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Dashboard summary benchmark
+Fills a scratch database with one tenant of N invoices and reports the query
+count and wall time of dashboard.build_summary at each size.
+
+    python benchmarks/bench_dashboard_summary.py --sizes 1000 10000 100000
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def populate(engine, user_id: int, invoice_count: int, customer_count: int = 200, seed: int = 42):
+    """Bulk-insert one tenant's customers and invoices spread over the last three years"""
+    from models import Customer, Invoice, User
+
+    rng = random.Random(seed)
+    today = date.today()
+    now = datetime.utcnow()
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{"id": user_id, "cognito_sub": f"bench-{user_id}", "created_at": now, "updated_at": now}])
+        conn.execute(
+            Customer.__table__.insert(),
+            [{"user_id": user_id, "name": f"Customer {i}", "state_code": "29"} for i in range(customer_count)],
+        )
+        customer_ids = [row[0] for row in conn.exec_driver_sql(f"SELECT id FROM customers WHERE user_id = {user_id}")]
+        batch = []
+        for i in range(invoice_count):
+            inv_date = today - timedelta(days=rng.randint(0, 3 * 365))
+            total = round(rng.uniform(100, 50000), 2)
+            batch.append({
+                "user_id": user_id,
+                "invoice_number": f"BENCH-{i:07d}",
+                "financial_year": "2024-2025",
+                "date": inv_date,
+                "due_date": inv_date + timedelta(days=30),
+                "buyer_id": rng.choice(customer_ids),
+                "subtotal": total,
+                "total": total,
+                "status": rng.choices(["PAID", "UNPAID", "PARTIALLY_PAID"], weights=[70, 20, 10])[0],
+                "created_at": now,
+                "updated_at": now,
+            })
+            if len(batch) == 10000:
+                conn.execute(Invoice.__table__.insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(Invoice.__table__.insert(), batch)
+
+
+def measure(engine, session_factory, user_id: int, repeat: int):
+    """Return (queries per call, median seconds) for build_summary"""
+    from sqlalchemy import event
+    from dashboard import build_summary
+
+    queries = [0]
+
+    def count(*args, **kwargs):
+        queries[0] += 1
+
+    timings = []
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        for _ in range(repeat):
+            queries[0] = 0
+            db = session_factory()
+            start = time.perf_counter()
+            build_summary(db, user_id)
+            timings.append(time.perf_counter() - start)
+            db.close()
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    return queries[0], statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard summary")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="Invoices per tenant")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed calls per size")
+    parser.add_argument("--database-url", default=None, help="Defaults to a scratch SQLite file")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="bench_summary_")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{scratch}/bench.db"
+
+    from database import Base, SessionLocal, engine
+    import models  # noqa: F401  (registers the tables on Base)
+    from monthly_rollup import rebuild
+
+    Base.metadata.create_all(bind=engine)
+    print(f"{'invoices':>10} {'queries':>8} {'median ms':>10}")
+    for offset, size in enumerate(args.sizes):
+        user_id = 900000 + offset
+        populate(engine, user_id, size)
+        db = SessionLocal()
+        rebuild(db, user_id)  # bulk inserts bypass the handlers that maintain the rollup
+        db.close()
+        queries, seconds = measure(engine, SessionLocal, user_id, args.repeat)
+        print(f"{size:>10} {queries:>8} {seconds * 1000:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Fuzzy term lookup benchmark
+Builds a vocabulary of N words (the bundled HSN descriptions plus synthetic
+words) and corrects a stream of misspellings two ways: the SequenceMatcher
+scan suggest_hsn used to do over every word (ratio >= 0.8), and
+fuzzy_terms.FuzzyDictionary. It reports p50/p99 latency, how often the
+intended word is among the results, build time and memory.
+
+    python benchmarks/bench_hsn_fuzzy.py --vocab 5000 20000 --typos 1000
+"""
+
+import argparse
+import json
+import random
+import re
+import sys
+import time
+import tracemalloc
+from difflib import SequenceMatcher
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+ALPHABET = "abcdefghiklmnoprstuvy"
+
+
+def make_vocab(size: int, seed: int = 42):
+    rng = random.Random(seed)
+    data = json.loads((Path(__file__).resolve().parent.parent / "hsn_data.json").read_text())
+    words = {w for item in data for w in re.findall(r"[a-z]+", item["desc"].lower()) if len(w) >= 4}
+    while len(words) < size:
+        words.add("".join(rng.choice(ALPHABET) for _ in range(rng.randint(4, 12))))
+    return sorted(words)
+
+
+def misspell(word: str, rng: random.Random) -> str:
+    """One random edit: substitution, deletion, insertion or transposition"""
+    i = rng.randrange(len(word))
+    kind = rng.randrange(4)
+    if kind == 0:
+        return word[:i] + rng.choice(ALPHABET) + word[i + 1:]
+    if kind == 1:
+        return word[:i] + word[i + 1:]
+    if kind == 2:
+        return word[:i] + rng.choice(ALPHABET) + word[i:]
+    if i == len(word) - 1:
+        i -= 1
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+
+def sequence_matcher_closest(term: str, vocab):
+    """The previous approach: best SequenceMatcher ratio against every word"""
+    close = [(SequenceMatcher(None, term, w).ratio(), w) for w in vocab]
+    return [w for r, w in sorted(close, reverse=True)[:3] if r >= 0.8]
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return timings[len(timings) // 2] * 1000, timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark fuzzy term lookup")
+    parser.add_argument("--vocab", type=int, nargs="+", default=[5000, 20000], help="Vocabulary sizes")
+    parser.add_argument("--typos", type=int, default=1000, help="Misspelled terms per size")
+    parser.add_argument("--scan-sample", type=int, default=100, help="Terms timed with the (slow) SequenceMatcher scan")
+    args = parser.parse_args()
+
+    from fuzzy_terms import FuzzyDictionary
+
+    print(f"{'vocab':>7} {'implementation':>16} {'p50 ms':>9} {'p99 ms':>9} {'recall':>7} {'build ms':>9} {'MB':>6}")
+    for size in args.vocab:
+        vocab = make_vocab(size)
+        rng = random.Random(size)
+        cases = [(misspell(w, rng), w) for w in (rng.choice(vocab) for _ in range(args.typos))]
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        dictionary = FuzzyDictionary({w: 1 for w in vocab})
+        build_ms = (time.perf_counter() - start) * 1000
+        memory_mb = tracemalloc.get_traced_memory()[0] / 1024 / 1024
+        tracemalloc.stop()
+
+        for name, lookup, sample, build, mb in (
+            ("SequenceMatcher", lambda t: sequence_matcher_closest(t, vocab), cases[:args.scan_sample], 0.0, 0.0),
+            ("FuzzyDictionary", lambda t: dictionary.corrections(t) or [t], cases, build_ms, memory_mb),
+        ):
+            timings = []
+            hits = 0
+            for typo, intended in sample:
+                start = time.perf_counter()
+                found = lookup(typo)
+                timings.append(time.perf_counter() - start)
+                hits += intended in found
+            p50, p99 = percentiles(timings)
+            print(f"{size:>7} {name:>16} {p50:>9.3f} {p99:>9.3f} {hits / len(sample):>7.1%} {build:>9.0f} {mb:>6.1f}")
+
+
+if __name__ == "__main__":
+    main()
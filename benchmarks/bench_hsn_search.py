@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+HSN/SAC search benchmark
+Fills a scratch database with N synthetic HSN/SAC rows and compares the old
+LIKE query behind /hsn/search with the in-memory index. It reports build time
+and per-query p50/p99 latency over a mix of autocomplete prefixes.
+
+    python benchmarks/bench_hsn_search.py --rows 20000 --queries 2000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+ALPHABET = "abcdefghiklmnoprstuvy"
+
+
+def populate(engine, row_count: int, seed: int = 42):
+    """Bulk-insert synthetic HSN/SAC rows; descriptions mix real catalogue words with random vocabulary"""
+    from models import HSNCode
+
+    rng = random.Random(seed)
+    base_words = [
+        "computers", "laptops", "tablets", "monitors", "rice", "basmati", "cotton", "shirts", "sarees",
+        "brake", "pads", "engine", "oil", "speakers", "mobile", "phones", "consulting", "services",
+        "software", "furniture", "chairs", "steel", "pipes", "paper", "printing", "repair", "maintenance",
+    ]
+    vocab = base_words + ["".join(rng.choice(ALPHABET) for _ in range(rng.randint(4, 11))) for _ in range(8000)]
+    now = datetime.utcnow()
+    rows = []
+    for i in range(row_count):
+        is_service = rng.random() < 0.2
+        rows.append({
+            "code": f"99{i:06d}" if is_service else f"{10 + i % 89:02d}{i:06d}",  # SAC codes start with 99
+            "description": " ".join(rng.choice(vocab) for _ in range(rng.randint(3, 12))).capitalize(),
+            "gst_rate": rng.choice([0.0, 5.0, 12.0, 18.0, 28.0]),
+            "type": "SAC" if is_service else "HSN",
+            "category": rng.choice(["Electronics", "Food", "Clothing", "Automotive", "Services"]),
+            "keywords": ",".join(rng.choice(vocab) for _ in range(5)),
+            "unit": "Nos",
+            "is_active": True,
+            "usage_count": rng.randint(0, 500),
+            "created_at": now,
+            "updated_at": now,
+        })
+    with engine.begin() as conn:
+        conn.execute(HSNCode.__table__.insert(), rows)
+    return vocab
+
+
+def legacy_search(db, q: str, limit: int = 10):
+    """The LIKE query /hsn/search ran before the index"""
+    from sqlalchemy import func
+    from models import HSNCode
+
+    term = f"%{q.lower()}%"
+    return (
+        db.query(HSNCode)
+        .filter(HSNCode.is_active == True)
+        .filter(
+            func.lower(HSNCode.code).like(term)
+            | func.lower(HSNCode.description).like(term)
+            | func.lower(HSNCode.keywords).like(term)
+        )
+        .order_by(HSNCode.usage_count.desc(), HSNCode.code)
+        .limit(limit)
+        .all()
+    )
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return timings[len(timings) // 2] * 1000, timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HSN/SAC search")
+    parser.add_argument("--rows", type=int, default=20000, help="HSN/SAC rows to generate")
+    parser.add_argument("--queries", type=int, default=2000, help="Queries per implementation")
+    parser.add_argument("--database-url", default=None, help="Defaults to a scratch SQLite file")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="bench_hsn_")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{scratch}/bench.db"
+
+    from database import Base, SessionLocal, engine
+    import models  # noqa: F401  (registers the tables on Base)
+    from hsn_index import HSNIndexHolder
+
+    Base.metadata.create_all(bind=engine)
+    vocab = populate(engine, args.rows)
+
+    rng = random.Random(7)
+    queries = []
+    for _ in range(args.queries):
+        word = rng.choice(vocab)
+        # Autocomplete traffic: partial words, whole words, code prefixes and two-word phrases
+        kind = rng.random()
+        if kind < 0.5:
+            queries.append(word[:rng.randint(1, len(word))])
+        elif kind < 0.7:
+            queries.append(word)
+        elif kind < 0.85:
+            queries.append(str(rng.randint(10, 9999)))
+        else:
+            queries.append(f"{word} {rng.choice(vocab)[:3]}")
+
+    db = SessionLocal()
+    holder = HSNIndexHolder(refresh_seconds=3600)
+    start = time.perf_counter()
+    index = holder.rebuild(db)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    results = {}
+    for name, search in (
+        ("LIKE query", lambda q: legacy_search(db, q)),
+        ("index", lambda q: holder.get(db).search(q)),
+    ):
+        timings = []
+        for q in queries:
+            start = time.perf_counter()
+            search(q)
+            timings.append(time.perf_counter() - start)
+        results[name] = percentiles(timings)
+    db.close()
+
+    print(f"rows: {args.rows}  index entries: {len(index.entries)}  build: {build_ms:.0f} ms")
+    print(f"{'implementation':>15} {'p50 ms':>9} {'p99 ms':>9}")
+    for name, (p50, p99) in results.items():
+        print(f"{name:>15} {p50:>9.3f} {p99:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
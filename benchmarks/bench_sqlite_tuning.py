@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+SQLite tuning benchmark
+Runs the same mixed workload against two scratch copies of one tenant: once
+with SQLite's own settings (rollback journal, one pool) and once with the
+profile from database.configure_sqlite (WAL, synchronous=NORMAL, mmap, larger
+cache) plus the read-only pool the GET handlers use.
+
+Reader threads fetch the tenant's first invoice page (buyer joined) in a
+loop, or with --query aggregate, total every invoice per customer. Writer threads insert an invoice with three items per transaction, as
+POST /invoices does. The report shows reads/s and writes/s, read latency,
+and the reads that failed with "database is locked" after waiting out the
+busy timeout.
+
+    python benchmarks/bench_sqlite_tuning.py --invoices 20000 --readers 8 --writers 2 --seconds 10
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+USER_ID = 900000
+PAGE_SIZE = 20
+
+
+def build_engines(url: str, profile: str, pool_size: int):
+    """(write engine, read engine) for ``profile``"""
+    from sqlalchemy import create_engine
+
+    from database import configure_sqlite, read_only_database_url
+
+    kwargs = {"connect_args": {"check_same_thread": False}, "pool_size": pool_size, "max_overflow": 0}
+    writer = create_engine(url, **kwargs)
+    if profile == "default":
+        return writer, writer
+    configure_sqlite(writer)
+    with writer.connect():
+        pass  # switch the file to WAL before the first read-only connection opens it
+    reader = create_engine(read_only_database_url(url), **kwargs)
+    configure_sqlite(reader, read_only=True)
+    return writer, reader
+
+
+def read_query(kind: str):
+    from sqlalchemy import func, select
+
+    from models import Customer, Invoice
+
+    if kind == "page":
+        return (
+            select(Invoice.id, Invoice.invoice_number, Invoice.total, Customer.name)
+            .join(Customer, Invoice.buyer_id == Customer.id)
+            .where(Invoice.user_id == USER_ID)
+            .order_by(Invoice.date.desc(), Invoice.id.desc())
+            .limit(PAGE_SIZE)
+        )
+    # the dashboard's per-customer totals before the rollup table: reads the whole tenant
+    return (
+        select(Customer.name, func.count(Invoice.id), func.sum(Invoice.total))
+        .join(Customer, Invoice.buyer_id == Customer.id)
+        .where(Invoice.user_id == USER_ID)
+        .group_by(Customer.name)
+    )
+
+
+def run_workload(writer, reader, page, readers: int, writers: int, seconds: float):
+    from sqlalchemy import select
+    from sqlalchemy.exc import OperationalError
+
+    from models import Customer, Invoice, InvoiceItem
+
+    with reader.connect() as conn:
+        buyer_id = conn.execute(select(Customer.id).where(Customer.user_id == USER_ID).limit(1)).scalar()
+
+    deadline = time.perf_counter() + seconds
+    read_timings, locked = [], [0]
+    writes = [0]
+    lock = threading.Lock()
+
+    def read_loop():
+        timings = []
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                with reader.connect() as conn:
+                    conn.execute(page).all()
+            except OperationalError:
+                with lock:
+                    locked[0] += 1
+                continue
+            timings.append(time.perf_counter() - start)
+        with lock:
+            read_timings.extend(timings)
+
+    def write_loop(worker: int):
+        n = 0
+        now = datetime.utcnow()
+        while time.perf_counter() < deadline:
+            with writer.begin() as conn:
+                invoice_id = conn.execute(Invoice.__table__.insert().values(
+                    user_id=USER_ID, invoice_number=f"W{worker}-{n:07d}", financial_year="2024-2025",
+                    date=date.today(), buyer_id=buyer_id, subtotal=300.0, total=354.0, status="UNPAID",
+                    created_at=now, updated_at=now,
+                )).inserted_primary_key[0]
+                conn.execute(InvoiceItem.__table__.insert(), [
+                    {"invoice_id": invoice_id, "description": f"Item {i}", "quantity": 1, "rate": 100.0, "gst_rate": 18.0}
+                    for i in range(3)
+                ])
+            n += 1
+        with lock:
+            writes[0] += n
+
+    threads = [threading.Thread(target=read_loop) for _ in range(readers)]
+    threads += [threading.Thread(target=write_loop, args=(w,)) for w in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    read_timings.sort()
+    return read_timings, writes[0], locked[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SQLite's default settings against the tuned profile")
+    parser.add_argument("--invoices", type=int, default=20000, help="Invoices in the benchmark tenant")
+    parser.add_argument("--readers", type=int, default=8, help="Reader threads")
+    parser.add_argument("--writers", type=int, default=2, help="Writer threads")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Duration of each run")
+    parser.add_argument("--query", choices=["page", "aggregate"], default="page", help="What the readers run")
+    parser.add_argument("--dir", default=None, help="Where to create the scratch databases (use a real disk, not tmpfs)")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="bench_sqlite_", dir=args.dir)
+    os.environ["DATABASE_URL"] = f"sqlite:///{scratch}/unused.db"
+
+    from database import Base
+    import models  # noqa: F401  (registers the tables on Base)
+    from bench_dashboard_summary import populate
+
+    print(f"{'profile':>8} {'reads/s':>9} {'writes/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'locked':>7}")
+    for profile in ("default", "tuned"):
+        url = f"sqlite:///{scratch}/{profile}.db"
+        writer, reader = build_engines(url, profile, args.readers + args.writers)
+        Base.metadata.create_all(bind=writer)
+        populate(writer, USER_ID, args.invoices)
+        timings, writes, locked = run_workload(writer, reader, read_query(args.query), args.readers, args.writers, args.seconds)
+        p50 = timings[len(timings) // 2] * 1000 if timings else float("nan")
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1000 if timings else float("nan")
+        print(
+            f"{profile:>8} {len(timings) / args.seconds:>9.1f} {writes / args.seconds:>9.1f} "
+            f"{p50:>8.2f} {p99:>8.2f} {locked:>7}"
+        )
+        writer.dispose()
+        reader.dispose()
+
+
+if __name__ == "__main__":
+    main()
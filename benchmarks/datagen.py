@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Synthetic data for the benchmark suite
+The benchmark profile of generate_tenants.py: every tenant gets exactly
+``--invoices`` invoices of ``--items`` items, so runs at the same sizes and
+seed time the same rows. The master data, GSTINs, payments, counters and
+monthly rollup all come from generate_tenants; this module only fixes the
+shape and, from the command line, points it at a scratch database.
+
+    python benchmarks/datagen.py --tenants 5 --invoices 2000 --items 5
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def master_catalogue() -> Tuple[List[dict], List[dict]]:
+    """(products, services) as defined by the seed scripts"""
+    import generate_tenants
+
+    return generate_tenants.master_catalogue()
+
+
+def generate(engine, tenants: int, invoices: int, items: int, customers: Optional[int] = None, seed: int = 42) -> List[int]:
+    """Bulk-insert ``tenants`` tenants with ``invoices`` invoices of ``items`` items each; returns the user ids"""
+    import generate_tenants
+
+    return generate_tenants.generate(engine, tenants, invoices, items, customers, seed=seed, uniform=True).user_ids
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic tenants for benchmarking")
+    parser.add_argument("--tenants", type=int, default=5)
+    parser.add_argument("--invoices", type=int, default=2000, help="Invoices per tenant")
+    parser.add_argument("--items", type=int, default=5, help="Items per invoice")
+    parser.add_argument("--customers", type=int, default=None, help="Customers per tenant (default: one per 25 invoices)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--database-url", default=None, help="Defaults to a scratch SQLite file")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="bench_data_")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{scratch}/bench.db"
+
+    from database import engine
+    from migrate import migrate
+
+    migrate(engine, verbose=False)
+    start = time.perf_counter()
+    user_ids = generate(engine, args.tenants, args.invoices, args.items, args.customers, args.seed)
+    elapsed = time.perf_counter() - start
+    rows = len(user_ids) * args.invoices
+    print(f"{len(user_ids)} tenants, {rows} invoices, {rows * args.items} items in {elapsed:.1f}s")
+    print(f"DATABASE_URL={os.environ['DATABASE_URL']}")
+
+
+if __name__ == "__main__":
+    main()
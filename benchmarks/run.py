@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite
+Fills a scratch database with benchmarks/datagen.py, then times the hot paths:
+
+  micro  tax.compute_totals, hsn_service.suggest_hsn, the HSN index search and
+         pdf_render.render_default_pdf, called directly
+  e2e    GET /invoices, /invoices/summary, /hsn/search, /hsn/suggest,
+         /master-data/search, POST /invoices and the invoice PDF, through
+         main.app with an in-process ASGI client (no server, no network).
+         Before timing, /hsn/suggest is checked to return the index results.
+
+Every benchmark is reported as mean/p50/p95 ms and written to a JSON report.
+With --baseline, each p50 is compared with a stored report and the run exits 1
+if any is more than --tolerance slower (and slower by more than NOISE_FLOOR_MS,
+so timer jitter on the microsecond benchmarks is not a regression). Baselines only compare on the
+machine and data sizes they were recorded with.
+
+    python benchmarks/run.py --output benchmarks/baseline.json
+    python benchmarks/run.py --baseline benchmarks/baseline.json --tolerance 0.25
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+NOISE_FLOOR_MS = 0.002
+WARMUP = 3
+SEARCH_QUERIES = ["laptop", "mobile phone", "brake pads", "software development", "cotton saree", "lapotp"]
+
+
+def summarize(timings: List[float]) -> dict:
+    """mean/p50/p95 in ms of per-call timings in seconds"""
+    ordered = sorted(timings)
+    n = len(ordered)
+    mean = sum(ordered) / n
+    return {
+        "n": n,
+        "mean_ms": round(mean * 1000, 3),
+        "p50_ms": round(ordered[n // 2] * 1000, 3),
+        "p95_ms": round(ordered[min(n - 1, int(n * 0.95))] * 1000, 3),
+        "ops_per_s": round(1 / mean, 1) if mean else None,
+    }
+
+
+def time_calls(fn: Callable, repeat: int) -> dict:
+    for _ in range(WARMUP):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+
+async def time_requests(client, method: str, url: str, repeat: int, **kwargs) -> dict:
+    async def call():
+        response = await client.request(method, url, **kwargs)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {url} answered {response.status_code}: {response.text[:200]}")
+
+    for _ in range(WARMUP):
+        await call()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await call()
+        timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+
+def _cycle(values: list) -> Callable:
+    state = {"i": -1}
+
+    def next_value():
+        state["i"] = (state["i"] + 1) % len(values)
+        return values[state["i"]]
+
+    return next_value
+
+
+def micro_benchmarks(engine, user_id: int, items: int, repeat: int) -> Dict[str, dict]:
+    from sqlalchemy.orm import Session, selectinload
+
+    from datagen import master_catalogue
+    from hsn_index import hsn_index
+    from hsn_service import suggest_hsn
+    from models import BusinessProfile, Invoice
+    from pdf_executor import invoice_snapshot, snapshot
+    from pdf_render import render_default_pdf
+    from tax import compute_totals
+
+    products, _ = master_catalogue()
+    lines = [
+        SimpleNamespace(quantity=float(i % 7 + 1), rate=100.0 + i * 37.5, gst_rate=products[i % len(products)]["gst_rate"])
+        for i in range(max(items, 1))
+    ]
+    query = _cycle(SEARCH_QUERIES)
+    with Session(engine) as db:
+        index = hsn_index.rebuild(db)
+        invoice = db.query(Invoice).options(selectinload(Invoice.items), selectinload(Invoice.buyer)).filter(Invoice.user_id == user_id).first()
+        pdf_args = (invoice_snapshot(invoice), snapshot(db.query(BusinessProfile).filter(BusinessProfile.user_id == user_id).first()))
+
+    results = {}
+    results["tax.compute_totals intrastate"] = time_calls(lambda: compute_totals(lines, "29", "29"), repeat)
+    results["tax.compute_totals interstate"] = time_calls(lambda: compute_totals(lines, "29", "27"), repeat)
+    results["hsn_service.suggest_hsn"] = time_calls(lambda: suggest_hsn(query()), repeat)
+    results["hsn_index.search"] = time_calls(lambda: index.search(query()), repeat)
+    results["pdf_render.render_default_pdf"] = time_calls(lambda: render_default_pdf(*pdf_args), repeat)
+    return results
+
+
+async def check_responses(client) -> None:
+    """Fail the run when routes that should agree do not: the legacy /hsn/suggest is served from the HSN index"""
+    for q in SEARCH_QUERIES:
+        suggested = (await client.get("/hsn/suggest", params={"q": q})).json()
+        searched = (await client.get("/hsn/search", params={"q": q, "limit": 8})).json()
+        if suggested != searched:
+            raise RuntimeError(f"/hsn/suggest?q={q} differs from the HSN index results")
+
+
+async def e2e_benchmarks(user_id: int, items: int, repeat: int) -> Dict[str, dict]:
+    import httpx
+    from sqlalchemy import select
+
+    import main
+    from database import AsyncSessionLocal
+    from models import Customer, Invoice, InvoiceItem
+
+    async with AsyncSessionLocal() as db:
+        buyer_id = await db.scalar(select(Customer.id).where(Customer.user_id == user_id).limit(1))
+        invoice_id = await db.scalar(select(Invoice.id).where(Invoice.user_id == user_id).limit(1))
+        lines = (await db.execute(
+            select(InvoiceItem.description, InvoiceItem.hsn_code, InvoiceItem.sac_code, InvoiceItem.gst_rate)
+            .where(InvoiceItem.invoice_id == invoice_id)
+        )).all()
+    body = {
+        "buyer_id": buyer_id,
+        "date": date.today().isoformat(),
+        "items": [
+            {"description": line.description, "hsn_code": line.hsn_code, "sac_code": line.sac_code,
+             "quantity": 2, "rate": 1250.0, "gst_rate": line.gst_rate}
+            for line in (lines * items)[:items]
+        ],
+    }
+    results = {}
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        results["GET /invoices?limit=50"] = await time_requests(client, "GET", "/invoices?limit=50", repeat)
+        results["GET /invoices (all)"] = await time_requests(client, "GET", "/invoices", repeat)
+        results["GET /invoices/summary"] = await time_requests(client, "GET", "/invoices/summary", repeat)
+        await check_responses(client)
+        results["GET /hsn/search"] = await time_requests(client, "GET", "/hsn/search", repeat, params={"q": "laptop"})
+        results["GET /hsn/suggest"] = await time_requests(client, "GET", "/hsn/suggest", repeat, params={"q": "laptop"})
+        results["GET /master-data/search"] = await time_requests(client, "GET", "/master-data/search", repeat, params={"q": "laptop"})
+        results["POST /invoices"] = await time_requests(client, "POST", "/invoices", repeat, json=body)
+        results["GET /my/invoices/{id}/pdf"] = await time_requests(client, "GET", f"/my/invoices/{invoice_id}/pdf", repeat)
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=Path(__file__).resolve().parent,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: Dict[str, dict], baseline: Dict[str, dict], tolerance: float) -> List[dict]:
+    """One row per benchmark: p50 now and in the baseline, relative change and verdict"""
+    rows = []
+    for name, stats in results.items():
+        before = baseline.get(name)
+        if before is None:
+            rows.append({"name": name, "baseline": None, "current": stats["p50_ms"], "change": None, "verdict": "new"})
+            continue
+        change = stats["p50_ms"] / before["p50_ms"] - 1 if before["p50_ms"] else 0.0
+        regressed = change > tolerance and stats["p50_ms"] - before["p50_ms"] > NOISE_FLOOR_MS
+        rows.append({
+            "name": name,
+            "baseline": before["p50_ms"],
+            "current": stats["p50_ms"],
+            "change": change,
+            "verdict": "REGRESSED" if regressed else "ok",
+        })
+    return rows
+
+
+def print_results(results: Dict[str, dict]) -> None:
+    print(f"{'benchmark':<34} {'n':>5} {'mean ms':>10} {'p50 ms':>10} {'p95 ms':>10} {'ops/s':>10}")
+    for name, stats in results.items():
+        print(f"{name:<34} {stats['n']:>5} {stats['mean_ms']:>10.3f} {stats['p50_ms']:>10.3f} {stats['p95_ms']:>10.3f} {stats['ops_per_s']:>10}")
+
+
+def print_comparison(rows: List[dict]) -> None:
+    print(f"{'benchmark':<34} {'base p50':>10} {'p50':>10} {'change':>8}  verdict")
+    for row in rows:
+        base = f"{row['baseline']:.3f}" if row["baseline"] is not None else "-"
+        change = f"{row['change']:+.0%}" if row["change"] is not None else "-"
+        print(f"{row['name']:<34} {base:>10} {row['current']:>10.3f} {change:>8}  {row['verdict']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite")
+    parser.add_argument("--tenants", type=int, default=3)
+    parser.add_argument("--invoices", type=int, default=1000, help="Invoices per tenant")
+    parser.add_argument("--items", type=int, default=5, help="Items per invoice")
+    parser.add_argument("--repeat", type=int, default=30, help="Timed calls per benchmark")
+    parser.add_argument("--only", choices=["micro", "e2e"], default=None, help="Run one group")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    parser.add_argument("--baseline", default=None, help="JSON report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed p50 slowdown, 0.25 = 25%%")
+    parser.add_argument("--database-url", default=None, help="Defaults to a scratch SQLite file")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="bench_suite_")
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{scratch}/bench.db"
+    os.environ["DEV_AUTH_BYPASS"] = "1"
+    os.environ.setdefault("PDF_CACHE_BACKEND", "none")  # time the render, not the cache
+    os.environ.setdefault("PDF_RENDER_WORKERS", "0")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+    from sqlalchemy import update
+
+    from database import ENGINES, engine
+    from datagen import generate
+    from migrate import migrate
+    from models import User
+
+    migrate(engine, verbose=False)
+    start = time.perf_counter()
+    user_ids = generate(engine, args.tenants, args.invoices, args.items, seed=args.seed)
+    with engine.begin() as conn:
+        # DEV_AUTH_BYPASS signs every request in as "dev-sub"
+        conn.execute(update(User).where(User.id == user_ids[0]).values(cognito_sub="dev-sub"))
+    print(f"Generated {args.tenants} tenants x {args.invoices} invoices x {args.items} items in {time.perf_counter() - start:.1f}s")
+
+    results = {}
+    if args.only in (None, "micro"):
+        results.update({name: {"group": "micro", **stats} for name, stats in micro_benchmarks(engine, user_ids[0], args.items, args.repeat).items()})
+    if args.only in (None, "e2e"):
+        async def run_e2e():
+            try:
+                return await e2e_benchmarks(user_ids[0], args.items, args.repeat)
+            finally:
+                for name in ("async_write", "async_read"):
+                    await ENGINES[name].dispose()
+
+        results.update({name: {"group": "e2e", **stats} for name, stats in asyncio.run(run_e2e()).items()})
+    print_results(results)
+
+    report = {
+        "meta": {
+            "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": engine.dialect.name,
+            "params": {"tenants": args.tenants, "invoices": args.invoices, "items": args.items, "repeat": args.repeat, "seed": args.seed},
+        },
+        "results": results,
+    }
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2) + "\n")
+        print(f"Report written to {args.output}")
+
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline["meta"]["params"] != report["meta"]["params"]:
+            print(f"Warning: baseline was recorded with {baseline['meta']['params']}")
+        rows = compare(results, baseline["results"], args.tolerance)
+        print()
+        print_comparison(rows)
+        regressed = [row["name"] for row in rows if row["verdict"] == "REGRESSED"]
+        if regressed:
+            print(f"\n{len(regressed)} benchmark(s) more than {args.tolerance:.0%} slower than the baseline")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Dashboard summary for GET /invoices/summary.
+
+The number of queries and the amount of data pulled into Python are fixed
+no matter how many invoices a tenant has:
+
+1. the tenant's ``tenant_monthly_rollup`` rows, giving the outstanding total,
+   the six-month revenue series and this month's figures in O(months),
+2. the invoices dated after today in the current month, which the rollup
+   counts but "this month" (up to today) must not,
+3. the overdue count,
+4. the five most overdue invoices (ordered and limited in SQL),
+5. the top five customers by invoiced total over the last 90 days.
+"""
+from datetime import date, timedelta
+from typing import List, Optional
+
+from sqlalchemy import and_, case, func
+from sqlalchemy.orm import Session
+
+from models import Customer, Invoice, TenantMonthlyRollup
+from monthly_rollup import month_key
+
+
+MONTHS_IN_SERIES = 6
+TOP_CUSTOMER_DAYS = 90
+
+
+def month_starts(today: date, count: int = MONTHS_IN_SERIES) -> List[date]:
+    """First day of each of the last ``count`` months, oldest first, ending with the current month."""
+    starts = [today.replace(day=1)]
+    for _ in range(count - 1):
+        starts.append((starts[-1] - timedelta(days=1)).replace(day=1))
+    return list(reversed(starts))
+
+
+def build_summary(db: Session, user_id: int, today: Optional[date] = None) -> dict:
+    today = today or date.today()
+    tenant = Invoice.user_id == user_id
+    unpaid = Invoice.status != "PAID"
+    is_overdue = and_(Invoice.due_date.isnot(None), Invoice.due_date < today)
+
+    # Outstanding total, revenue series and "this month" come from the rollup, one row per month
+    rollups = {
+        row.month: row
+        for row in db.query(TenantMonthlyRollup).filter(TenantMonthlyRollup.user_id == user_id)
+    }
+    outstanding_total = sum(row.outstanding for row in rollups.values())
+    overdue_count = db.query(func.count(Invoice.id)).filter(tenant, unpaid, is_overdue).scalar()
+
+    overdue_rows = (
+        db.query(Invoice.id, Invoice.invoice_number, Invoice.due_date, Invoice.total, Customer.name)
+        .outerjoin(Customer, Customer.id == Invoice.buyer_id)
+        .filter(tenant, unpaid, is_overdue)
+        .order_by(Invoice.due_date.asc(), Invoice.id.asc())
+        .limit(5)
+        .all()
+    )
+    overdue_list = [
+        {
+            "id": row.id,
+            "invoice_number": row.invoice_number,
+            "customer": row.name,
+            "due_date": str(row.due_date),
+            "days_overdue": (today - row.due_date).days,
+            "total": row.total,
+        }
+        for row in overdue_rows
+    ]
+
+    series = []
+    for month_start in month_starts(today):
+        row = rollups.get(month_key(month_start))
+        series.append({"label": month_start.strftime("%b"), "total": round(row.paid if row else 0, 2)})
+    current = rollups.get(month_key(today))
+    this_month_revenue = current.paid if current else 0.0
+    invoices_this_month = current.invoice_count if current else 0
+    if current:
+        # The rollup covers the whole month; leave out invoices dated later this month
+        next_month = (today.replace(day=28) + timedelta(days=4)).replace(day=1)
+        later_count, later_paid = (
+            db.query(
+                func.count(Invoice.id),
+                func.coalesce(func.sum(case((Invoice.status == "PAID", Invoice.total), else_=0.0)), 0.0),
+            )
+            .filter(tenant, Invoice.date > today, Invoice.date < next_month)
+            .one()
+        )
+        this_month_revenue -= later_paid
+        invoices_this_month -= later_count
+
+    # Top customers by total (last 90 days), grouped by name like the invoice list shows them
+    since = today - timedelta(days=TOP_CUSTOMER_DAYS)
+    customer_total = func.coalesce(func.sum(Invoice.total), 0.0).label("total")
+    customer_name = func.coalesce(Customer.name, "-").label("name")
+    top_rows = (
+        db.query(customer_name, customer_total)
+        .select_from(Invoice)
+        .outerjoin(Customer, Customer.id == Invoice.buyer_id)
+        .filter(tenant, Invoice.date >= since)
+        .group_by(customer_name)
+        .order_by(customer_total.desc())
+        .limit(5)
+        .all()
+    )
+    top_customers = [{"name": row.name, "total": round(row.total, 2)} for row in top_rows]
+
+    return {
+        "outstanding_total": round(outstanding_total, 2),
+        "overdue_count": overdue_count,
+        "this_month_revenue": round(this_month_revenue, 2),
+        "invoices_this_month": invoices_this_month,
+        "monthly_revenue": series,
+        "overdue_list": overdue_list,
+        "top_customers": top_customers,
+    }
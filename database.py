@@ -1,10 +1,17 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Float, Date
+from sqlalchemy import create_engine, event, Column, Integer, String, DateTime, Boolean, Text, ForeignKey, Float, Date
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
 from datetime import datetime
 import os
+import uuid
 from dotenv import load_dotenv
 
+from pool_metrics import TimedAsyncAdaptedQueuePool, TimedQueuePool
+import query_metrics
+
 # Load .env file first
 load_dotenv(os.path.join(os.path.dirname(__file__), '.env'))
 
@@ -26,9 +33,116 @@ ENVIRONMENT = get_environment()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./invoicegen.db")
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {})
+# SQLite profile applied to every new connection. WAL lets readers run while an
+# invoice is being written (the rollback journal locks them out for the whole
+# commit). With WAL, synchronous=NORMAL only fsyncs at checkpoints: a crash can
+# lose the last commits, never corrupt the file. SQLITE_PROFILE=default keeps
+# SQLite's own settings and a single pool.
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "tuned").lower()
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "foreign_keys": "ON",
+    "busy_timeout": int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000")),
+    "cache_size": -int(float(os.getenv("SQLITE_CACHE_MB", "64")) * 1024),  # negative: KiB per connection
+    "mmap_size": int(float(os.getenv("SQLITE_MMAP_MB", "256")) * 1024 * 1024),
+    "temp_store": "MEMORY",
+}
+
+
+def configure_sqlite(engine, read_only: bool = False):
+    """Apply SQLITE_PRAGMAS to each connection ``engine`` opens (sync or async engine)."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in SQLITE_PRAGMAS.items():
+            if read_only and name == "journal_mode":
+                continue  # persistent in the file; set by the writer
+            cursor.execute(f"PRAGMA {name} = {value}")
+        if read_only:
+            cursor.execute("PRAGMA query_only = ON")
+        cursor.close()
+
+
+def read_only_database_url(url: str) -> str:
+    """The same SQLite file opened with ``mode=ro``; other databases are returned unchanged."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or parsed.database in (None, "", ":memory:"):
+        return url
+    return parsed.set(
+        database=f"file:{os.path.abspath(parsed.database)}",
+        query={**parsed.query, "mode": "ro", "uri": "true"},
+    ).render_as_string(hide_password=False)
+
+
+# Pool settings. Size, overflow and timeout apply to every backend; pre-ping,
+# recycle and the statement timeout only to server databases. Behind PgBouncer
+# in transaction mode (PGBOUNCER=true) PgBouncer does the pooling: each checkout
+# opens a fresh client connection, and asyncpg's prepared statement caches are
+# off because the next transaction may run on another server connection. Set
+# statement_timeout on the database role there; PgBouncer rejects it as a
+# startup option.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+PGBOUNCER = os.getenv("PGBOUNCER", "false").lower() == "true"
+
+
+def build_engine(url: str, is_async: bool = False):
+    """Engine for ``url`` with the pool settings above and a timed pool."""
+    parsed = make_url(url)
+    backend, driver = parsed.get_backend_name(), parsed.get_driver_name()
+    connect_args = {}
+    options = {}
+    if backend == "sqlite":
+        if not is_async:
+            connect_args["check_same_thread"] = False
+    elif PGBOUNCER:
+        options["poolclass"] = NullPool
+        if driver == "asyncpg":
+            parsed = parsed.update_query_dict({"prepared_statement_cache_size": "0"})
+            connect_args.update(statement_cache_size=0, prepared_statement_name_func=lambda: f"__asyncpg_{uuid.uuid4()}__")
+    else:
+        options.update(pool_pre_ping=DB_POOL_PRE_PING, pool_recycle=DB_POOL_RECYCLE)
+        if DB_STATEMENT_TIMEOUT_MS and driver == "asyncpg":
+            connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+        elif DB_STATEMENT_TIMEOUT_MS and backend == "postgresql":
+            connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    if "poolclass" not in options:
+        # aiosqlite would otherwise open a connection (and its thread) per session
+        options.update(
+            poolclass=TimedAsyncAdaptedQueuePool if is_async else TimedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+    create = create_async_engine if is_async else create_engine
+    return create(parsed, connect_args=connect_args, **options)
+
+
+IS_SQLITE = DATABASE_URL.startswith("sqlite")
+TUNED_SQLITE = IS_SQLITE and SQLITE_PROFILE == "tuned"
+
+engine = build_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Separate pool for GET handlers. On SQLite its connections are read-only, so
+# they never queue behind the writer; elsewhere it is the main engine unless
+# READ_DATABASE_URL points at a replica.
+READ_DATABASE_URL = os.getenv("READ_DATABASE_URL") or (read_only_database_url(DATABASE_URL) if TUNED_SQLITE else DATABASE_URL)
+read_engine = engine if READ_DATABASE_URL == DATABASE_URL else build_engine(READ_DATABASE_URL)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
+
+if TUNED_SQLITE:
+    configure_sqlite(engine)
+    if read_engine is not engine:
+        configure_sqlite(read_engine, read_only=True)
+
 Base = declarative_base()
 
 def get_db():
@@ -39,315 +153,51 @@ def get_db():
         db.close()
 
 
-def _sqlite_column_exists(conn, table_name: str, column_name: str) -> bool:
-    rows = conn.exec_driver_sql(f"PRAGMA table_info({table_name})").fetchall()
-    existing_columns = {row[1] for row in rows}  # (cid, name, type, notnull, dflt_value, pk)
-    return column_name in existing_columns
-
-
-def _sqlite_table_exists(conn, table_name: str) -> bool:
-    rows = conn.exec_driver_sql(f"PRAGMA table_info({table_name})").fetchall()
-    return len(rows) > 0
-
-
-def run_startup_migrations():
-    """Minimal, safe, in-place migrations for SQLite during development."""
-    if ENVIRONMENT != "development" or not DATABASE_URL.startswith("sqlite"):
-        return
-    with engine.connect() as conn:
-        # invoices.paid_on
-        if not _sqlite_column_exists(conn, "invoices", "paid_on"):
-            conn.exec_driver_sql("ALTER TABLE invoices ADD COLUMN paid_on DATE")
-        # invoices.status
-        if not _sqlite_column_exists(conn, "invoices", "status"):
-            conn.exec_driver_sql("ALTER TABLE invoices ADD COLUMN status VARCHAR DEFAULT 'UNPAID'")
-        # invoices.template_id
-        if not _sqlite_column_exists(conn, "invoices", "template_id"):
-            conn.exec_driver_sql("ALTER TABLE invoices ADD COLUMN template_id INTEGER")
-        # business_profiles new fields
-        if not _sqlite_column_exists(conn, "business_profiles", "bank_account_name"):
-            conn.exec_driver_sql("ALTER TABLE business_profiles ADD COLUMN bank_account_name VARCHAR")
-        if not _sqlite_column_exists(conn, "business_profiles", "bank_name"):
-            conn.exec_driver_sql("ALTER TABLE business_profiles ADD COLUMN bank_name VARCHAR")
-        if not _sqlite_column_exists(conn, "business_profiles", "bank_branch"):
-            conn.exec_driver_sql("ALTER TABLE business_profiles ADD COLUMN bank_branch VARCHAR")
-        if not _sqlite_column_exists(conn, "business_profiles", "bank_account_number"):
-            conn.exec_driver_sql("ALTER TABLE business_profiles ADD COLUMN bank_account_number VARCHAR")
-        if not _sqlite_column_exists(conn, "business_profiles", "bank_ifsc"):
-            conn.exec_driver_sql("ALTER TABLE business_profiles ADD COLUMN bank_ifsc VARCHAR")
-        if not _sqlite_column_exists(conn, "business_profiles", "upi_id"):
-            conn.exec_driver_sql("ALTER TABLE business_profiles ADD COLUMN upi_id VARCHAR")
-        if not _sqlite_column_exists(conn, "business_profiles", "default_terms"):
-            conn.exec_driver_sql("ALTER TABLE business_profiles ADD COLUMN default_terms TEXT")
-        if not _sqlite_column_exists(conn, "business_profiles", "accepts_cash"):
-            conn.exec_driver_sql("ALTER TABLE business_profiles ADD COLUMN accepts_cash VARCHAR")
-        if not _sqlite_column_exists(conn, "business_profiles", "cash_note"):
-            conn.exec_driver_sql("ALTER TABLE business_profiles ADD COLUMN cash_note TEXT")
-        
-        # Create invoice_templates table if it doesn't exist
-        if not _sqlite_table_exists(conn, "invoice_templates"):
-            conn.exec_driver_sql("""
-                CREATE TABLE invoice_templates (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    name VARCHAR NOT NULL,
-                    template_file_path VARCHAR,
-                    is_default BOOLEAN DEFAULT 0,
-                    description TEXT,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            """)
-        else:
-            # Force recreate invoice_templates table with correct schema
-            try:
-                # Drop existing table and recreate with correct schema
-                conn.exec_driver_sql("DROP TABLE IF EXISTS invoice_templates")
-                conn.exec_driver_sql("""
-                    CREATE TABLE invoice_templates (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        user_id INTEGER NOT NULL,
-                        name VARCHAR NOT NULL,
-                        template_file_path VARCHAR,
-                        is_default BOOLEAN DEFAULT 0,
-                        description TEXT,
-                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (user_id) REFERENCES users (id)
-                    )
-                """)
-            except Exception:
-                # If anything goes wrong, just continue
-                pass
-        
-        # ===== GST COMPLIANCE MIGRATIONS =====
-        
-        # BusinessProfile new fields
-        if not _sqlite_column_exists(conn, "business_profiles", "pan"):
-            conn.exec_driver_sql("ALTER TABLE business_profiles ADD COLUMN pan VARCHAR")
-        if not _sqlite_column_exists(conn, "business_profiles", "turnover_category"):
-            conn.exec_driver_sql("ALTER TABLE business_profiles ADD COLUMN turnover_category VARCHAR")
-        if not _sqlite_column_exists(conn, "business_profiles", "current_financial_year"):
-            conn.exec_driver_sql("ALTER TABLE business_profiles ADD COLUMN current_financial_year VARCHAR")
-        if not _sqlite_column_exists(conn, "business_profiles", "invoice_prefix"):
-            conn.exec_driver_sql("ALTER TABLE business_profiles ADD COLUMN invoice_prefix VARCHAR")
-        if not _sqlite_column_exists(conn, "business_profiles", "logo_path"):
-            conn.exec_driver_sql("ALTER TABLE business_profiles ADD COLUMN logo_path VARCHAR")
-        if not _sqlite_column_exists(conn, "business_profiles", "signature_path"):
-            conn.exec_driver_sql("ALTER TABLE business_profiles ADD COLUMN signature_path VARCHAR")
-        if not _sqlite_column_exists(conn, "business_profiles", "primary_color"):
-            conn.exec_driver_sql("ALTER TABLE business_profiles ADD COLUMN primary_color VARCHAR")
-        
-        # Invoice new fields
-        if not _sqlite_column_exists(conn, "invoices", "financial_year"):
-            conn.exec_driver_sql("ALTER TABLE invoices ADD COLUMN financial_year VARCHAR NOT NULL DEFAULT '2024-25'")
-        if not _sqlite_column_exists(conn, "invoices", "seller_pan"):
-            conn.exec_driver_sql("ALTER TABLE invoices ADD COLUMN seller_pan VARCHAR")
-        if not _sqlite_column_exists(conn, "invoices", "place_of_supply"):
-            conn.exec_driver_sql("ALTER TABLE invoices ADD COLUMN place_of_supply VARCHAR")
-        if not _sqlite_column_exists(conn, "invoices", "place_of_supply_code"):
-            conn.exec_driver_sql("ALTER TABLE invoices ADD COLUMN place_of_supply_code VARCHAR")
-        if not _sqlite_column_exists(conn, "invoices", "reverse_charge"):
-            conn.exec_driver_sql("ALTER TABLE invoices ADD COLUMN reverse_charge BOOLEAN DEFAULT 0")
-        if not _sqlite_column_exists(conn, "invoices", "ecommerce_gstin"):
-            conn.exec_driver_sql("ALTER TABLE invoices ADD COLUMN ecommerce_gstin VARCHAR")
-        if not _sqlite_column_exists(conn, "invoices", "export_type"):
-            conn.exec_driver_sql("ALTER TABLE invoices ADD COLUMN export_type VARCHAR")
-        if not _sqlite_column_exists(conn, "invoices", "signature_path"):
-            conn.exec_driver_sql("ALTER TABLE invoices ADD COLUMN signature_path VARCHAR")
-        if not _sqlite_column_exists(conn, "invoices", "discount"):
-            conn.exec_driver_sql("ALTER TABLE invoices ADD COLUMN discount FLOAT DEFAULT 0.0")
-        if not _sqlite_column_exists(conn, "invoices", "taxable_value"):
-            conn.exec_driver_sql("ALTER TABLE invoices ADD COLUMN taxable_value FLOAT DEFAULT 0.0")
-        if not _sqlite_column_exists(conn, "invoices", "round_off"):
-            conn.exec_driver_sql("ALTER TABLE invoices ADD COLUMN round_off FLOAT DEFAULT 0.0")
-        if not _sqlite_column_exists(conn, "invoices", "total_in_words"):
-            conn.exec_driver_sql("ALTER TABLE invoices ADD COLUMN total_in_words VARCHAR")
-        if not _sqlite_column_exists(conn, "invoices", "terms_and_conditions"):
-            conn.exec_driver_sql("ALTER TABLE invoices ADD COLUMN terms_and_conditions TEXT")
-        if not _sqlite_column_exists(conn, "invoices", "notes"):
-            conn.exec_driver_sql("ALTER TABLE invoices ADD COLUMN notes TEXT")
-        if not _sqlite_column_exists(conn, "invoices", "updated_at"):
-            conn.exec_driver_sql("ALTER TABLE invoices ADD COLUMN updated_at DATETIME")
-        
-        # InvoiceItem new fields
-        if not _sqlite_column_exists(conn, "invoice_items", "sac_code"):
-            conn.exec_driver_sql("ALTER TABLE invoice_items ADD COLUMN sac_code VARCHAR")
-        if not _sqlite_column_exists(conn, "invoice_items", "unit"):
-            conn.exec_driver_sql("ALTER TABLE invoice_items ADD COLUMN unit VARCHAR")
-        if not _sqlite_column_exists(conn, "invoice_items", "discount_percent"):
-            conn.exec_driver_sql("ALTER TABLE invoice_items ADD COLUMN discount_percent FLOAT DEFAULT 0.0")
-        if not _sqlite_column_exists(conn, "invoice_items", "discount_amount"):
-            conn.exec_driver_sql("ALTER TABLE invoice_items ADD COLUMN discount_amount FLOAT DEFAULT 0.0")
-        if not _sqlite_column_exists(conn, "invoice_items", "taxable_value"):
-            conn.exec_driver_sql("ALTER TABLE invoice_items ADD COLUMN taxable_value FLOAT DEFAULT 0.0")
-        if not _sqlite_column_exists(conn, "invoice_items", "cgst_rate"):
-            conn.exec_driver_sql("ALTER TABLE invoice_items ADD COLUMN cgst_rate FLOAT DEFAULT 0.0")
-        if not _sqlite_column_exists(conn, "invoice_items", "cgst_amount"):
-            conn.exec_driver_sql("ALTER TABLE invoice_items ADD COLUMN cgst_amount FLOAT DEFAULT 0.0")
-        if not _sqlite_column_exists(conn, "invoice_items", "sgst_rate"):
-            conn.exec_driver_sql("ALTER TABLE invoice_items ADD COLUMN sgst_rate FLOAT DEFAULT 0.0")
-        if not _sqlite_column_exists(conn, "invoice_items", "sgst_amount"):
-            conn.exec_driver_sql("ALTER TABLE invoice_items ADD COLUMN sgst_amount FLOAT DEFAULT 0.0")
-        if not _sqlite_column_exists(conn, "invoice_items", "igst_rate"):
-            conn.exec_driver_sql("ALTER TABLE invoice_items ADD COLUMN igst_rate FLOAT DEFAULT 0.0")
-        if not _sqlite_column_exists(conn, "invoice_items", "igst_amount"):
-            conn.exec_driver_sql("ALTER TABLE invoice_items ADD COLUMN igst_amount FLOAT DEFAULT 0.0")
-        if not _sqlite_column_exists(conn, "invoice_items", "total_amount"):
-            conn.exec_driver_sql("ALTER TABLE invoice_items ADD COLUMN total_amount FLOAT DEFAULT 0.0")
-        if not _sqlite_column_exists(conn, "invoice_items", "notes"):
-            conn.exec_driver_sql("ALTER TABLE invoice_items ADD COLUMN notes TEXT")
-        if not _sqlite_column_exists(conn, "invoice_items", "created_at"):
-            conn.exec_driver_sql("ALTER TABLE invoice_items ADD COLUMN created_at DATETIME")
-        if not _sqlite_column_exists(conn, "invoice_items", "updated_at"):
-            conn.exec_driver_sql("ALTER TABLE invoice_items ADD COLUMN updated_at DATETIME")
-        
-        # Update existing invoices to have financial year
-        conn.exec_driver_sql("""
-            UPDATE invoices 
-            SET financial_year = '2024-25' 
-            WHERE financial_year IS NULL
-        """)
-        
-        # Update existing business profiles to have current financial year
-        conn.exec_driver_sql("""
-            UPDATE business_profiles 
-            SET current_financial_year = '2024-25' 
-            WHERE current_financial_year IS NULL
-        """)
-        
-        # Set timestamp values for existing records - only if columns exist
-        if _sqlite_column_exists(conn, "invoices", "updated_at"):
-            conn.exec_driver_sql("""
-                UPDATE invoices 
-                SET updated_at = created_at 
-                WHERE updated_at IS NULL
-            """)
-        
-        if _sqlite_column_exists(conn, "invoice_items", "created_at"):
-            conn.exec_driver_sql("""
-                UPDATE invoice_items 
-                SET created_at = datetime('now'), updated_at = datetime('now') 
-                WHERE created_at IS NULL
-            """)
-        
-        # Create library_items table if it doesn't exist
-        if not _sqlite_table_exists(conn, "library_items"):
-            conn.exec_driver_sql("""
-                CREATE TABLE library_items (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    description VARCHAR NOT NULL,
-                    hsn_code VARCHAR,
-                    sac_code VARCHAR,
-                    gst_rate FLOAT DEFAULT 0.0,
-                    unit VARCHAR DEFAULT 'Nos',
-                    category VARCHAR,
-                    is_active BOOLEAN DEFAULT 1,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id)
-                )
-            """)
-        
-        # Add new user fields for onboarding
-        if not _sqlite_column_exists(conn, "users", "phone"):
-            conn.exec_driver_sql("ALTER TABLE users ADD COLUMN phone VARCHAR")
-        if not _sqlite_column_exists(conn, "users", "profile_picture"):
-            conn.exec_driver_sql("ALTER TABLE users ADD COLUMN profile_picture VARCHAR")
-        if not _sqlite_column_exists(conn, "users", "onboarding_completed"):
-            conn.exec_driver_sql("ALTER TABLE users ADD COLUMN onboarding_completed BOOLEAN DEFAULT 0")
-        if not _sqlite_column_exists(conn, "users", "business_type"):
-            conn.exec_driver_sql("ALTER TABLE users ADD COLUMN business_type VARCHAR")
-        if not _sqlite_column_exists(conn, "users", "onboarding_step"):
-            conn.exec_driver_sql("ALTER TABLE users ADD COLUMN onboarding_step VARCHAR DEFAULT 'business_type'")
-        if not _sqlite_column_exists(conn, "users", "updated_at"):
-            conn.exec_driver_sql("ALTER TABLE users ADD COLUMN updated_at DATETIME")
-        if not _sqlite_column_exists(conn, "users", "last_login"):
-            conn.exec_driver_sql("ALTER TABLE users ADD COLUMN last_login DATETIME")
-        
-        # Note: New business profile fields are handled in the model but not added to existing tables
-        # to maintain backward compatibility. New users will get the full schema.
-        
-        # Create service_templates table if it doesn't exist
-        if not _sqlite_table_exists(conn, "service_templates"):
-            conn.exec_driver_sql("""
-                CREATE TABLE service_templates (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER NOT NULL,
-                    business_profile_id INTEGER NOT NULL,
-                    description VARCHAR NOT NULL,
-                    sac_code VARCHAR NOT NULL,
-                    gst_rate FLOAT NOT NULL,
-                    hsn_code VARCHAR,
-                    unit VARCHAR DEFAULT 'Nos',
-                    base_rate FLOAT NOT NULL,
-                    currency VARCHAR DEFAULT 'INR',
-                    payment_terms VARCHAR DEFAULT 'Net 30 days',
-                    min_quantity FLOAT DEFAULT 1.0,
-                    max_quantity FLOAT,
-                    is_active BOOLEAN DEFAULT 1,
-                    is_default BOOLEAN DEFAULT 0,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users (id),
-                    FOREIGN KEY (business_profile_id) REFERENCES business_profiles (id)
-                )
-            """)
-        
-        # Set timestamp values for existing records - only if columns exist
-        if _sqlite_column_exists(conn, "users", "updated_at"):
-            conn.exec_driver_sql("""
-                UPDATE users 
-                SET updated_at = created_at 
-                WHERE updated_at IS NULL
-            """)
-        
-        # Create master_services table if it doesn't exist
-        if not _sqlite_table_exists(conn, "master_services"):
-            conn.exec_driver_sql("""
-                CREATE TABLE master_services (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name VARCHAR NOT NULL,
-                    description VARCHAR NOT NULL,
-                    sac_code VARCHAR,
-                    gst_rate FLOAT DEFAULT 0.0,
-                    hsn_code VARCHAR,
-                    category VARCHAR,
-                    subcategory VARCHAR,
-                    business_type VARCHAR,
-                    keywords TEXT,
-                    tags TEXT,
-                    unit VARCHAR DEFAULT 'Nos',
-                    is_active BOOLEAN DEFAULT 1,
-                    usage_count INTEGER DEFAULT 0,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-        else:
-            # Add missing columns to existing master_services table
-            if not _sqlite_column_exists(conn, "master_services", "subcategory"):
-                conn.exec_driver_sql("ALTER TABLE master_services ADD COLUMN subcategory VARCHAR")
-            if not _sqlite_column_exists(conn, "master_services", "business_type"):
-                conn.exec_driver_sql("ALTER TABLE master_services ADD COLUMN business_type VARCHAR")
-            if not _sqlite_column_exists(conn, "master_services", "keywords"):
-                conn.exec_driver_sql("ALTER TABLE master_services ADD COLUMN keywords TEXT")
-            if not _sqlite_column_exists(conn, "master_services", "tags"):
-                conn.exec_driver_sql("ALTER TABLE master_services ADD COLUMN tags TEXT")
-            if not _sqlite_column_exists(conn, "master_services", "usage_count"):
-                conn.exec_driver_sql("ALTER TABLE master_services ADD COLUMN usage_count INTEGER DEFAULT 0")
-            if not _sqlite_column_exists(conn, "master_services", "created_at"):
-                conn.exec_driver_sql("ALTER TABLE master_services ADD COLUMN created_at DATETIME DEFAULT CURRENT_TIMESTAMP")
-            if not _sqlite_column_exists(conn, "master_services", "updated_at"):
-                conn.exec_driver_sql("ALTER TABLE master_services ADD COLUMN updated_at DATETIME DEFAULT CURRENT_TIMESTAMP")
-
-        if _sqlite_column_exists(conn, "business_profiles", "updated_at"):
-            conn.exec_driver_sql("""
-                UPDATE business_profiles 
-                SET updated_at = datetime('now') 
-                WHERE updated_at IS NULL
-            """)
-        
-        conn.commit()
\ No newline at end of file
+def get_read_db():
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+# Async engine for handlers that should not block the event loop while a query runs.
+# Same database as DATABASE_URL, reached through asyncpg (Postgres) or aiosqlite (SQLite).
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+
+
+def async_database_url(url: str) -> str:
+    parsed = make_url(url)
+    return parsed.set(drivername=ASYNC_DRIVERS.get(parsed.get_backend_name(), parsed.drivername)).render_as_string(hide_password=False)
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(DATABASE_URL)
+ASYNC_READ_DATABASE_URL = async_database_url(READ_DATABASE_URL) if read_engine is not engine else ASYNC_DATABASE_URL
+
+
+async_engine = build_engine(ASYNC_DATABASE_URL, is_async=True)
+async_read_engine = async_engine if ASYNC_READ_DATABASE_URL == ASYNC_DATABASE_URL else build_engine(ASYNC_READ_DATABASE_URL, is_async=True)
+if TUNED_SQLITE:
+    configure_sqlite(async_engine)
+    if async_read_engine is not async_engine:
+        configure_sqlite(async_read_engine, read_only=True)
+
+# By role; a read engine is the same object as its write engine unless reads go to a separate URL
+ENGINES = {"write": engine, "read": read_engine, "async_write": async_engine, "async_read": async_read_engine}
+
+for _engine in {id(e): e for e in ENGINES.values()}.values():
+    query_metrics.instrument(_engine)
+
+# Objects stay readable after commit; lazy loads cannot run outside the session's greenlet anyway
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+async def get_async_read_db():
+    async with AsyncReadSessionLocal() as db:
+        yield db
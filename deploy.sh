@@ -35,13 +35,7 @@ pip install -r requirements.txt
 # Run migrations for production
 if [ "$ENV" = "prod" ]; then
     echo "🗄️  Running database migrations..."
-    python -c "
-from database import engine, Base
-from models import *
-print('Creating PostgreSQL schema...')
-Base.metadata.create_all(bind=engine)
-print('✅ Schema created successfully!')
-"
+    python migrate.py
     
     echo "📊 Populating master data..."
     python manage_master_data.py populate
@@ -48,13 +48,7 @@ ssh -i "$KEY_FILE" ubuntu@$EC2_IP << 'ENDSSH'
     cp .env.production .env
     
     # Run migrations
-    python -c "
-from database import engine, Base
-from models import *
-print('Creating PostgreSQL schema...')
-Base.metadata.create_all(bind=engine)
-print('✅ Schema created successfully!')
-"
+    python migrate.py
     
     # Populate master data
     python manage_master_data.py populate
@@ -0,0 +1,98 @@
+"""
+Typo-tolerant term lookup for HSN/SAC search (SymSpell-style symmetric deletes).
+
+Every vocabulary word is stored under each string obtained by deleting up to
+``max_edit_distance`` characters from its first ``prefix_length`` characters.
+A query term generates its own deletes the same way, and any word that shares
+one is a candidate. Only those candidates get a real edit distance
+(optimal string alignment, so transpositions count as one edit). A lookup
+costs a handful of dict probes regardless of vocabulary size, where scanning
+the vocabulary with SequenceMatcher costs one comparison per word.
+"""
+from typing import Dict, List, Mapping, Set, Tuple
+
+
+MAX_EDIT_DISTANCE = 2
+PREFIX_LENGTH = 7
+MIN_TERM_LENGTH = 4  # shorter terms are too ambiguous to correct
+
+
+def _deletes(word: str, max_distance: int) -> Set[str]:
+    found = set()
+    frontier = {word}
+    for _ in range(max_distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))} - found
+        found |= frontier
+    return found
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Optimal string alignment distance between ``a`` and ``b``, or ``max_distance + 1`` once it is exceeded."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    prev_prev = None
+    prev = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        cur = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            if prev_prev is not None and i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                cur[j] = min(cur[j], prev_prev[j - 2] + 1)
+        if min(cur) > max_distance:
+            return max_distance + 1
+        prev_prev, prev = prev, cur
+    return prev[-1] if prev[-1] <= max_distance else max_distance + 1
+
+
+class FuzzyDictionary:
+    """Vocabulary of alphabetic words with their frequencies (used to break ties between equally close words)."""
+
+    def __init__(
+        self,
+        counts: Mapping[str, int],
+        max_edit_distance: int = MAX_EDIT_DISTANCE,
+        prefix_length: int = PREFIX_LENGTH,
+        min_length: int = MIN_TERM_LENGTH,
+    ):
+        self.max_edit_distance = max_edit_distance
+        self.prefix_length = prefix_length
+        self.min_length = min_length
+        self.counts: Dict[str, int] = {w: n for w, n in counts.items() if w.isalpha()}
+        self._deletes: Dict[str, List[str]] = {}
+        for word in self.counts:
+            key = word[:prefix_length]
+            for d in _deletes(key, max_edit_distance) | {key}:
+                self._deletes.setdefault(d, []).append(word)
+
+    def max_distance_for(self, term: str) -> int:
+        # One typo in a short word already changes a quarter of it
+        return 1 if len(term) <= 5 else self.max_edit_distance
+
+    def lookup(self, term: str, max_distance: int = None) -> List[Tuple[str, int]]:
+        """Vocabulary words within ``max_distance`` edits of ``term`` (itself included), closest and most frequent first."""
+        if max_distance is None:
+            max_distance = self.max_distance_for(term)
+        if len(term) < self.min_length or not term.isalpha():
+            return [(term, 0)] if term in self.counts else []
+        key = term[:self.prefix_length]
+        seen = set()
+        found = []
+        for candidate in _deletes(key, max_distance) | {key}:
+            for word in self._deletes.get(candidate, ()):
+                if word in seen:
+                    continue
+                seen.add(word)
+                distance = edit_distance(term, word, max_distance)
+                if distance <= max_distance:
+                    found.append((word, distance))
+        found.sort(key=lambda wd: (wd[1], -self.counts[wd[0]], wd[0]))
+        return found
+
+    def corrections(self, term: str, limit: int = 3) -> List[str]:
+        """Best replacements for a term that is not itself in the vocabulary (empty if it is, or if none are close)."""
+        matches = self.lookup(term)
+        if not matches or matches[0][1] == 0:
+            return []
+        best = matches[0][1]
+        return [word for word, distance in matches if distance == best][:limit]
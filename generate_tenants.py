@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+"""
+Bulk synthetic tenants for load testing.
+
+The seed and expand scripts fill only the master data, one ORM object at a
+time. This script generates whole tenants:
+
+- a user and a business profile with a valid GSTIN;
+- customers: B2B ones with a GSTIN, B2C ones with only a state;
+- invoices whose items come from ``hsn_codes`` and ``master_services`` and
+  are totalled with ``tax.compute_totals``;
+- the payments against those invoices.
+
+Each customer has payment terms and a habit of paying on time or late. An
+invoice is paid in full, in part, or never. A payment dated after
+``--as-of`` has not happened yet. So old invoices are mostly paid, recent
+ones mostly open, and unpaid invoices past their due date are overdue.
+Tenant sizes follow a long tail unless ``--uniform`` is given. The invoice
+counters and the monthly rollup are written too, so the API serves the new
+tenants straight away.
+
+Rows are buffered and written in batches: ``COPY`` on Postgres, and
+``executemany`` on everything else. Ids are assigned here rather than read
+back, so do not run it against a database that is taking writes. The output
+depends only on the seed, the sizes and ``--as-of``. When ``hsn_codes`` and
+``master_services`` are empty, they are first loaded from
+seed_specific_products and seed_master_services.
+
+    python generate_tenants.py --tenants 200 --invoices 5000 --items 4
+    python generate_tenants.py --tenants 20 --invoices 2000 --uniform --seed 7 --as-of 2025-03-31
+"""
+import argparse
+import csv
+import io
+import random
+import time
+from datetime import date, datetime, timedelta
+from types import SimpleNamespace
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import func, select
+
+from invoice_numbering import financial_year_for, number_prefix
+from models import (
+    BusinessProfile, Customer, HSNCode, Invoice, InvoiceCounter, InvoiceItem, MasterService, Payment, User,
+)
+from tax import compute_totals
+
+
+BATCH_SIZE = 20000
+
+# GST state codes; place of supply and the first two GSTIN digits
+GST_STATES = {
+    "01": "Jammu and Kashmir", "02": "Himachal Pradesh", "03": "Punjab", "04": "Chandigarh",
+    "05": "Uttarakhand", "06": "Haryana", "07": "Delhi", "08": "Rajasthan", "09": "Uttar Pradesh",
+    "10": "Bihar", "11": "Sikkim", "12": "Arunachal Pradesh", "13": "Nagaland", "14": "Manipur",
+    "15": "Mizoram", "16": "Tripura", "17": "Meghalaya", "18": "Assam", "19": "West Bengal",
+    "20": "Jharkhand", "21": "Odisha", "22": "Chhattisgarh", "23": "Madhya Pradesh", "24": "Gujarat",
+    "26": "Dadra and Nagar Haveli and Daman and Diu", "27": "Maharashtra", "29": "Karnataka", "30": "Goa",
+    "31": "Lakshadweep", "32": "Kerala", "33": "Tamil Nadu", "34": "Puducherry",
+    "35": "Andaman and Nicobar Islands", "36": "Telangana", "37": "Andhra Pradesh", "38": "Ladakh",
+}
+# Rough share of registered businesses; unlisted states weigh 1
+STATE_WEIGHTS = {"27": 14, "29": 10, "33": 9, "07": 8, "24": 8, "09": 7, "36": 6, "19": 5, "08": 4, "32": 4, "06": 4}
+
+BUSINESS_WORDS = [
+    "Sri Lakshmi", "Ganesh", "Shree", "Balaji", "Sai", "Krishna", "Om", "Royal", "Metro", "Sunrise", "Apex",
+    "Global", "Bharat", "National", "Star", "Perfect", "Modern", "United", "Annapurna", "Vinayaka", "Kaveri",
+    "Ganga", "Everest", "Pioneer", "Reliable", "Classic", "Supreme", "Galaxy", "Janata", "Navrang",
+]
+TRADES = [
+    "Traders", "Enterprises", "Electricals", "Agencies", "Textiles", "Steels", "Motors", "Solutions",
+    "Technologies", "Associates", "Distributors", "Hardware", "Pharma", "Foods", "Constructions", "Exports",
+]
+COMPANY_SUFFIXES = ["", "", " Pvt Ltd", " LLP", " & Co"]
+FIRST_NAMES = [
+    "Aarav", "Vivaan", "Aditya", "Rohan", "Arjun", "Rahul", "Amit", "Suresh", "Ramesh", "Vikram", "Priya",
+    "Ananya", "Diya", "Kavya", "Neha", "Pooja", "Sneha", "Lakshmi", "Meera", "Fatima", "Imran", "Joseph",
+]
+SURNAMES = [
+    "Sharma", "Verma", "Patel", "Shah", "Reddy", "Nair", "Iyer", "Rao", "Gupta", "Singh", "Kumar", "Das",
+    "Banerjee", "Mehta", "Joshi", "Kulkarni", "Pillai", "Khan", "Fernandes", "Agarwal",
+]
+STREETS = ["MG Road", "Station Road", "Main Bazaar", "Industrial Area", "Ring Road", "Market Yard", "Gandhi Nagar", "Civil Lines"]
+BANKS = [("State Bank of India", "SBIN"), ("HDFC Bank", "HDFC"), ("ICICI Bank", "ICIC"), ("Axis Bank", "UTIB"), ("Canara Bank", "CNRB")]
+
+PAYMENT_TERMS = [0, 7, 15, 30, 30, 30, 45, 60]  # days; 0 is cash on delivery
+PAYMENT_METHODS = ["UPI", "BANK", "CASH", "OTHER"]
+PAYMENT_METHOD_WEIGHTS = [40, 40, 15, 5]
+
+USER_COLUMNS = ("id", "cognito_sub", "email", "full_name", "phone", "onboarding_completed", "business_type",
+                "onboarding_step", "created_at", "updated_at")
+PROFILE_COLUMNS = ("user_id", "business_name", "gstin", "pan", "address", "state_code", "phone", "email",
+                   "turnover_category", "bank_account_name", "bank_name", "bank_account_number", "bank_ifsc",
+                   "upi_id", "accepts_cash")
+CUSTOMER_COLUMNS = ("id", "user_id", "name", "gstin", "phone", "email", "address", "state_code")
+INVOICE_COLUMNS = ("id", "user_id", "invoice_number", "financial_year", "date", "due_date", "seller_gstin",
+                   "seller_state_code", "seller_pan", "buyer_id", "place_of_supply", "place_of_supply_code",
+                   "reverse_charge", "subtotal", "discount", "taxable_value", "cgst", "sgst", "igst", "total",
+                   "round_off", "status", "paid_on", "created_at", "updated_at")
+ITEM_COLUMNS = ("invoice_id", "description", "hsn_code", "sac_code", "quantity", "unit", "rate", "discount_percent",
+                "discount_amount", "taxable_value", "gst_rate", "cgst_rate", "cgst_amount", "sgst_rate",
+                "sgst_amount", "igst_rate", "igst_amount", "amount", "tax_amount", "total_amount", "created_at",
+                "updated_at")
+PAYMENT_COLUMNS = ("invoice_id", "amount", "method", "date", "ref", "created_at")
+COUNTER_COLUMNS = ("user_id", "financial_year", "next_value", "updated_at")
+
+# Written in this order, parents first
+TABLES = [
+    (User.__table__, USER_COLUMNS),
+    (BusinessProfile.__table__, PROFILE_COLUMNS),
+    (Customer.__table__, CUSTOMER_COLUMNS),
+    (Invoice.__table__, INVOICE_COLUMNS),
+    (InvoiceItem.__table__, ITEM_COLUMNS),
+    (Payment.__table__, PAYMENT_COLUMNS),
+    (InvoiceCounter.__table__, COUNTER_COLUMNS),
+]
+
+_GSTIN_CHARS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+_LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def gstin_check_digit(first14: str) -> str:
+    """Check character of a GSTIN: base-36 Luhn over the first 14 characters."""
+    total = 0
+    for i, ch in enumerate(first14):
+        product = _GSTIN_CHARS.index(ch) * (2 if i % 2 else 1)
+        total += product // 36 + product % 36
+    return _GSTIN_CHARS[(36 - total % 36) % 36]
+
+
+def random_pan(rng: random.Random, holder_type: str, name: str) -> str:
+    """PAN: 3 letters, holder type (C company, F firm, P person), initial of the name, 4 digits, a letter."""
+    initial = next((ch for ch in name.upper() if ch in _LETTERS), "X")
+    return (
+        "".join(rng.choice(_LETTERS) for _ in range(3)) + holder_type + initial
+        + f"{rng.randrange(10000):04d}" + rng.choice(_LETTERS)
+    )
+
+
+def make_gstin(state_code: str, pan: str, entity: int = 1) -> str:
+    first14 = f"{state_code}{pan}{_GSTIN_CHARS[entity]}Z"
+    return first14 + gstin_check_digit(first14)
+
+
+def master_catalogue() -> Tuple[List[dict], List[dict]]:
+    """(products, services) as defined by the seed scripts."""
+    from seed_master_services import get_master_services_data
+    from seed_specific_products import get_specific_products_data
+
+    return get_specific_products_data(), get_master_services_data()
+
+
+def load_master_data(conn) -> None:
+    """Fill empty hsn_codes / master_services from the seed scripts' data."""
+    from hsn_service import HSN_CODES
+
+    products, services = master_catalogue()
+    now = datetime.utcnow()
+    # hsn_codes.code is unique but several products share a code: keep the first of each,
+    # then add the hsn_data.json codes that no product uses
+    by_code = {}
+    for product in products:
+        by_code.setdefault(product["code"], product)
+    for entry in HSN_CODES:
+        by_code.setdefault(entry["code"], {"code": entry["code"], "description": entry["desc"], "gst_rate": entry["gst"], "type": entry["type"]})
+    # executemany needs the same keys in every row
+    hsn_columns = ("code", "description", "gst_rate", "type", "category", "subcategory", "keywords", "tags", "business_type")
+    service_columns = ("name", "description", "sac_code", "gst_rate", "category", "subcategory", "business_type", "keywords", "tags")
+    if not conn.scalar(select(func.count()).select_from(HSNCode)):
+        conn.execute(HSNCode.__table__.insert(), [
+            {**{key: row.get(key) for key in hsn_columns}, "unit": row.get("unit") or "Nos", "is_active": True,
+             "usage_count": 0, "source": "seed", "created_at": now, "updated_at": now}
+            for row in by_code.values()
+        ])
+    if not conn.scalar(select(func.count()).select_from(MasterService)):
+        conn.execute(MasterService.__table__.insert(), [
+            {**{key: service.get(key) for key in service_columns}, "unit": service.get("unit") or "Nos", "is_active": True,
+             "usage_count": 0, "created_at": now, "updated_at": now}
+            for service in services
+        ])
+
+
+def load_catalogue(conn) -> Dict[str, List[tuple]]:
+    """Active master data as (description, hsn_code, sac_code, gst_rate, unit), split into goods and services."""
+    goods, services = [], []
+    for description, code, gst_rate, unit, kind in conn.execute(
+        select(HSNCode.description, HSNCode.code, HSNCode.gst_rate, HSNCode.unit, HSNCode.type).where(HSNCode.is_active.is_(True))
+    ):
+        if kind == "SAC":
+            services.append((description, None, code, gst_rate, unit or "Nos"))
+        else:
+            goods.append((description, code, None, gst_rate, unit or "Nos"))
+    for description, sac_code, gst_rate, unit in conn.execute(
+        select(MasterService.description, MasterService.sac_code, MasterService.gst_rate, MasterService.unit).where(MasterService.is_active.is_(True))
+    ):
+        services.append((description, None, sac_code, gst_rate, unit or "Nos"))
+    return {"product": goods or services, "service": services or goods, "mixed": goods + services}
+
+
+class BulkWriter:
+    """Buffers rows per table and writes them parents first, with COPY on Postgres and executemany elsewhere.
+
+    Rows are tuples of plain values (dates already as text) handed to the driver as they are, skipping
+    SQLAlchemy's per-row parameter processing, which costs more than the insert itself.
+    """
+
+    def __init__(self, conn, batch_size: int = BATCH_SIZE):
+        self.conn = conn
+        self.batch_size = batch_size
+        self.copy = conn.dialect.name == "postgresql"
+        self.marker = "?" if conn.dialect.paramstyle == "qmark" else "%s"
+        self.rows: Dict[str, list] = {table.name: [] for table, _ in TABLES}
+        self.pending = 0
+        self.written: Dict[str, int] = {table.name: 0 for table, _ in TABLES}
+
+    def add(self, table_name: str, row: tuple) -> None:
+        self.rows[table_name].append(row)
+        self.pending += 1
+
+    def flush_if_full(self) -> None:
+        if self.pending >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        for table, columns in TABLES:
+            rows = self.rows[table.name]
+            if not rows:
+                continue
+            if self.copy:
+                self._copy(table.name, columns, rows)
+            else:
+                self.conn.exec_driver_sql(
+                    f"INSERT INTO {table.name} ({', '.join(columns)}) VALUES ({', '.join([self.marker] * len(columns))})", rows,
+                )
+            self.written[table.name] += len(rows)
+            rows.clear()
+        self.conn.commit()
+        self.pending = 0
+
+    def _copy(self, table_name: str, columns: tuple, rows: list) -> None:
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)  # None is written as an empty field, which COPY reads as NULL
+        buffer.seek(0)
+        cursor = self.conn.connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {table_name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+        finally:
+            cursor.close()
+
+
+class Generated(NamedTuple):
+    user_ids: List[int]
+    rows: Dict[str, int]  # table -> rows written
+
+
+def _timestamp(value: datetime) -> str:
+    # The text SQLAlchemy stores for a DateTime on SQLite; Postgres parses it from COPY as well
+    return value.strftime("%Y-%m-%d %H:%M:%S.%f")
+
+
+def _next_id(conn, model) -> int:
+    return (conn.scalar(select(func.max(model.id))) or 0) + 1
+
+
+def _sync_sequences(conn) -> None:
+    """Move the Postgres id sequences past the ids assigned here."""
+    if conn.dialect.name != "postgresql":
+        return
+    for model in (User, Customer, Invoice):
+        table = model.__tablename__
+        conn.exec_driver_sql(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT max(id) FROM {table}))")
+    conn.commit()
+
+
+def tenant_sizes(rng: random.Random, tenants: int, invoices: int, uniform: bool) -> List[int]:
+    """Invoices per tenant averaging ``invoices``: a few large tenants and a long tail of small ones."""
+    if uniform:
+        return [invoices] * tenants
+    weights = [rng.paretovariate(1.5) for _ in range(tenants)]
+    scale = invoices * tenants / sum(weights)
+    return [max(1, round(w * scale)) for w in weights]
+
+
+def _business_name(rng: random.Random) -> str:
+    return f"{rng.choice(BUSINESS_WORDS)} {rng.choice(TRADES)}{rng.choice(COMPANY_SUFFIXES)}"
+
+
+def _person_name(rng: random.Random) -> str:
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)}"
+
+
+def _phone(rng: random.Random) -> str:
+    return f"+91{rng.choice('6789')}{rng.randrange(10 ** 9):09d}"
+
+
+def _address(rng: random.Random, state_code: str) -> str:
+    return f"{rng.randint(1, 450)}, {rng.choice(STREETS)}, {GST_STATES[state_code]}"
+
+
+def _pick_state(rng: random.Random, states: List[str], weights: List[int]) -> str:
+    return rng.choices(states, weights)[0]
+
+
+def _payments(rng: random.Random, inv_date: date, total: float, terms: int, pays_late: bool, as_of: date) -> List[tuple]:
+    """(amount, date) of the payments received by ``as_of``."""
+    outcome = rng.random()
+    if outcome < 0.07:  # never paid
+        return []
+    if outcome < 0.12:  # paid in part
+        paid_on = inv_date + timedelta(days=rng.randint(0, max(terms, 1)))
+        return [(round(total * rng.uniform(0.2, 0.8), 2), paid_on)] if paid_on <= as_of else []
+    delay = terms + int(rng.expovariate(1 / 20)) if pays_late else int(terms * rng.uniform(0.3, 1.0))
+    paid_on = inv_date + timedelta(days=delay)
+    if paid_on > as_of:
+        return []
+    if total > 10000 and rng.random() < 0.15:  # two instalments
+        first = round(total * rng.uniform(0.3, 0.7), 2)
+        first_on = inv_date + timedelta(days=rng.randint(0, delay))
+        return [(first, first_on), (round(total - first, 2), paid_on)]
+    return [(total, paid_on)]
+
+
+def generate(
+    engine,
+    tenants: int,
+    invoices: int,
+    items: int,
+    customers: Optional[int] = None,
+    seed: int = 42,
+    uniform: bool = False,
+    months: int = 24,
+    as_of: Optional[date] = None,
+    batch_size: int = BATCH_SIZE,
+) -> Generated:
+    """Write ``tenants`` tenants averaging ``invoices`` invoices of about ``items`` items each."""
+    from sqlalchemy.orm import Session
+
+    from monthly_rollup import backfill
+
+    rng = random.Random(seed)
+    as_of = as_of or date.today()
+    now = _timestamp(datetime.utcnow())
+    states = list(GST_STATES)
+    state_weights = [STATE_WEIGHTS.get(code, 1) for code in states]
+
+    with engine.connect() as conn:
+        load_master_data(conn)
+        conn.commit()
+        catalogue = load_catalogue(conn)
+        if not catalogue["mixed"]:
+            raise SystemExit("hsn_codes and master_services have no active rows to draw items from")
+        user_id, customer_id, invoice_id = _next_id(conn, User), _next_id(conn, Customer), _next_id(conn, Invoice)
+        writer = BulkWriter(conn, batch_size)
+        user_ids = []
+
+        for size in tenant_sizes(rng, tenants, invoices, uniform):
+            user_ids.append(user_id)
+            business_type = rng.choices(["product", "service", "mixed"], [35, 35, 30])[0]
+            business_name = _business_name(rng)
+            owner = _person_name(rng)
+            seller_state = _pick_state(rng, states, state_weights)
+            pan = random_pan(rng, "C" if "Pvt" in business_name else rng.choice("FP"), business_name)
+            seller_gstin = make_gstin(seller_state, pan)
+            bank_name, ifsc_prefix = rng.choice(BANKS)
+            slug = f"tenant{user_id}"
+            writer.add("users", (
+                user_id, f"synthetic-{user_id}", f"owner@{slug}.example.com", owner, _phone(rng), True,
+                business_type, "completed", now, now,
+            ))
+            writer.add("business_profiles", (
+                user_id, business_name, seller_gstin, pan, _address(rng, seller_state), seller_state, _phone(rng),
+                f"accounts@{slug}.example.com", rng.choice(["below_5cr", "below_5cr", "5cr_plus"]), business_name,
+                bank_name, f"{rng.randrange(10 ** 11, 10 ** 12)}", f"{ifsc_prefix}0{rng.randrange(10 ** 6):06d}",
+                f"{slug}@upi", rng.choice(["YES", "NO"]),
+            ))
+
+            # A tenant sells a range of 5-40 catalogue entries, each at its own price
+            pool = catalogue[business_type]
+            offer = [(entry, round(max(10.0, rng.lognormvariate(7, 1.1)), 2)) for entry in rng.sample(pool, min(len(pool), rng.randint(5, 40)))]
+
+            buyers = []  # (id, state, gstin, terms, pays_late)
+            for _ in range(customers or max(3, size // 25)):
+                # Most buyers are in the seller's state; B2B buyers have a GSTIN
+                buyer_state = seller_state if rng.random() < 0.6 else _pick_state(rng, states, state_weights)
+                if rng.random() < 0.7:
+                    name = _business_name(rng)
+                    gstin = make_gstin(buyer_state, random_pan(rng, "C" if "Pvt" in name else "F", name))
+                else:
+                    name, gstin = _person_name(rng), None
+                writer.add("customers", (
+                    customer_id, user_id, name, gstin, _phone(rng), f"buyer{customer_id}@example.com",
+                    _address(rng, buyer_state), buyer_state,
+                ))
+                buyers.append((customer_id, buyer_state, gstin, rng.choice(PAYMENT_TERMS), rng.random() < 0.25))
+                customer_id += 1
+
+            # Numbers follow the dates, as they would have been issued
+            dates = sorted(as_of - timedelta(days=rng.randint(0, months * 30)) for _ in range(size))
+            sequence: Dict[str, int] = {}
+            for inv_date in dates:
+                financial_year = financial_year_for(inv_date)
+                sequence[financial_year] = sequence.get(financial_year, 0) + 1
+                buyer_id, buyer_state, _, terms, pays_late = rng.choice(buyers)
+                count = items if uniform else rng.randint(1, max(1, 2 * items - 1))
+                lines = [
+                    SimpleNamespace(entry=entry, rate=rate, gst_rate=entry[3], quantity=float(rng.choice([1, 1, 2, 3, 5, 10, 25])))
+                    for entry, rate in rng.choices(offer, k=count)
+                ]
+                subtotal, cgst, sgst, igst, total = compute_totals(lines, seller_state, buyer_state)
+                payments = _payments(rng, inv_date, total, terms, pays_late, as_of)
+                paid = round(sum(amount for amount, _ in payments), 2)
+                status = "PAID" if payments and paid >= total else "PARTIALLY_PAID" if payments else "UNPAID"
+                created = _timestamp(datetime.combine(inv_date, datetime.min.time()) + timedelta(seconds=rng.randint(9 * 3600, 20 * 3600)))
+                writer.add("invoices", (
+                    invoice_id, user_id, f"{number_prefix(financial_year)}{sequence[financial_year]:06d}",
+                    financial_year, inv_date.isoformat(), (inv_date + timedelta(days=terms)).isoformat(), seller_gstin, seller_state, pan,
+                    buyer_id, buyer_state, buyer_state, False, subtotal, 0.0, subtotal, cgst, sgst, igst, total, 0.0,
+                    status, payments[-1][1].isoformat() if status == "PAID" else None, created, created,
+                ))
+                intrastate = igst == 0
+                for line in lines:
+                    description, hsn_code, sac_code, gst_rate, unit = line.entry
+                    half_rate = gst_rate / 2 if intrastate else 0.0
+                    half_tax = round(line.tax_amount / 2, 2) if intrastate else 0.0
+                    writer.add("invoice_items", (
+                        invoice_id, description, hsn_code, sac_code, line.quantity, unit, line.rate, 0.0, 0.0,
+                        line.amount, gst_rate, half_rate, half_tax, half_rate, half_tax,
+                        0.0 if intrastate else gst_rate, 0.0 if intrastate else line.tax_amount,
+                        line.amount, line.tax_amount, round(line.amount + line.tax_amount, 2), created, created,
+                    ))
+                for amount, paid_on in payments:
+                    method = "CASH" if terms == 0 else rng.choices(PAYMENT_METHODS, PAYMENT_METHOD_WEIGHTS)[0]
+                    ref = f"{method}{rng.randrange(10 ** 11, 10 ** 12)}" if method in ("UPI", "BANK") else None
+                    writer.add("payments", (invoice_id, amount, method, paid_on.isoformat(), ref, f"{paid_on} 00:00:00.000000"))
+                invoice_id += 1
+                writer.flush_if_full()
+
+            for financial_year, last in sequence.items():
+                writer.add("invoice_counters", (user_id, financial_year, last + 1, now))
+            user_id += 1
+
+        writer.flush()
+        _sync_sequences(conn)
+
+    with Session(engine) as db:
+        backfill(db)  # bulk inserts bypass the handlers that maintain the rollup
+    return Generated(user_ids, writer.written)
+
+
+def main():
+    from database import engine
+    from migrate import migrate
+
+    parser = argparse.ArgumentParser(description="Bulk-generate synthetic tenants for load testing")
+    parser.add_argument("--tenants", type=int, default=100)
+    parser.add_argument("--invoices", type=int, default=1000, help="Invoices per tenant (the mean unless --uniform)")
+    parser.add_argument("--items", type=int, default=4, help="Items per invoice (the mean unless --uniform)")
+    parser.add_argument("--customers", type=int, default=None, help="Customers per tenant (default: one per 25 invoices)")
+    parser.add_argument("--months", type=int, default=24, help="Spread invoice dates over this many months")
+    parser.add_argument("--as-of", type=date.fromisoformat, default=None, help="Generate as if today were this date")
+    parser.add_argument("--uniform", action="store_true", help="Exactly --invoices and --items everywhere")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="Rows buffered per write")
+    args = parser.parse_args()
+
+    migrate(engine, verbose=False)
+    start = time.perf_counter()
+    result = generate(
+        engine, args.tenants, args.invoices, args.items, args.customers, args.seed, args.uniform, args.months,
+        args.as_of, args.batch_size,
+    )
+    elapsed = time.perf_counter() - start
+    rows = sum(result.rows.values())
+    print(f"✅ Generated {len(result.user_ids)} tenants (user ids {result.user_ids[0]}-{result.user_ids[-1]}) in {elapsed:.1f}s, {rows / elapsed:,.0f} rows/s")
+    for table, count in result.rows.items():
+        print(f"   {table:<18} {count:>12,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Liveness and readiness probes for the load balancer.
+
+``/health/live`` checks no dependencies. It only shows that the worker's
+event loop is serving requests, so a slow database never gets healthy
+workers restarted.
+
+``/health/ready`` answers 503 while this worker would only queue or fail new
+requests, so the balancer sends traffic elsewhere instead of waiting out
+timeouts. A worker is not ready when:
+
+- a ``SELECT 1`` on an async engine fails or takes longer than
+  ``HEALTH_DB_TIMEOUT_MS``;
+- a connection pool has ``HEALTH_POOL_MAX_SATURATION`` of its connections
+  (``pool_size + max_overflow``) checked out;
+- the PDF render queue holds ``HEALTH_PDF_MAX_SATURATION`` of
+  ``PDF_RENDER_MAX_QUEUE``, past which renders answer 503;
+- the HSN search index has not been built yet.
+
+Every check is reported with its figures, and a worker flipping between
+ready and not ready is logged.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Tuple
+
+from sqlalchemy import text
+
+from database import ENGINES
+from hsn_index import hsn_index
+from pdf_executor import pdf_executor
+from pool_metrics import pool_snapshot
+
+
+HEALTH_DB_TIMEOUT_MS = float(os.getenv("HEALTH_DB_TIMEOUT_MS", "1000"))
+HEALTH_POOL_MAX_SATURATION = float(os.getenv("HEALTH_POOL_MAX_SATURATION", "1.0"))
+HEALTH_PDF_MAX_SATURATION = float(os.getenv("HEALTH_PDF_MAX_SATURATION", "1.0"))
+
+STARTED_AT = time.monotonic()
+
+logger = logging.getLogger(__name__)
+_last_ready = True
+
+
+def _distinct_engines(names) -> Dict[str, object]:
+    engines = {}
+    for name in names:
+        if all(ENGINES[name] is not e for e in engines.values()):
+            engines[name] = ENGINES[name]
+    return engines
+
+
+def liveness() -> dict:
+    return {"status": "ok", "pid": os.getpid(), "uptime_seconds": round(time.monotonic() - STARTED_AT, 1)}
+
+
+async def probe_database(engine) -> dict:
+    """Round trip of ``SELECT 1``, including the pool checkout."""
+    async def ping():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    start = time.perf_counter()
+    try:
+        await asyncio.wait_for(ping(), HEALTH_DB_TIMEOUT_MS / 1000)
+    except asyncio.TimeoutError:
+        return {"ok": False, "error": f"no answer within {HEALTH_DB_TIMEOUT_MS:.0f} ms"}
+    except Exception as e:
+        return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    return {"ok": True, "latency_ms": round((time.perf_counter() - start) * 1000, 2)}
+
+
+def pool_check(engine) -> dict:
+    snapshot = pool_snapshot(engine)
+    if "size" not in snapshot:
+        return {"ok": True, "pool": snapshot["pool"]}  # NullPool: nothing to saturate
+    capacity = snapshot["size"] + snapshot["max_overflow"]
+    saturation = snapshot["checked_out"] / capacity if capacity else 1.0
+    return {
+        "ok": saturation < HEALTH_POOL_MAX_SATURATION,
+        "checked_out": snapshot["checked_out"],
+        "capacity": capacity,
+        "saturation": round(saturation, 2),
+        "timeouts": snapshot.get("timeouts", 0),
+    }
+
+
+def pdf_check() -> dict:
+    stats = pdf_executor.stats()
+    saturation = stats["in_flight"] / stats["max_queue"]
+    return {
+        "ok": saturation < HEALTH_PDF_MAX_SATURATION,
+        "in_flight": stats["in_flight"],
+        "queued": stats["queued"],
+        "max_queue": stats["max_queue"],
+        "saturation": round(saturation, 2),
+    }
+
+
+def hsn_check() -> dict:
+    entries = hsn_index.size
+    return {"ok": entries is not None, "entries": entries}
+
+
+async def readiness() -> Tuple[bool, dict]:
+    """(ready, checks) for this worker."""
+    global _last_ready
+    # Pool gauges first, so the probes' own checkouts are not counted
+    checks = {f"pool_{name}": pool_check(engine) for name, engine in _distinct_engines(ENGINES).items()}
+    probed = _distinct_engines(["async_write", "async_read"])
+    results = await asyncio.gather(*(probe_database(engine) for engine in probed.values()))
+    checks.update({f"db_{name}": result for name, result in zip(probed, results)})
+    checks["pdf_executor"] = pdf_check()
+    checks["hsn_index"] = hsn_check()
+
+    ready = all(check["ok"] for check in checks.values())
+    if ready != _last_ready:
+        _last_ready = ready
+        if ready:
+            logger.info("Worker ready again")
+        else:
+            logger.warning("Worker not ready", extra={"failing": [name for name, check in checks.items() if not check["ok"]]})
+    return ready, checks
@@ -0,0 +1,305 @@
+"""
+In-memory search index over ``hsn_codes`` for the /hsn/search autocomplete.
+
+``lower(col) LIKE '%q%'`` cannot use any index, so the old query scanned the
+whole table on every keystroke. The index is built once from the active
+``HSNCode`` rows and holds:
+
+- an inverted index from each word of the description, keywords and
+  category/subcategory to the entries containing it;
+- a sorted vocabulary, so a partly typed word ("lapt") is matched by bisecting
+  to the words that start with it;
+- every prefix of every code ("84", "847", "8471").
+
+Each query token must match an entry's code or one of its words (exact or as
+a prefix). A token that matches nothing is looked up in a ``FuzzyDictionary``
+of the vocabulary and replaced by its closest spellings. Entries are ranked
+by match quality, then ``usage_count``, then code.
+
+Every worker holds its own index. The fuzzy dictionary is most of its size:
+for the full ~20k-entry HSN/SAC schedule it takes roughly 70 MB and a few
+seconds of CPU. It is therefore built only when a token first matches nothing,
+and ``HSN_FUZZY_SEARCH=false`` turns typo correction off altogether. The
+rankings of the one- and two-character prefixes are still built with the
+index, so the first keystrokes are fast. At that size they take about a second.
+
+The index is rebuilt when the table's fingerprint (row count, max id, latest
+``updated_at``) changes. That is checked at most every
+``HSN_INDEX_REFRESH_SECONDS``, so edits made by the seed/manage scripts are
+picked up without a restart.
+"""
+import heapq
+import logging
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from fuzzy_terms import MIN_TERM_LENGTH, FuzzyDictionary
+from models import HSNCode
+
+
+logger = logging.getLogger(__name__)
+
+HSN_INDEX_REFRESH_SECONDS = float(os.getenv("HSN_INDEX_REFRESH_SECONDS", "60"))
+HSN_FUZZY_SEARCH = os.getenv("HSN_FUZZY_SEARCH", "true").lower() == "true"
+TOKEN_CACHE_SIZE = 4096
+
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Match quality per query token, by where it matched
+CODE_EXACT = 100
+CODE_PREFIX = 80
+# field weight -> (exact word, word prefix, typo-corrected word)
+DESCRIPTION, KEYWORD, CATEGORY = 3, 2, 1
+WORD_QUALITY = {DESCRIPTION: (60, 40, 25), KEYWORD: (50, 30, 20), CATEGORY: (30, 20, 10)}
+PHRASE_PREFIX_BONUS = 50
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _WORD_RE.findall((text or "").lower())
+
+
+class _Entry:
+    __slots__ = ("id", "code", "type", "category", "description_norm", "usage_count", "payload")
+
+    def __init__(self, row):
+        self.id = row.id
+        self.code = (row.code or "").lower()
+        self.type = (row.type or "").lower()
+        self.category = (row.category or "").lower()
+        self.description_norm = " ".join(tokenize(row.description))
+        self.usage_count = row.usage_count or 0
+        self.payload = {
+            "id": row.id,
+            "code": row.code,
+            "desc": row.description,
+            "description": row.description,
+            "gst": row.gst_rate,
+            "gst_rate": row.gst_rate,
+            "type": row.type,
+            "category": row.category,
+            "subcategory": row.subcategory,
+            "unit": row.unit,
+            "keywords": row.keywords,
+        }
+
+
+class HSNIndex:
+    """Immutable index over a snapshot of HSN/SAC rows (usage counts excepted)."""
+
+    def __init__(self, rows):
+        self.entries: Dict[int, _Entry] = {}
+        self._code_prefixes: Dict[str, List[int]] = {}
+        self._terms: Dict[str, Dict[int, int]] = {}
+        for row in rows:
+            entry = _Entry(row)
+            self.entries[entry.id] = entry
+            for i in range(1, len(entry.code) + 1):
+                self._code_prefixes.setdefault(entry.code[:i], []).append(entry.id)
+            self._add_terms(entry.id, tokenize(row.description), DESCRIPTION)
+            self._add_terms(entry.id, tokenize(row.keywords), KEYWORD)
+            self._add_terms(entry.id, tokenize(row.category) + tokenize(row.subcategory), CATEGORY)
+        self._vocab = sorted(self._terms)
+        self._fuzzy: Optional[FuzzyDictionary] = None
+        self._fuzzy_lock = threading.Lock()
+        self._token_cache: Dict[str, Dict[int, int]] = {}
+        self._ranked_cache: Dict[str, List[int]] = {}
+        self._cache_lock = threading.Lock()
+        # The first keystrokes match the most entries and are the slowest to rank, so every
+        # one- and two-character prefix is ranked here at build time and kept for the index's lifetime
+        short = {word[:n] for word in self._vocab for n in (1, 2)}
+        short.update(prefix for prefix in self._code_prefixes if len(prefix) <= 2)
+        self._short_ranked: Dict[str, List[int]] = {prefix: self._rank(prefix, self._find(prefix)) for prefix in short}
+
+    @property
+    def fuzzy(self) -> FuzzyDictionary:
+        """The vocabulary's fuzzy dictionary, built on first use."""
+        if self._fuzzy is None:
+            with self._fuzzy_lock:
+                if self._fuzzy is None:
+                    self._fuzzy = FuzzyDictionary({word: len(postings) for word, postings in self._terms.items()})
+        return self._fuzzy
+
+    def _add_terms(self, entry_id: int, words: List[str], weight: int) -> None:
+        for word in words:
+            postings = self._terms.setdefault(word, {})
+            if postings.get(entry_id, 0) < weight:
+                postings[entry_id] = weight
+
+    def _cache(self, cache: dict, key: str, value):
+        with self._cache_lock:
+            if len(cache) >= TOKEN_CACHE_SIZE:
+                cache.clear()
+            cache[key] = value
+        return value
+
+    def _token_matches(self, token: str) -> Dict[int, int]:
+        """Best match quality of ``token`` for every entry it matches."""
+        cached = self._token_cache.get(token)
+        if cached is not None:
+            return cached
+        return self._cache(self._token_cache, token, self._find(token))
+
+    def _find(self, token: str) -> Dict[int, int]:
+        matches: Dict[int, int] = {}
+        for entry_id in self._code_prefixes.get(token, ()):
+            matches[entry_id] = CODE_EXACT if self.entries[entry_id].code == token else CODE_PREFIX
+
+        i = bisect_left(self._vocab, token)
+        while i < len(self._vocab) and self._vocab[i].startswith(token):
+            word = self._vocab[i]
+            slot = 0 if word == token else 1
+            for entry_id, weight in self._terms[word].items():
+                quality = WORD_QUALITY[weight][slot]
+                if matches.get(entry_id, 0) < quality:
+                    matches[entry_id] = quality
+            i += 1
+
+        if not matches and HSN_FUZZY_SEARCH and len(token) >= MIN_TERM_LENGTH and token.isalpha():
+            # Nothing starts with the token as typed; try it as a misspelling ("lapotp" -> "laptop").
+            # Shorter or numeric tokens are never corrected, so they do not build the dictionary
+            for word in self.fuzzy.corrections(token):
+                for entry_id, weight in self._terms[word].items():
+                    quality = WORD_QUALITY[weight][2]
+                    if matches.get(entry_id, 0) < quality:
+                        matches[entry_id] = quality
+        return matches
+
+    def _rank(self, token: str, matches: Dict[int, int]) -> List[int]:
+        return sorted(matches, key=lambda entry_id: self._rank_key(entry_id, matches[entry_id], token))
+
+    def _ranked(self, token: str) -> List[int]:
+        """Entries matching ``token`` in the order a one-word query returns them."""
+        ranked = self._short_ranked.get(token) if len(token) <= 2 else self._ranked_cache.get(token)
+        if ranked is not None:
+            return ranked
+        if len(token) <= 2:
+            return []  # every short prefix that matches anything was ranked at build time
+        return self._cache(self._ranked_cache, token, self._rank(token, self._token_matches(token)))
+
+    def _rank_key(self, entry_id: int, score: int, phrase: str):
+        entry = self.entries[entry_id]
+        if entry.description_norm.startswith(phrase):
+            score += PHRASE_PREFIX_BONUS
+        return (-score, -entry.usage_count, entry.code)
+
+    def _accepts(self, entry_id: int, category: Optional[str], type: Optional[str]) -> bool:
+        entry = self.entries[entry_id]
+        return (not category or entry.category == category) and (not type or entry.type == type)
+
+    def search(self, q: str, category: Optional[str] = None, type: Optional[str] = None, limit: int = 10) -> List[dict]:
+        tokens = list(dict.fromkeys(tokenize(q)))
+        if not tokens:
+            return []
+
+        category = category.lower() if category else None
+        type = type.lower() if type else None
+
+        if len(tokens) == 1:
+            # Already ranked when the token was first looked up; just take the head
+            results = []
+            for entry_id in self._ranked(tokens[0]):
+                if self._accepts(entry_id, category, type):
+                    results.append(self.entries[entry_id].payload)
+                    if len(results) == limit:
+                        break
+            return results
+
+        per_token = sorted((self._token_matches(t) for t in tokens), key=len)
+        candidates = per_token[0].keys()
+        for matches in per_token[1:]:
+            candidates = candidates & matches.keys()
+            if not candidates:
+                return []
+
+        phrase = " ".join(tokens)
+        ranked = [
+            (self._rank_key(entry_id, sum(matches[entry_id] for matches in per_token), phrase), entry_id)
+            for entry_id in candidates
+            if self._accepts(entry_id, category, type)
+        ]
+        return [self.entries[entry_id].payload for _, entry_id in heapq.nsmallest(limit, ranked)]
+
+    def record_use(self, hsn_id: int, count: int = 1) -> None:
+        """Bump an entry's usage count. Rankings already cached keep their order until the next rebuild."""
+        entry = self.entries.get(hsn_id)
+        if entry is not None:
+            entry.usage_count += count
+
+
+class HSNIndexHolder:
+    """Process-wide current index, rebuilt when the underlying table changes.
+
+    The first ``get`` builds the index inline. Later rebuilds run in a
+    background thread on their own session, and the previous index keeps
+    serving until the new one is swapped in.
+    """
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._index: Optional[HSNIndex] = None
+        self._fingerprint = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._rebuilding = False
+
+    @staticmethod
+    def _table_fingerprint(db: Session):
+        return tuple(db.query(func.count(HSNCode.id), func.max(HSNCode.id), func.max(HSNCode.updated_at)).one())
+
+    def rebuild(self, db: Session) -> HSNIndex:
+        fingerprint = self._table_fingerprint(db)
+        rows = db.query(HSNCode).filter(HSNCode.is_active == True).all()
+        index = HSNIndex(rows)
+        with self._lock:
+            self._index = index
+            self._fingerprint = fingerprint
+            self._checked_at = time.monotonic()
+        return index
+
+    def _rebuild_in_background(self, bind) -> None:
+        def run():
+            try:
+                with Session(bind=bind) as db:
+                    self.rebuild(db)
+            except Exception:
+                logger.exception("HSN index rebuild failed")
+            finally:
+                self._rebuilding = False
+
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+        threading.Thread(target=run, name="hsn-index-rebuild", daemon=True).start()
+
+    def get(self, db: Session) -> HSNIndex:
+        index = self._index
+        if index is None:
+            return self.rebuild(db)
+        if time.monotonic() - self._checked_at >= self.refresh_seconds:
+            self._checked_at = time.monotonic()
+            if self._table_fingerprint(db) != self._fingerprint:
+                self._rebuild_in_background(db.get_bind())
+        return index
+
+    def invalidate(self) -> None:
+        """Force a fingerprint check on the next ``get``."""
+        self._checked_at = 0.0
+
+    def record_use(self, hsn_id: int, count: int = 1) -> None:
+        if self._index is not None:
+            self._index.record_use(hsn_id, count)
+
+    @property
+    def size(self) -> Optional[int]:
+        return len(self._index.entries) if self._index is not None else None
+
+
+hsn_index = HSNIndexHolder(HSN_INDEX_REFRESH_SECONDS)
@@ -2,7 +2,10 @@ from typing import List
 import json
 from pathlib import Path
 import re
-from difflib import SequenceMatcher
+from bisect import bisect_left
+from itertools import islice
+
+from fuzzy_terms import FuzzyDictionary
 
 
 HSN_CODES = [
@@ -38,107 +41,200 @@ if _DATA_FILE.exists():
         pass
 
 
-def suggest_hsn(query: str) -> List[dict]:
-    q = (query or "").lower().strip()
-    if not q:
-        return []
-
-    # Tokenization; ignore short alpha tokens to reduce noise, keep numeric tokens
-    raw_tokens = re.findall(r"[\w]+", q)
-    tokens: List[str] = []
-    for t in raw_tokens:
-        if t.isdigit():
-            tokens.append(t)
-        elif len(t) >= 3:
-            tokens.append(t)
-    synonyms = {
-        "tv": ["television", "led", "lcd"],
-        "brake": ["brake", "brakes", "pad", "pads"],
-        "saree": ["saree", "sari", "cotton"],
-        "shirt": ["shirt", "shirts"],
-        "rice": ["rice", "basmati"],
-        "oil": ["engine oil", "lubricant"],
-        "speaker": ["speaker", "sound bar", "soundbar"],
-        "laptop": ["laptop", "computer", "automatic data processing", "machines"],
-        "computer": ["computer", "laptop", "automatic data processing", "machines", "computing"],
-        "phone": ["mobile", "cellphone", "smartphone"],
-        "consulting": ["consulting", "consultation", "it", "software"],
-        "marketing": ["advertising", "digital marketing"],
-        "construction": ["works contract", "civil", "construction"],
-        "electronic": ["electronic", "electrical", "apparatus"],
-        "machine": ["machine", "machines", "equipment"],
-        "software": ["software", "programs", "data processing"],
-    }
-    expanded_terms = set(tokens)
-    for t in list(tokens):
-        for s in synonyms.get(t, []):
-            expanded_terms.add(s)
-
-    def norm(s: str) -> str:
-        return re.sub(r"\s+", " ", re.sub(r"[^a-z0-9]+", " ", (s or "").lower())).strip()
-
-    q_norm = norm(q)
-
-    def score(h):
-        code = str(h['code'])
-        desc = (h['desc'] or "").lower()
-        words = re.findall(r"[a-z0-9]+", desc)
-        desc_norm = norm(desc)
-        sc = 0
-        
-        # Prioritize actual products over services
-        # HSN codes (products) should rank higher than SAC codes (services) for goods
-        is_hsn_product = not code.startswith('99')  # HSN codes don't start with 99
-        is_service_description = any(word in desc for word in ['service', 'services', 'repair', 'maintenance', 'consulting'])
-        
-        if is_hsn_product and not is_service_description:
-            sc += 50  # Boost for actual products
-        elif is_service_description:
-            sc -= 20  # Penalty for service descriptions when looking for goods
-        
-        # Exact/phrase boosts
-        if q_norm and desc_norm == q_norm:
-            sc += 250
-        if q_norm and desc_norm.startswith(q_norm):
-            sc += 120
-        if q in desc:
-            sc += 80
+SYNONYMS = {
+    "tv": ["television", "led", "lcd"],
+    "brake": ["brake", "brakes", "pad", "pads"],
+    "saree": ["saree", "sari", "cotton"],
+    "shirt": ["shirt", "shirts"],
+    "rice": ["rice", "basmati"],
+    "oil": ["engine oil", "lubricant"],
+    "speaker": ["speaker", "sound bar", "soundbar"],
+    "laptop": ["laptop", "computer", "automatic data processing", "machines"],
+    "computer": ["computer", "laptop", "automatic data processing", "machines", "computing"],
+    "phone": ["mobile", "cellphone", "smartphone"],
+    "consulting": ["consulting", "consultation", "it", "software"],
+    "marketing": ["advertising", "digital marketing"],
+    "construction": ["works contract", "civil", "construction"],
+    "electronic": ["electronic", "electrical", "apparatus"],
+    "machine": ["machine", "machines", "equipment"],
+    "software": ["software", "programs", "data processing"],
+}
+
+# Only the first FUZZY_WORDS words of a description take part in fuzzy matching
+FUZZY_WORDS = 40
+NGRAM = 3
+
+
+def norm(s: str) -> str:
+    return re.sub(r"\s+", " ", re.sub(r"[^a-z0-9]+", " ", (s or "").lower())).strip()
+
+
+def _ngrams(s: str, n: int = NGRAM) -> set:
+    return {s[i:i + n] for i in range(len(s) - n + 1)}
+
+
+class SuggestIndex:
+    """Precomputed lookup structures over ``HSN_CODES`` for ``suggest_hsn``.
+
+    Scoring an entry used to mean re-tokenising its description and running
+    SequenceMatcher against every word. Here each score component has an
+    index that yields just the entries it applies to: code prefixes and
+    normalised descriptions (bisect over sorted lists), whole words and
+    word prefixes (inverted index plus sorted vocabulary), substrings
+    (trigram postings, verified), and fuzzy matches (a ``FuzzyDictionary``
+    of the description words). Entries that match nothing keep their
+    product/service base score.
+    """
+
+    def __init__(self, codes: List[dict]):
+        self.entries = codes
+        self.codes = [str(h["code"]) for h in codes]
+        self.descs = [(h["desc"] or "").lower() for h in codes]
+        self.desc_norms = [norm(d) for d in self.descs]
+        self.base: List[int] = []
+        self.word_index: dict = {}
+        self.fuzzy_index: dict = {}
+        self.desc_grams: dict = {}
+        for i, (code, desc) in enumerate(zip(self.codes, self.descs)):
+            words = re.findall(r"[a-z0-9]+", desc)
+            # Prioritize actual products over services
+            # HSN codes (products) should rank higher than SAC codes (services) for goods
+            is_hsn_product = not code.startswith('99')  # HSN codes don't start with 99
+            is_service_description = any(word in desc for word in ['service', 'services', 'repair', 'maintenance', 'consulting'])
+            if is_hsn_product and not is_service_description:
+                self.base.append(50)  # Boost for actual products
+            elif is_service_description:
+                self.base.append(-20)  # Penalty for service descriptions when looking for goods
+            else:
+                self.base.append(0)
+            for w in words:
+                self.word_index.setdefault(w, set()).add(i)
+            for w in words[:FUZZY_WORDS]:
+                self.fuzzy_index.setdefault(w, set()).add(i)
+            for g in _ngrams(desc):
+                self.desc_grams.setdefault(g, set()).add(i)
+
+        self.vocab = sorted(self.word_index)
+        # Synonym keys are valid correction targets too, so "lapotp" reaches "laptop" and its synonyms
+        counts = {w: 0 for key, values in SYNONYMS.items() for w in [key, *values] if " " not in w}
+        counts.update((w, len(ids)) for w, ids in self.word_index.items())
+        self.fuzzy = FuzzyDictionary(counts)
+        self.sorted_codes = sorted((code, i) for i, code in enumerate(self.codes))
+        self.sorted_norms = sorted((d, i) for i, d in enumerate(self.desc_norms))
+        # Entries that score on the product boost alone, in result order
+        self.base_ranked = sorted(
+            (i for i, b in enumerate(self.base) if b > 0),
+            key=lambda i: (hsn_sort_key(codes[i]), i),
+        )
+        self._token_cache: dict = {}
+
+    def _prefixed(self, sorted_pairs, prefix: str) -> List[int]:
+        i = bisect_left(sorted_pairs, (prefix,))
+        found = []
+        while i < len(sorted_pairs) and sorted_pairs[i][0].startswith(prefix):
+            found.append(sorted_pairs[i][1])
+            i += 1
+        return found
+
+    def containing(self, s: str):
+        """Entries whose lowercased description contains ``s``."""
+        if len(s) < NGRAM:
+            return [i for i, d in enumerate(self.descs) if s in d]
+        postings = sorted((self.desc_grams.get(g, set()) for g in _ngrams(s)), key=len)
+        candidates = set.intersection(*postings) if postings else set()
+        return [i for i in candidates if s in self.descs[i]]
 
+    def fuzzy_points(self, t: str) -> dict:
+        """Vocabulary words close enough to ``t`` to earn fuzzy points, with the points."""
+        # One edit away scores like the old SequenceMatcher ratio >= 0.9, two like >= 0.8
+        return {
+            w: 15 if distance <= 1 else 8
+            for w, distance in self.fuzzy.lookup(t)
+            if w in self.fuzzy_index
+        }
+
+    def token_scores(self, t: str) -> dict:
+        """What query term ``t`` adds to the score of each entry it matches."""
+        cached = self._token_cache.get(t)
+        if cached is not None:
+            return cached
+        code_hits = set(self._prefixed(self.sorted_codes, t)) if t.isdigit() else set()
+        scores = dict.fromkeys(code_hits, 200)  # Strong weight for code prefix match
+
+        def add(entries, pts):
+            for i in entries:
+                if i not in code_hits:
+                    scores[i] = scores.get(i, 0) + pts
+
+        add(self.word_index.get(t, ()), 90)  # Whole-word match
+        prefixed = set()
+        j = bisect_left(self.vocab, t)
+        while j < len(self.vocab) and self.vocab[j].startswith(t):
+            prefixed |= self.word_index[self.vocab[j]]
+            j += 1
+        add(prefixed, 60)  # Word prefix match
+        add(self.containing(t), 15)  # Substring match
+        best = {}
+        for w, pts in self.fuzzy_points(t).items():  # Fuzzy closeness
+            for i in self.fuzzy_index[w]:
+                if best.get(i, 0) < pts:
+                    best[i] = pts
+        for i, pts in best.items():
+            add((i,), pts)
+
+        if len(self._token_cache) >= 2048:
+            self._token_cache.clear()
+        self._token_cache[t] = scores
+        return scores
+
+    def suggest(self, query: str, limit: int = 10) -> List[dict]:
+        q = (query or "").lower().strip()
+        if not q:
+            return []
+
+        # Tokenization; ignore short alpha tokens to reduce noise, keep numeric tokens
+        tokens = [t for t in re.findall(r"[\w]+", q) if t.isdigit() or len(t) >= 3]
+        terms = list(tokens)
+        for t in tokens:
+            if t not in self.word_index:
+                terms.extend(self.fuzzy.corrections(t))  # Misspelled words also search as their corrections
+        expanded_terms = set(terms)
+        for t in terms:
+            expanded_terms.update(SYNONYMS.get(t, []))
+
+        q_norm = norm(q)
+        bonus: dict = {}
+        if q_norm:
+            # Exact/phrase boosts
+            for i in self._prefixed(self.sorted_norms, q_norm):
+                bonus[i] = (250 if self.desc_norms[i] == q_norm else 0) + 120
+        for i in self.containing(q):
+            bonus[i] = bonus.get(i, 0) + 80
         for t in expanded_terms:
-            # Strong weight for code prefix match
-            if t.isdigit() and code.startswith(t):
-                sc += 200
-                continue
-            # Whole-word match
-            if t in words:
-                sc += 90
-            # Word prefix match
-            if any(w.startswith(t) for w in words):
-                sc += 60
-            # Substring match
-            if t in desc:
-                sc += 15
-            # Fuzzy closeness
-            best_ratio = 0.0
-            for w in words[:40]:
-                r = SequenceMatcher(None, t, w).ratio()
-                if r > best_ratio:
-                    best_ratio = r
-            if best_ratio >= 0.9:
-                sc += 15
-            elif best_ratio >= 0.8:
-                sc += 8
-        return sc
-
-    scored = [(score(h), h) for h in HSN_CODES]
-    scored = [t for t in scored if t[0] > 0]
-    scored.sort(key=lambda x: (-x[0], hsn_sort_key(x[1])))
-    results: List[dict] = []
-    for s, h in scored[:10]:
-        conf = 60 + min(40, s // 20)  # rough confidence scaled
-        results.append({"code": h["code"], "desc": h["desc"], "gst": h["gst"], "type": h["type"], "confidence": conf})
-    return results
+            for i, pts in self.token_scores(t).items():
+                bonus[i] = bonus.get(i, 0) + pts
+
+        scored = [(self.base[i] + pts, i) for i, pts in bonus.items()]
+        # Unmatched entries can still place on their base score alone
+        filler = (i for i in self.base_ranked if i not in bonus)
+        scored.extend((self.base[i], i) for i in islice(filler, limit))
+        scored = [t for t in scored if t[0] > 0]
+        scored.sort(key=lambda x: (-x[0], hsn_sort_key(self.entries[x[1]]), x[1]))
+
+        results: List[dict] = []
+        for s, i in scored[:limit]:
+            h = self.entries[i]
+            conf = 60 + min(40, s // 20)  # rough confidence scaled
+            results.append({"code": h["code"], "desc": h["desc"], "gst": h["gst"], "type": h["type"], "confidence": conf})
+        return results
 
 
 def hsn_sort_key(h):
     return (h["type"], h["code"])
+
+
+_INDEX = SuggestIndex(HSN_CODES)
+
+
+def suggest_hsn(query: str) -> List[dict]:
+    return _INDEX.suggest(query)
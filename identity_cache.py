@@ -0,0 +1,84 @@
+"""
+Per-worker cache of each signed-in user's ``User`` and ``BusinessProfile`` rows.
+
+Nearly every authenticated request needs both, which used to cost two
+queries before the handler did any work. Entries are detached column
+snapshots keyed by ``cognito_sub``. Each request gets its own ``copy``,
+which needs no session to read. The snapshots are for reading only. Handlers
+that modify the rows ``reload`` them into the request's session instead. A
+change written over a stale snapshot could otherwise be dropped: the ORM only
+writes a field whose value differs from the one it believes is in the row.
+
+Handlers that change either row call ``identity_cache.invalidate`` so this
+worker reloads it on the next request. Other workers pick the change up
+within ``IDENTITY_CACHE_TTL_SECONDS``. A missing business profile is not
+cached, so one created elsewhere is seen straight away.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from models import BusinessProfile, User
+
+
+IDENTITY_CACHE_TTL_SECONDS = float(os.getenv("IDENTITY_CACHE_TTL_SECONDS", "30"))
+IDENTITY_CACHE_MAX_ENTRIES = 10000
+
+
+def _snapshot(obj):
+    """Detached copy of ``obj`` with every column loaded and no session."""
+    copy = type(obj)()
+    for col in obj.__table__.columns:
+        setattr(copy, col.key, getattr(obj, col.key))
+    make_transient_to_detached(copy)
+    return copy
+
+
+class IdentityCache:
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sub: str) -> Optional[Tuple[User, Optional[BusinessProfile]]]:
+        with self._lock:
+            entry = self._entries.get(sub)
+            if entry is None:
+                return None
+            user, bp, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._entries[sub]
+                return None
+            return user, bp
+
+    def put(self, user: User, bp: Optional[BusinessProfile]) -> Tuple[User, Optional[BusinessProfile]]:
+        """Cache detached snapshots of ``user`` and ``bp`` and return them."""
+        entry = (_snapshot(user), _snapshot(bp) if bp is not None else None, time.monotonic() + self.ttl_seconds)
+        with self._lock:
+            self._entries[user.cognito_sub] = entry
+            self._entries.move_to_end(user.cognito_sub)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry[0], entry[1]
+
+    def invalidate(self, sub: str) -> None:
+        with self._lock:
+            self._entries.pop(sub, None)
+
+    @staticmethod
+    def copy(obj):
+        """Per-request detached copy, so a handler changing it cannot change the cached entry"""
+        return _snapshot(obj) if obj is not None else None
+
+    @staticmethod
+    def reload(db: Session, obj):
+        """The current row behind snapshot ``obj``, loaded into ``db`` (None if it no longer exists)"""
+        return db.get(type(obj), obj.id) if obj is not None else None
+
+
+identity_cache = IdentityCache(IDENTITY_CACHE_TTL_SECONDS, IDENTITY_CACHE_MAX_ENTRIES)
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Index advisor for the app's tenant-scoped queries.
+
+Builds each query shape the handlers run, for a real tenant in the target
+database, and asks the database for its plan: ``EXPLAIN QUERY PLAN`` on
+SQLite, ``EXPLAIN (FORMAT JSON)`` on Postgres. Any shape that reads a table
+by scanning it rather than through an index is flagged. So is a sort the
+index could have served. The exit status is 1 when a scan is found, so the
+advisor can gate CI.
+
+Postgres prefers sequential scans on small tables even when a good index
+exists. Pass ``--force-index`` to plan with ``enable_seqscan = off``; a scan
+that survives that has no usable index at all.
+
+    python index_advisor.py [--user-id N] [--force-index] [--verbose]
+"""
+import argparse
+from datetime import date, timedelta
+from typing import Callable, Dict, List, NamedTuple
+
+from sqlalchemy import func, inspect, select
+from sqlalchemy.sql.util import find_tables
+
+from csv_export import invoice_export_query
+from models import Customer, Invoice, InvoiceItem, LibraryItem, Payment, ServiceTemplate, TenantMonthlyRollup
+
+
+class Sample(NamedTuple):
+    user_id: int
+    customer_id: int
+    invoice_id: int
+
+
+def _tenant_invoices(s: Sample):
+    return select(Invoice).where(Invoice.user_id == s.user_id)
+
+
+# name -> statement builder; one entry per distinct WHERE/ORDER BY the handlers use
+QUERY_SHAPES: Dict[str, Callable[[Sample], object]] = {
+    "invoices: list by date": lambda s: _tenant_invoices(s).order_by(Invoice.date.desc(), Invoice.id.desc()).limit(50),
+    "invoices: date range": lambda s: _tenant_invoices(s).where(
+        Invoice.date >= date.today() - timedelta(days=90), Invoice.date <= date.today()
+    ).order_by(Invoice.date.desc(), Invoice.id.desc()).limit(50),
+    "invoices: by status": lambda s: _tenant_invoices(s).where(Invoice.status == "UNPAID").order_by(Invoice.date.desc(), Invoice.id.desc()),
+    "invoices: by customer": lambda s: _tenant_invoices(s).where(Invoice.buyer_id == s.customer_id).order_by(Invoice.date.desc(), Invoice.id.desc()),
+    "invoices: by number": lambda s: _tenant_invoices(s).order_by(Invoice.invoice_number.desc(), Invoice.id.desc()).limit(50),
+    "invoices: one": lambda s: _tenant_invoices(s).where(Invoice.id == s.invoice_id),
+    "dashboard: overdue count": lambda s: select(func.count(Invoice.id)).where(
+        Invoice.user_id == s.user_id, Invoice.status != "PAID", Invoice.due_date.isnot(None), Invoice.due_date < date.today()
+    ),
+    "dashboard: most overdue": lambda s: select(Invoice.id, Invoice.due_date).where(
+        Invoice.user_id == s.user_id, Invoice.status != "PAID", Invoice.due_date.isnot(None), Invoice.due_date < date.today()
+    ).order_by(Invoice.due_date.asc(), Invoice.id.asc()).limit(5),
+    "dashboard: top customers": lambda s: select(Invoice.buyer_id, func.sum(Invoice.total)).where(
+        Invoice.user_id == s.user_id, Invoice.date >= date.today() - timedelta(days=90)
+    ).group_by(Invoice.buyer_id),
+    "dashboard: monthly rollup": lambda s: select(TenantMonthlyRollup).where(TenantMonthlyRollup.user_id == s.user_id),
+    "export: invoices csv": lambda s: invoice_export_query(s.user_id),
+    "export: customer csv": lambda s: invoice_export_query(s.user_id, customer_id=s.customer_id),
+    "invoice_items: of invoices": lambda s: select(InvoiceItem).where(InvoiceItem.invoice_id.in_([s.invoice_id, s.invoice_id + 1])),
+    "payments: of invoice": lambda s: select(Payment).where(Payment.invoice_id == s.invoice_id).order_by(Payment.date.desc(), Payment.id.desc()),
+    "payments: paid total": lambda s: select(func.coalesce(func.sum(Payment.amount), 0.0)).where(Payment.invoice_id == s.invoice_id),
+    "customers: list": lambda s: select(Customer).where(Customer.user_id == s.user_id).order_by(Customer.name),
+    "customers: one": lambda s: select(Customer).where(Customer.user_id == s.user_id, Customer.id == s.customer_id),
+    "library_items: list": lambda s: select(LibraryItem).where(LibraryItem.user_id == s.user_id).order_by(LibraryItem.description),
+    "service_templates: list": lambda s: select(ServiceTemplate).where(
+        ServiceTemplate.user_id == s.user_id, ServiceTemplate.is_active == True  # noqa: E712
+    ).order_by(ServiceTemplate.description),
+}
+
+
+class Finding(NamedTuple):
+    kind: str  # "SCAN" (table read without an index) or "SORT" (sorted after reading)
+    detail: str
+
+
+def pick_sample(conn, user_id: int = None) -> Sample:
+    """The given tenant (default: the one with most invoices) and one of its customers and invoices."""
+    if user_id is None:
+        user_id = conn.execute(
+            select(Invoice.user_id).group_by(Invoice.user_id).order_by(func.count().desc()).limit(1)
+        ).scalar() or 1
+    customer_id = conn.execute(select(func.min(Customer.id)).where(Customer.user_id == user_id)).scalar() or 1
+    invoice_id = conn.execute(select(func.min(Invoice.id)).where(Invoice.user_id == user_id)).scalar() or 1
+    return Sample(user_id, customer_id, invoice_id)
+
+
+def _explain_args(conn, stmt):
+    compiled = stmt.compile(dialect=conn.dialect, compile_kwargs={"render_postcompile": True})
+    params = compiled.construct_params()
+    if compiled.positional:
+        return compiled.string, tuple(params[name] for name in compiled.positiontup)
+    return compiled.string, params
+
+
+def explain_sqlite(conn, stmt) -> (List[str], List[Finding]):
+    sql, params = _explain_args(conn, stmt)
+    plan = [row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}", params)]
+    findings = []
+    for step in plan:
+        # "SCAN t" reads every row; "SCAN t USING [COVERING] INDEX ix" still walks the whole index
+        if step.startswith("SCAN ") and not step.startswith("SCAN CONSTANT"):
+            findings.append(Finding("SCAN", step))
+        elif step.startswith("USE TEMP B-TREE"):
+            findings.append(Finding("SORT", step))
+    return plan, findings
+
+
+def explain_postgres(conn, stmt) -> (List[str], List[Finding]):
+    sql, params = _explain_args(conn, stmt)
+    root = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}", params).scalar()[0]["Plan"]
+    plan, findings = [], []
+
+    def walk(node, depth):
+        line = node["Node Type"] + (f" on {node['Relation Name']}" if "Relation Name" in node else "")
+        if "Index Name" in node:
+            line += f" using {node['Index Name']}"
+        plan.append("  " * depth + line)
+        if node["Node Type"] == "Seq Scan":
+            findings.append(Finding("SCAN", line))
+        elif node["Node Type"] in ("Sort", "Incremental Sort"):
+            findings.append(Finding("SORT", f"{line} by {', '.join(node.get('Sort Key', []))}"))
+        for child in node.get("Plans", []):
+            walk(child, depth + 1)
+
+    walk(root, 0)
+    return plan, findings
+
+
+def advise(conn, sample: Sample, verbose: bool = False) -> int:
+    """Print a verdict per query shape and return the number of shapes with a scan."""
+    explain = explain_postgres if conn.dialect.name == "postgresql" else explain_sqlite
+    existing = set(inspect(conn).get_table_names())
+    scans = 0
+    print(f"Tenant {sample.user_id} (customer {sample.customer_id}, invoice {sample.invoice_id}), {conn.dialect.name}\n")
+    for name, build in QUERY_SHAPES.items():
+        stmt = build(sample)
+        missing = {table.name for table in find_tables(stmt)} - existing
+        if missing:
+            print(f"{'-':>5}  {name} (no {', '.join(sorted(missing))} table yet)")
+            continue
+        plan, findings = explain(conn, stmt)
+        kinds = {f.kind for f in findings}
+        verdict = "SCAN" if "SCAN" in kinds else "SORT" if "SORT" in kinds else "ok"
+        scans += verdict == "SCAN"
+        print(f"{verdict:>5}  {name}")
+        for finding in findings:
+            print(f"         {finding.detail}")
+        if verbose:
+            for step in plan:
+                print(f"         | {step}")
+    print(f"\n{scans} of {len(QUERY_SHAPES)} query shapes scan a table")
+    return scans
+
+
+def main():
+    from database import engine
+
+    parser = argparse.ArgumentParser(description="EXPLAIN the app's query shapes and flag table scans")
+    parser.add_argument("--user-id", type=int, default=None, help="Tenant to plan for (default: the one with most invoices)")
+    parser.add_argument("--force-index", action="store_true", help="Postgres: plan with enable_seqscan = off")
+    parser.add_argument("--verbose", action="store_true", help="Print every plan step")
+    args = parser.parse_args()
+
+    with engine.connect() as conn:
+        if args.force_index and conn.dialect.name == "postgresql":
+            conn.exec_driver_sql("SET enable_seqscan = off")
+        scans = advise(conn, pick_sample(conn, args.user_id), args.verbose)
+    raise SystemExit(1 if scans else 0)
+
+
+if __name__ == "__main__":
+    main()
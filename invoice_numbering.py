@@ -0,0 +1,141 @@
+"""
+Invoice number allocation.
+
+Each tenant gets one counter row per financial year in ``invoice_counters``.
+A number is handed out by bumping that row in a single statement
+(``UPDATE ... RETURNING`` on Postgres, under ``BEGIN IMMEDIATE`` on SQLite),
+so concurrent ``POST /invoices`` calls can never pick the same number and the
+cost of allocation does not depend on how many numbers were used before.
+
+Set ``INVOICE_SEQ_BLOCK_SIZE`` above 1 to let each worker reserve a block of
+numbers per round trip. Numbers then stay unique but are no longer strictly
+in creation order across workers, and unused numbers in a block are skipped
+when the worker restarts.
+"""
+import os
+import threading
+from datetime import date, datetime
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import Invoice, InvoiceCounter
+
+
+INVOICE_SEQ_BLOCK_SIZE = max(1, int(os.getenv("INVOICE_SEQ_BLOCK_SIZE", "1")))
+
+_counters = InvoiceCounter.__table__
+
+# (user_id, financial_year) -> [next unused, end of block (exclusive)]
+_blocks: Dict[Tuple[int, str], List[int]] = {}
+_blocks_lock = threading.Lock()
+
+
+def financial_year_for(inv_date: date) -> str:
+    """Indian financial year (April to March) the given date falls in, e.g. "2024-2025"."""
+    if inv_date.month >= 4:  # April onwards
+        return f"{inv_date.year}-{inv_date.year + 1}"
+    return f"{inv_date.year - 1}-{inv_date.year}"  # January to March
+
+
+def number_prefix(financial_year: str) -> str:
+    return f"INV-{financial_year.split('-')[0]}-"
+
+
+async def next_invoice_number_async(db: AsyncSession, user_id: int, invoice_date: Optional[date] = None) -> str:
+    """Allocate the next invoice number for the financial year of ``invoice_date``.
+
+    The counter is bumped on its own async connection. Before that, ``db``
+    ends its transaction so its connection goes back to the pool: holding one
+    while waiting for another would deadlock the pool once enough requests are
+    in flight. ``db`` must therefore have no pending changes; a RuntimeError is
+    raised instead of committing them behind the caller's back.
+    """
+    if db.new or db.dirty or db.deleted:
+        raise RuntimeError("next_invoice_number_async needs a session without pending changes")
+    financial_year = financial_year_for(invoice_date or date.today())
+    seq = _take_from_block(user_id, financial_year)
+    if seq is None:
+        await db.commit()
+        async with db.bind.connect() as conn:
+            seq = await conn.run_sync(_reserve, user_id, financial_year)
+    return f"{number_prefix(financial_year)}{seq:06d}"
+
+
+def _take_from_block(user_id: int, financial_year: str) -> Optional[int]:
+    """Next number from this worker's reserved block, or None when a new block must be reserved."""
+    if INVOICE_SEQ_BLOCK_SIZE == 1:
+        return None
+    with _blocks_lock:
+        block = _blocks.get((user_id, financial_year))
+        if block and block[0] < block[1]:
+            seq = block[0]
+            block[0] += 1
+            return seq
+    return None
+
+
+def _reserve(conn, user_id: int, financial_year: str) -> int:
+    """Reserve the next ``INVOICE_SEQ_BLOCK_SIZE`` sequence values and return the first one.
+
+    Runs on its own connection and commits immediately, independent of the
+    caller's session, so the counter row is locked only for one statement.
+    """
+    count = INVOICE_SEQ_BLOCK_SIZE
+    if conn.dialect.name == "sqlite":
+        # Take the write lock up front; SQLite would otherwise start with a shared lock
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+    first = _bump(conn, user_id, financial_year, count)
+    if first is None:
+        _insert_counter(conn, user_id, financial_year, _seed_value(conn, user_id, financial_year))
+        first = _bump(conn, user_id, financial_year, count)
+    conn.commit()
+    if count > 1:
+        with _blocks_lock:
+            _blocks[(user_id, financial_year)] = [first + 1, first + count]
+    return first
+
+
+def _bump(conn, user_id: int, financial_year: str, count: int) -> Optional[int]:
+    where = (_counters.c.user_id == user_id, _counters.c.financial_year == financial_year)
+    stmt = (
+        update(_counters)
+        .where(*where)
+        .values(next_value=_counters.c.next_value + count, updated_at=datetime.utcnow())
+    )
+    if conn.dialect.update_returning:
+        new_value = conn.execute(stmt.returning(_counters.c.next_value)).scalar()
+    else:
+        # The row is write-locked by the UPDATE, so reading it back in the same transaction is safe
+        if conn.execute(stmt).rowcount == 0:
+            return None
+        new_value = conn.execute(select(_counters.c.next_value).where(*where)).scalar()
+    if new_value is None:
+        return None
+    return new_value - count
+
+
+def _insert_counter(conn, user_id: int, financial_year: str, seed: int) -> None:
+    values = dict(user_id=user_id, financial_year=financial_year, next_value=seed, updated_at=datetime.utcnow())
+    dialect = postgresql if conn.dialect.name == "postgresql" else sqlite
+    # Another worker may create the row first; its seed is equally valid
+    conn.execute(dialect.insert(_counters).values(**values).on_conflict_do_nothing())
+
+
+def _seed_value(conn, user_id: int, financial_year: str) -> int:
+    """First free sequence value for a new counter, past any numbers already issued with its prefix."""
+    prefix = number_prefix(financial_year)
+    numbers = conn.execute(
+        select(Invoice.invoice_number).where(
+            Invoice.user_id == user_id,
+            Invoice.invoice_number.like(f"{prefix}%"),
+        )
+    ).scalars()
+    highest = 0
+    for number in numbers:
+        tail = number[len(prefix):]
+        if tail.isdigit():
+            highest = max(highest, int(tail))
+    return highest + 1
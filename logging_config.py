@@ -0,0 +1,149 @@
+"""
+Leveled, structured application logging.
+
+Request handlers used to ``print`` debug lines on every call, and those went
+straight to stdout from the event loop thread. ``setup_logging`` installs a
+``QueueHandler`` on the root logger instead. A record is put on an in-memory
+queue, and a ``QueueListener`` thread formats it and writes it out, so a slow
+stdout or log shipper never blocks a request.
+
+Modules log through ``logging.getLogger(__name__)`` and pass context as
+``extra={...}``. Those fields are kept as keys in the JSON output and as
+``key=value`` pairs in text output. Work done only to produce a debug line
+must be guarded with ``logger.isEnabledFor(logging.DEBUG)``.
+
+    LOG_LEVEL=INFO                             # root level
+    LOG_LEVELS=main=DEBUG,hsn_index=WARNING    # per-module overrides
+    LOG_FORMAT=json                            # json | text
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+from database import ENVIRONMENT
+
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG" if ENVIRONMENT == "development" else "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text" if ENVIRONMENT == "development" else "json").lower()
+
+# Chatty at INFO/DEBUG; LOG_LEVELS can still turn them up. SQLAlchemy names a pool's logger
+# after the pool class, so the timed pools in pool_metrics.py are not under "sqlalchemy".
+LIBRARY_LOG_LEVELS = {
+    "sqlalchemy": logging.WARNING,
+    "pool_metrics.TimedQueuePool": logging.WARNING,
+    "pool_metrics.TimedAsyncAdaptedQueuePool": logging.WARNING,
+    "asyncio": logging.WARNING,
+    "aiosqlite": logging.WARNING,
+    "httpx": logging.WARNING,
+    "httpcore": logging.WARNING,
+    "multipart": logging.WARNING,
+}
+
+# Attributes every LogRecord has; anything else on a record came from ``extra``
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def record_fields(record: logging.LogRecord) -> Dict:
+    return {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRS}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, the ``extra`` fields and any exception."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            **record_fields(record),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """``time LEVEL logger: msg key=value ...`` for reading in a terminal."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+
+    def formatMessage(self, record: logging.LogRecord) -> str:
+        line = super().formatMessage(record)
+        fields = record_fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Resolve the message and traceback now (the args may change after the call returns),
+        # but leave the formatting to the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def parse_levels(spec: str) -> Dict[str, int]:
+    """``"main=DEBUG, hsn_index=warning"`` -> {"main": 10, "hsn_index": 30}; bad entries are ignored."""
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        level = logging.getLevelName(level.strip().upper())
+        if name.strip() and isinstance(level, int):
+            levels[name.strip()] = level
+    return levels
+
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[QueueHandler] = None
+
+
+def setup_logging(level: str = LOG_LEVEL, levels: str = LOG_LEVELS, fmt: str = LOG_FORMAT) -> None:
+    """Route the root logger through the background queue; calling it again only re-applies the levels."""
+    global _listener, _queue_handler
+    root = logging.getLogger()
+    root.setLevel(level if isinstance(logging.getLevelName(level), int) else logging.INFO)
+    for name, module_level in {**LIBRARY_LOG_LEVELS, **parse_levels(levels)}.items():
+        logging.getLogger(name).setLevel(module_level)
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    _queue_handler = _NonBlockingQueueHandler(records)
+    root.addHandler(_queue_handler)
+    _listener = QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Write out everything still queued and stop the listener thread; later records are written directly."""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    root = logging.getLogger()
+    root.removeHandler(_queue_handler)
+    _listener.stop()
+    root.addHandler(_listener.handlers[0])
+    _listener = _queue_handler = None
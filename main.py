@@ -1,15 +1,19 @@
-from datetime import date, datetime, timedelta
+from datetime import date, datetime
+from itertools import groupby
 from typing import List
 import hashlib
+import logging
 import secrets
 
-from fastapi import FastAPI, Depends, HTTPException, Query, Request, status, File, UploadFile
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response, status, File, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased, joinedload, selectinload
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
 import os
 
-from database import Base, engine, get_db, run_startup_migrations
+from database import ENGINES, SessionLocal, async_engine, async_read_engine, get_async_db, get_async_read_db, get_db, get_read_db
 from models import User, BusinessProfile, Customer, Invoice, InvoiceItem, Payment, InvoiceTemplate, LibraryItem, ServiceTemplate, MasterService, HSNCode
 from schemas import (
     UserOut,
@@ -34,16 +38,32 @@ from schemas import (
     BusinessProfileCreate,
     UserOnboardingUpdate,
 )
-from security_cognito import get_current_user
+from security_cognito import Identity, get_attached_identity, get_current_user, get_identity
+from identity_cache import identity_cache
 from tax import extract_state_code, compute_totals
 from hsn_service import suggest_hsn
-from fastapi.responses import StreamingResponse
-from pdf_render import render_invoice_pdf
+from hsn_index import hsn_index
+from invoice_numbering import next_invoice_number_async, financial_year_for
+from pagination import encode_cursor, decode_cursor, keyset_filter, keyset_order
+from dashboard import build_summary
+from monthly_rollup import contribution as rollup_contribution, record_change as record_rollup_change
+from csv_export import invoice_export_query, stream_csv, INVOICE_COLUMNS, CUSTOMER_INVOICE_COLUMNS
+from fastapi.responses import FileResponse, StreamingResponse
+from health import liveness, readiness
+from logging_config import setup_logging, shutdown_logging
+from metrics import CONTENT_TYPE_LATEST, HSN_SEARCHES, INVOICES_CREATED, MetricsMiddleware, mark_worker_exited, record_cache_lookup, render_latest
+from migrate import ensure_schema
+from pool_metrics import pool_snapshot, start_request as start_pool_timing
+from query_metrics import slow_query_log, start_request as start_query_count
+from pdf_executor import pdf_executor, PDFRenderBusy, RETRY_AFTER_SECONDS
+from pdf_cache import pdf_cache, pdf_fingerprint, etag_matches
+from profiling import PROFILE_FORMATS, PROFILE_TOKEN, ProfilerMiddleware, authorized as profile_authorized, profile_path, recent_profiles
+from usage_counters import usage_counters
 from urllib.parse import quote
 
 
-Base.metadata.create_all(bind=engine)
-run_startup_migrations()
+setup_logging()
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="invoiceGen Backend", version="0.1.0")
 app.add_middleware(
@@ -52,7 +72,71 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
     allow_credentials=True,
+    expose_headers=["X-Next-Cursor", "ETag", "X-DB-Queries", "X-DB-Time", "X-DB-Pool-Wait"],
 )
+app.add_middleware(MetricsMiddleware)
+if PROFILE_TOKEN:
+    app.add_middleware(ProfilerMiddleware)
+
+
+@app.middleware("http")
+async def database_request_metrics(request: Request, call_next):
+    wait = start_pool_timing()
+    queries = start_query_count(request.scope)
+    response = await call_next(request)
+    # Headers go out before a streamed body, so the queries and checkouts that produce it are not counted
+    response.headers["X-DB-Queries"] = str(queries.count)
+    response.headers["X-DB-Time"] = f"{queries.seconds * 1000:.2f}"
+    if wait[1]:
+        response.headers["X-DB-Pool-Wait"] = f"{wait[0] * 1000:.2f}"
+    return response
+
+
+@app.on_event("startup")
+def check_schema():
+    # Registered first: every other startup hook reads tables
+    ensure_schema()
+
+
+@app.on_event("startup")
+def warm_hsn_index():
+    db = SessionLocal()
+    try:
+        hsn_index.rebuild(db)
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+def start_usage_counters():
+    usage_counters.start()
+
+
+@app.on_event("shutdown")
+def flush_usage_counters():
+    usage_counters.shutdown()
+
+
+@app.on_event("shutdown")
+def shutdown_pdf_executor():
+    pdf_executor.shutdown()
+
+
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    await async_engine.dispose()
+    await async_read_engine.dispose()
+
+
+@app.on_event("shutdown")
+def drop_worker_metrics():
+    mark_worker_exited()
+
+
+@app.on_event("shutdown")
+def flush_logs():
+    # Registered last so the other shutdown hooks can still log
+    shutdown_logging()
 
 
 @app.get("/health")
@@ -60,25 +144,99 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/health/live")
+def health_live():
+    """Liveness: the worker is serving requests (no dependency checks, see health.py)"""
+    return liveness()
+
+
+@app.get("/health/ready")
+async def health_ready(response: Response):
+    """Readiness: 503 while the database is slow or down, a pool or the PDF queue is saturated, or the HSN index is cold"""
+    ready, checks = await readiness()
+    if not ready:
+        response.status_code = 503
+    return {"status": "ready" if ready else "not_ready", "checks": checks}
+
+
+@app.get("/metrics", include_in_schema=False)
+def prometheus_metrics():
+    """Request, PDF, HSN search and cache metrics in the Prometheus text format (all workers, see metrics.py)"""
+    return Response(render_latest(), headers={"Content-Type": CONTENT_TYPE_LATEST})
+
+
+def require_debug_token(x_profile_token: str | None = Header(default=None)):
+    """Diagnostics expose SQL text, routes and capacity; answer 404 unless X-Profile-Token matches PROFILE_TOKEN"""
+    if not profile_authorized(x_profile_token):
+        raise HTTPException(status_code=404, detail="Not found")
+
+
+@app.get("/pdf/stats", include_in_schema=False, dependencies=[Depends(require_debug_token)])
+def pdf_render_stats():
+    """PDF render pool utilisation for this worker"""
+    return pdf_executor.stats()
+
+
+@app.get("/db/pool/stats", include_in_schema=False, dependencies=[Depends(require_debug_token)])
+def db_pool_stats():
+    """Connection pool gauges and checkout wait times for this worker"""
+    stats, seen = {}, {}
+    for name, eng in ENGINES.items():
+        if id(eng) in seen:
+            stats[name] = {"same_as": seen[id(eng)]}
+        else:
+            seen[id(eng)] = name
+            stats[name] = pool_snapshot(eng)
+    return stats
+
+
+@app.get("/db/queries/slow", include_in_schema=False, dependencies=[Depends(require_debug_token)])
+def db_slow_queries(limit: int = Query(default=50, ge=1, le=500)):
+    """Statements slower than SLOW_QUERY_MS on this worker, by route, most total time first"""
+    return slow_query_log.top(limit)
+
+
+@app.get("/debug/profiles", include_in_schema=False)
+def list_request_profiles(limit: int = Query(default=50, ge=1, le=500), x_profile_token: str | None = Header(default=None)):
+    """Newest stored request profiles on this host (see profiling.py)"""
+    if not profile_authorized(x_profile_token):
+        raise HTTPException(status_code=404, detail="Not found")
+    return recent_profiles(limit)
+
+
+@app.get("/debug/profiles/{profile_id}", include_in_schema=False)
+def get_request_profile(
+    profile_id: str,
+    format: str = Query(default="html", pattern="^(html|pstats)$"),
+    x_profile_token: str | None = Header(default=None),
+):
+    """One stored profile: the HTML flame/timeline view, or the pstats file"""
+    path = profile_path(profile_id, format) if profile_authorized(x_profile_token) else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return FileResponse(path, media_type=PROFILE_FORMATS[format], filename=path.name)
+
+
 @app.get("/auth/me", response_model=UserOut)
 async def me(current_user: User = Depends(get_current_user)):
     return current_user
 
 
 @app.get("/business", response_model=BusinessProfileOut)
-async def get_business(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    bp = db.query(BusinessProfile).filter(BusinessProfile.user_id == current_user.id).first()
+async def get_business(db: Session = Depends(get_db), identity: Identity = Depends(get_identity)):
+    current_user, bp = identity
     if not bp:
         bp = BusinessProfile(user_id=current_user.id)
         db.add(bp)
         db.commit()
         db.refresh(bp)
+        identity_cache.invalidate(current_user.cognito_sub)
     return bp
 
 
 @app.put("/business", response_model=BusinessProfileOut)
-async def update_business(body: BusinessProfileIn, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    bp = db.query(BusinessProfile).filter(BusinessProfile.user_id == current_user.id).first()
+async def update_business(body: BusinessProfileIn, db: Session = Depends(get_db), identity: Identity = Depends(get_attached_identity)):
+    current_user, bp = identity
     if not bp:
         bp = BusinessProfile(user_id=current_user.id)
         db.add(bp)
@@ -86,113 +244,100 @@ async def update_business(body: BusinessProfileIn, db: Session = Depends(get_db)
         setattr(bp, k, v)
     db.commit()
     db.refresh(bp)
+    identity_cache.invalidate(current_user.cognito_sub)
     return bp
 
 
 @app.post("/customers", response_model=CustomerOut)
-async def create_customer(body: CustomerIn, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def create_customer(body: CustomerIn, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
     cust = Customer(user_id=current_user.id, **body.model_dump())
     db.add(cust)
-    db.commit()
-    db.refresh(cust)
+    await db.commit()
+    await db.refresh(cust)
     return cust
 
 
 @app.get("/customers", response_model=List[CustomerOut])
-async def list_customers(q: str | None = None, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    qry = db.query(Customer).filter(Customer.user_id == current_user.id)
+async def list_customers(q: str | None = None, db: AsyncSession = Depends(get_async_read_db), current_user: User = Depends(get_current_user)):
+    stmt = select(Customer).where(Customer.user_id == current_user.id)
     if q:
         like = f"%{q}%"
-        qry = qry.filter(Customer.name.ilike(like))
-    return qry.order_by(Customer.name).all()
+        stmt = stmt.where(Customer.name.ilike(like))
+    return (await db.scalars(stmt.order_by(Customer.name))).all()
 
 
-@app.get("/customers/{customer_id}", response_model=CustomerOut)
-async def get_customer(customer_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    cust = db.query(Customer).filter(Customer.user_id == current_user.id, Customer.id == customer_id).first()
+async def get_tenant_customer(db: AsyncSession, user_id: int, customer_id: int) -> Customer:
+    cust = await db.scalar(select(Customer).where(Customer.user_id == user_id, Customer.id == customer_id))
     if not cust:
         raise HTTPException(status_code=404, detail="Customer not found")
     return cust
 
 
+@app.get("/customers/{customer_id}", response_model=CustomerOut)
+async def get_customer(customer_id: int, db: AsyncSession = Depends(get_async_read_db), current_user: User = Depends(get_current_user)):
+    return await get_tenant_customer(db, current_user.id, customer_id)
+
+
 @app.put("/customers/{customer_id}", response_model=CustomerOut)
-async def update_customer(customer_id: int, body: CustomerIn, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    cust = db.query(Customer).filter(Customer.user_id == current_user.id, Customer.id == customer_id).first()
-    if not cust:
-        raise HTTPException(status_code=404, detail="Customer not found")
+async def update_customer(customer_id: int, body: CustomerIn, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    cust = await get_tenant_customer(db, current_user.id, customer_id)
     for k, v in body.model_dump(exclude_unset=True).items():
         setattr(cust, k, v)
-    db.commit()
-    db.refresh(cust)
+    await db.commit()
+    await db.refresh(cust)
     return cust
 
 
 @app.delete("/customers/{customer_id}")
-async def delete_customer(customer_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    cust = db.query(Customer).filter(Customer.user_id == current_user.id, Customer.id == customer_id).first()
-    if not cust:
-        raise HTTPException(status_code=404, detail="Customer not found")
-    db.delete(cust)
-    db.commit()
+async def delete_customer(customer_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    cust = await get_tenant_customer(db, current_user.id, customer_id)
+    await db.delete(cust)
+    await db.commit()
     return {"ok": True}
 
 
-def next_invoice_number(db: Session, user_id: int) -> str:
-    bp = db.query(BusinessProfile).filter(BusinessProfile.user_id == user_id).first()
-    if not bp:
-        bp = BusinessProfile(user_id=user_id)
-        db.add(bp)
-        db.commit()
-        db.refresh(bp)
-    
-    # Start with the stored sequence number
-    seq = bp.next_invoice_seq or 1
-    
-    # Keep generating invoice numbers until we find one that doesn't exist
-    while True:
-        inv_no = f"INV-{date.today().year}-{seq:06d}"
-        
-        # Check if this invoice number already exists for this user
-        existing = db.query(Invoice).filter(
-            Invoice.invoice_number == inv_no,
-            Invoice.user_id == user_id
-        ).first()
-        if not existing:
-            # Found a unique invoice number, update the sequence and return
-            bp.next_invoice_seq = seq + 1
-            db.commit()
-            return inv_no
-        
-        # Invoice number exists, try the next one
-        seq += 1
-        
-        # Safety check to prevent infinite loop
-        if seq > 999999:
-            raise HTTPException(status_code=500, detail="Unable to generate unique invoice number")
+# Everything InvoiceOut reads; an AsyncSession cannot lazy-load while the response is serialised
+INVOICE_OUT_OPTIONS = (joinedload(Invoice.buyer), joinedload(Invoice.template), selectinload(Invoice.items))
+
+
+async def get_tenant_invoice(db: AsyncSession, user_id: int, invoice_id: int, *options) -> Invoice:
+    """The tenant's invoice, freshly read with ``options`` applied, or a 404."""
+    inv = await db.scalar(
+        select(Invoice)
+        .where(Invoice.user_id == user_id, Invoice.id == invoice_id)
+        .options(*options)
+        .execution_options(populate_existing=True)
+    )
+    if not inv:
+        raise HTTPException(status_code=404, detail="Invoice not found")
+    return inv
 
 
 @app.post("/invoices", response_model=InvoiceOut)
-async def create_invoice(body: InvoiceCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    buyer = db.query(Customer).filter(Customer.user_id == current_user.id, Customer.id == body.buyer_id).first()
+async def create_invoice(body: InvoiceCreate, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    buyer = await db.scalar(select(Customer).where(Customer.user_id == current_user.id, Customer.id == body.buyer_id))
     if not buyer:
         raise HTTPException(status_code=404, detail="Buyer not found")
 
     # Validate template if provided
     template = None
     if body.template_id:
-        template = db.query(InvoiceTemplate).filter(
+        template = await db.scalar(select(InvoiceTemplate).where(
             InvoiceTemplate.id == body.template_id,
             InvoiceTemplate.user_id == current_user.id
-        ).first()
+        ))
         if not template:
             raise HTTPException(status_code=404, detail="Template not found")
 
-    bp = db.query(BusinessProfile).filter(BusinessProfile.user_id == current_user.id).first()
+    # The seller's GSTIN, PAN and state go on the invoice and decide the tax split, so read
+    # them fresh; the cached profile can be up to IDENTITY_CACHE_TTL_SECONDS old on this worker
+    bp = await db.scalar(select(BusinessProfile).where(BusinessProfile.user_id == current_user.id))
     if not bp:
         bp = BusinessProfile(user_id=current_user.id)
         db.add(bp)
-        db.commit()
-        db.refresh(bp)
+        await db.commit()
+        await db.refresh(bp)
+        identity_cache.invalidate(current_user.cognito_sub)
     seller_state = bp.state_code or extract_state_code(bp.gstin)
     buyer_state = buyer.state_code or extract_state_code(buyer.gstin)
 
@@ -212,17 +357,11 @@ async def create_invoice(body: InvoiceCreate, db: Session = Depends(get_db), cur
             raise HTTPException(status_code=400, detail="Invalid due date format. Use YYYY-MM-DD")
 
     # Determine financial year based on invoice date
-    def get_financial_year(inv_date: date) -> str:
-        if inv_date.month >= 4:  # April onwards
-            return f"{inv_date.year}-{inv_date.year + 1}"
-        else:  # January to March
-            return f"{inv_date.year - 1}-{inv_date.year}"
-    
-    financial_year = get_financial_year(invoice_date)
+    financial_year = financial_year_for(invoice_date)
 
     invoice = Invoice(
         user_id=current_user.id,
-        invoice_number=next_invoice_number(db, current_user.id),
+        invoice_number=await next_invoice_number_async(db, current_user.id, invoice_date),
         financial_year=financial_year,  # Set the financial year
         date=invoice_date,
         due_date=due_date_obj,
@@ -271,13 +410,15 @@ async def create_invoice(body: InvoiceCreate, db: Session = Depends(get_db), cur
     invoice.total = total
 
     db.add(invoice)
-    db.commit()
-    db.refresh(invoice)
-    return invoice
+    await db.run_sync(record_rollup_change, None, invoice)
+    await db.commit()
+    INVOICES_CREATED.inc()
+    return await get_tenant_invoice(db, current_user.id, invoice.id, *INVOICE_OUT_OPTIONS)
 
 
 @app.get("/invoices", response_model=List[InvoiceOut])
 async def list_invoices(
+    response: Response,
     status: str | None = Query(default=None),
     q: str | None = Query(default=None),
     date_from: date | None = Query(default=None),
@@ -285,106 +426,89 @@ async def list_invoices(
     customer_id: int | None = Query(default=None),
     sort_by: str | None = Query(default="date"),  # date | total | number
     sort_dir: str | None = Query(default="desc"),  # asc | desc
-    db: Session = Depends(get_db),
+    limit: int | None = Query(default=None, ge=1, le=500),  # page size; omit to return every match
+    cursor: str | None = Query(default=None),  # X-Next-Cursor from the previous page
+    db: AsyncSession = Depends(get_async_read_db),
     current_user: User = Depends(get_current_user),
 ):
-    # Query invoices with template information
-    qry = db.query(Invoice).filter(Invoice.user_id == current_user.id)
+    stmt = select(Invoice).where(Invoice.user_id == current_user.id)
     
     if status:
-        qry = qry.filter(Invoice.status == status.upper())
+        stmt = stmt.where(Invoice.status == status.upper())
     if date_from:
-        qry = qry.filter(Invoice.date >= date_from)
+        stmt = stmt.where(Invoice.date >= date_from)
     if date_to:
-        qry = qry.filter(Invoice.date <= date_to)
+        stmt = stmt.where(Invoice.date <= date_to)
     if customer_id:
-        qry = qry.filter(Invoice.buyer_id == customer_id)
+        stmt = stmt.where(Invoice.buyer_id == customer_id)
     if q:
         like = f"%{q}%"
-        qry = qry.join(Customer).filter((Invoice.invoice_number.ilike(like)) | (Customer.name.ilike(like)))
+        stmt = stmt.join(Customer).where((Invoice.invoice_number.ilike(like)) | (Customer.name.ilike(like)))
     
-    # Sorting
+    # Sorting; id breaks ties so every row has a unique position for keyset cursors
     if sort_by == "total":
         order_col = Invoice.total
     elif sort_by == "number":
         order_col = Invoice.invoice_number
     else:
+        sort_by = "date"
         order_col = Invoice.date
-    if (sort_dir or "").lower() == "asc":
-        qry = qry.order_by(order_col.asc())
+    descending = (sort_dir or "").lower() != "asc"
+    if cursor:
+        stmt = stmt.where(keyset_filter(order_col, Invoice.id, decode_cursor(cursor, sort_by, descending), descending))
+    stmt = stmt.order_by(*keyset_order(order_col, Invoice.id, descending))
+    
+    # Load buyer, template and items up front instead of once per invoice during serialisation
+    stmt = stmt.options(*INVOICE_OUT_OPTIONS)
+    
+    # Fetch one extra row to learn whether another page exists
+    if limit:
+        invoices = (await db.scalars(stmt.limit(limit + 1))).all()
+        if len(invoices) > limit:
+            invoices = invoices[:limit]
+            last = invoices[-1]
+            response.headers["X-Next-Cursor"] = encode_cursor(sort_by, descending, getattr(last, order_col.key), last.id)
     else:
-        qry = qry.order_by(order_col.desc())
+        invoices = (await db.scalars(stmt)).all()
     
-    # Execute query
-    invoices = qry.all()
-    
-    # Add template names to invoices
     for invoice in invoices:
-        if invoice.template_id:
-            template = db.query(InvoiceTemplate).filter(InvoiceTemplate.id == invoice.template_id).first()
-            if template:
-                invoice.template_name = template.name
-    
-    # Debug logging
-    print(f"DEBUG: Found {len(invoices)} invoices for user {current_user.id}")
-    for inv in invoices[:3]:  # Log first 3 invoices
-        print(f"DEBUG: Invoice {inv.id}: {inv.invoice_number} - {inv.date} - Status: {inv.status}")
+        if invoice.template:
+            invoice.template_name = invoice.template.name
     
+    logger.debug("Listed invoices", extra={"user_id": current_user.id, "count": len(invoices)})
     return invoices
 
 
 @app.get("/my/invoices/{invoice_id:int}", response_model=InvoiceOut)
-async def get_my_invoice(invoice_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def get_my_invoice(invoice_id: int, db: AsyncSession = Depends(get_async_read_db), current_user: User = Depends(get_current_user)):
     # Query invoice with template information
-    invoice = db.query(Invoice).filter(
-        Invoice.user_id == current_user.id, 
-        Invoice.id == invoice_id
-    ).first()
-    
-    if not invoice:
-        raise HTTPException(status_code=404, detail="Invoice not found")
+    invoice = await get_tenant_invoice(db, current_user.id, invoice_id, *INVOICE_OUT_OPTIONS)
     
     # Add template name if template exists
-    if invoice.template_id:
-        template = db.query(InvoiceTemplate).filter(InvoiceTemplate.id == invoice.template_id).first()
-        if template:
-            invoice.template_name = template.name
-    
-    # Debug logging
-    print(f"DEBUG: Retrieved invoice {invoice.id}: {invoice.invoice_number}")
+    if invoice.template:
+        invoice.template_name = invoice.template.name
     
     return invoice
 
 
 # Payments API
 @app.get("/my/invoices/{invoice_id:int}/payments", response_model=List[PaymentOut])
-async def list_my_invoice_payments(invoice_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    inv = (
-        db.query(Invoice)
-        .filter(Invoice.user_id == current_user.id, Invoice.id == invoice_id)
-        .first()
-    )
-    if not inv:
-        raise HTTPException(status_code=404, detail="Invoice not found")
-    return (
-        db.query(Payment)
-        .filter(Payment.invoice_id == inv.id)
+async def list_my_invoice_payments(invoice_id: int, db: AsyncSession = Depends(get_async_read_db), current_user: User = Depends(get_current_user)):
+    inv = await get_tenant_invoice(db, current_user.id, invoice_id)
+    payments = await db.scalars(
+        select(Payment)
+        .where(Payment.invoice_id == inv.id)
         .order_by(Payment.date.desc(), Payment.id.desc())
-        .all()
     )
+    return payments.all()
 
 
 @app.post("/invoices/{invoice_id:int}/payments", response_model=PaymentOut)
-async def add_payment(invoice_id: int, body: PaymentIn, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    inv = (
-        db.query(Invoice)
-        .filter(Invoice.user_id == current_user.id, Invoice.id == invoice_id)
-        .first()
-    )
-    if not inv:
-        raise HTTPException(status_code=404, detail="Invoice not found")
+async def add_payment(invoice_id: int, body: PaymentIn, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    inv = await get_tenant_invoice(db, current_user.id, invoice_id)
     if body.amount <= 0:
         raise HTTPException(status_code=400, detail="Amount must be positive")
+    before = rollup_contribution(inv)
     # normalize date from optional string
     pay_date = None
     if body.date:
@@ -401,14 +525,11 @@ async def add_payment(invoice_id: int, body: PaymentIn, db: Session = Depends(ge
         note=body.note,
     )
     db.add(p)
-    db.commit()
-    db.refresh(p)
+    await db.commit()
+    await db.refresh(p)
     # Update derived status
-    total_paid = (
-        db.query(Payment)
-        .filter(Payment.invoice_id == inv.id)
-        .with_entities(func.coalesce(func.sum(Payment.amount), 0.0))
-        .scalar()
+    total_paid = await db.scalar(
+        select(func.coalesce(func.sum(Payment.amount), 0.0)).where(Payment.invoice_id == inv.id)
     )
     if total_paid >= (inv.total or 0):
         inv.status = "PAID"
@@ -419,29 +540,27 @@ async def add_payment(invoice_id: int, body: PaymentIn, db: Session = Depends(ge
     else:
         inv.status = "UNPAID"
         inv.paid_on = None
-    db.commit()
+    await db.run_sync(record_rollup_change, before, inv)
+    await db.commit()
     return p
 
 
 @app.delete("/payments/{payment_id:int}")
-async def delete_payment(payment_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    p = (
-        db.query(Payment)
+async def delete_payment(payment_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    p = await db.scalar(
+        select(Payment)
         .join(Invoice, Payment.invoice_id == Invoice.id)
-        .filter(Invoice.user_id == current_user.id, Payment.id == payment_id)
-        .first()
+        .where(Invoice.user_id == current_user.id, Payment.id == payment_id)
     )
     if not p:
         raise HTTPException(status_code=404, detail="Payment not found")
     inv_id = p.invoice_id
-    db.delete(p)
-    db.commit()
-    inv = db.query(Invoice).filter(Invoice.id == inv_id).first()
-    total_paid = (
-        db.query(Payment)
-        .filter(Payment.invoice_id == inv.id)
-        .with_entities(func.coalesce(func.sum(Payment.amount), 0.0))
-        .scalar()
+    await db.delete(p)
+    await db.commit()
+    inv = await db.scalar(select(Invoice).where(Invoice.id == inv_id))
+    before = rollup_contribution(inv)
+    total_paid = await db.scalar(
+        select(func.coalesce(func.sum(Payment.amount), 0.0)).where(Payment.invoice_id == inv.id)
     )
     if total_paid >= (inv.total or 0):
         inv.status = "PAID"
@@ -452,7 +571,8 @@ async def delete_payment(payment_id: int, db: Session = Depends(get_db), current
     else:
         inv.status = "UNPAID"
         inv.paid_on = None
-    db.commit()
+    await db.run_sync(record_rollup_change, before, inv)
+    await db.commit()
     return {"ok": True}
 
 
@@ -460,26 +580,21 @@ async def delete_payment(payment_id: int, db: Session = Depends(get_db), current
 async def update_invoice(
     invoice_id: int,
     body: InvoiceCreate,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    identity: Identity = Depends(get_identity),
 ):
-    inv = (
-        db.query(Invoice)
-        .filter(Invoice.user_id == current_user.id, Invoice.id == invoice_id)
-        .first()
-    )
-    if not inv:
-        raise HTTPException(status_code=404, detail="Invoice not found")
+    current_user, bp = identity
+    inv = await get_tenant_invoice(db, current_user.id, invoice_id, selectinload(Invoice.items))
 
-    buyer = db.query(Customer).filter(Customer.user_id == current_user.id, Customer.id == body.buyer_id).first()
+    buyer = await db.scalar(select(Customer).where(Customer.user_id == current_user.id, Customer.id == body.buyer_id))
     if not buyer:
         raise HTTPException(status_code=404, detail="Buyer not found")
 
-    bp = db.query(BusinessProfile).filter(BusinessProfile.user_id == current_user.id).first()
     if not bp:
         raise HTTPException(status_code=400, detail="Business profile incomplete")
     seller_state = bp.state_code or extract_state_code(bp.gstin)
     buyer_state = buyer.state_code or extract_state_code(buyer.gstin)
+    before = rollup_contribution(inv)
 
     # Update invoice header
     if body.date:
@@ -515,54 +630,40 @@ async def update_invoice(
     inv.igst = igst
     inv.total = total
 
-    db.commit()
-    db.refresh(inv)
-    return inv
+    await db.run_sync(record_rollup_change, before, inv)
+    await db.commit()
+    return await get_tenant_invoice(db, current_user.id, inv.id, *INVOICE_OUT_OPTIONS)
 
 
 @app.post("/invoices/{invoice_id:int}/mark-paid", response_model=InvoiceOut)
-async def mark_paid(invoice_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    inv = (
-        db.query(Invoice)
-        .filter(Invoice.user_id == current_user.id, Invoice.id == invoice_id)
-        .first()
-    )
-    if not inv:
-        raise HTTPException(status_code=404, detail="Invoice not found")
+async def mark_paid(invoice_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    inv = await get_tenant_invoice(db, current_user.id, invoice_id)
+    before = rollup_contribution(inv)
     inv.status = "PAID"
-    db.commit()
-    db.refresh(inv)
-    return inv
+    await db.run_sync(record_rollup_change, before, inv)
+    await db.commit()
+    return await get_tenant_invoice(db, current_user.id, inv.id, *INVOICE_OUT_OPTIONS)
 
 
 @app.post("/invoices/{invoice_id:int}/mark-unpaid", response_model=InvoiceOut)
-async def mark_unpaid(invoice_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    inv = (
-        db.query(Invoice)
-        .filter(Invoice.user_id == current_user.id, Invoice.id == invoice_id)
-        .first()
-    )
-    if not inv:
-        raise HTTPException(status_code=404, detail="Invoice not found")
+async def mark_unpaid(invoice_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    inv = await get_tenant_invoice(db, current_user.id, invoice_id)
+    before = rollup_contribution(inv)
     inv.status = "UNPAID"
-    db.commit()
-    db.refresh(inv)
-    return inv
+    await db.run_sync(record_rollup_change, before, inv)
+    await db.commit()
+    return await get_tenant_invoice(db, current_user.id, inv.id, *INVOICE_OUT_OPTIONS)
 
 
 @app.post("/invoices/{invoice_id:int}/duplicate", response_model=InvoiceOut)
-async def duplicate_invoice(invoice_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    src = (
-        db.query(Invoice)
-        .filter(Invoice.user_id == current_user.id, Invoice.id == invoice_id)
-        .first()
-    )
-    if not src:
-        raise HTTPException(status_code=404, detail="Invoice not found")
+async def duplicate_invoice(invoice_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    src = await get_tenant_invoice(db, current_user.id, invoice_id, joinedload(Invoice.buyer), selectinload(Invoice.items))
+    today = date.today()
     dup = Invoice(
         user_id=current_user.id,
-        invoice_number=next_invoice_number(db, current_user.id),
-        date=date.today(),
+        invoice_number=await next_invoice_number_async(db, current_user.id, today),
+        financial_year=financial_year_for(today),
+        date=today,
         due_date=src.due_date,
         seller_gstin=src.seller_gstin,
         seller_state_code=src.seller_state_code,
@@ -580,22 +681,17 @@ async def duplicate_invoice(invoice_id: int, db: Session = Depends(get_db), curr
     subtotal, cgst, sgst, igst, total = compute_totals(dup.items, src.seller_state_code, src.buyer.state_code)
     dup.subtotal, dup.cgst, dup.sgst, dup.igst, dup.total = subtotal, cgst, sgst, igst, total
     db.add(dup)
-    db.commit()
-    db.refresh(dup)
-    return dup
+    await db.run_sync(record_rollup_change, None, dup)
+    await db.commit()
+    return await get_tenant_invoice(db, current_user.id, dup.id, *INVOICE_OUT_OPTIONS)
 
 
 @app.delete("/invoices/{invoice_id:int}")
-async def delete_invoice(invoice_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    inv = (
-        db.query(Invoice)
-        .filter(Invoice.user_id == current_user.id, Invoice.id == invoice_id)
-        .first()
-    )
-    if not inv:
-        raise HTTPException(status_code=404, detail="Invoice not found")
-    db.delete(inv)
-    db.commit()
+async def delete_invoice(invoice_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user)):
+    inv = await get_tenant_invoice(db, current_user.id, invoice_id)
+    await db.run_sync(record_rollup_change, rollup_contribution(inv), None)
+    await db.delete(inv)
+    await db.commit()
     return {"ok": True}
 
 
@@ -603,86 +699,43 @@ async def delete_invoice(invoice_id: int, db: Session = Depends(get_db), current
 # HSN/SAC Database Search API
 # ================================================
 
+def hsn_search(db: Session, q: str, category: str | None = None, type: str | None = None, limit: int = 10) -> List[dict]:
+    """Index search shared by /hsn/search and the legacy /hsn/suggest"""
+    q = q.strip()
+    results = hsn_index.get(db).search(q, category=category, type=type, limit=limit)
+    HSN_SEARCHES.inc()
+    logger.debug("HSN search", extra={"q": q, "category": category, "type": type, "results": len(results)})
+    return results
+
+
 @app.get("/hsn/search")
 async def search_hsn_codes(
     q: str = Query(..., min_length=1, description="Search query"),
     category: str | None = Query(None, description="Filter by category"),
     type: str | None = Query(None, description="Filter by type (HSN/SAC)"),
     limit: int = Query(10, le=50, description="Maximum number of results"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
-    """Search HSN/SAC codes from database with intelligent filtering"""
-    q = q.strip()
-    print(f"DEBUG: HSN search query: {q}, category: {category}, type: {type}")
-    
-    # Base query
-    query = db.query(HSNCode).filter(HSNCode.is_active == True)
-    
-    # Text search across code, description, and keywords
-    search_term = f"%{q.lower()}%"
-    text_filter = (
-        func.lower(HSNCode.code).like(search_term) |
-        func.lower(HSNCode.description).like(search_term) |
-        func.lower(HSNCode.keywords).like(search_term)
-    )
-    query = query.filter(text_filter)
-    
-    # Category filter
-    if category:
-        query = query.filter(func.lower(HSNCode.category) == category.lower())
-    
-    # Type filter (HSN for products, SAC for services)
-    if type:
-        query = query.filter(func.lower(HSNCode.type) == type.lower())
-    
-    # Order by usage count (popularity) and then by code
-    query = query.order_by(HSNCode.usage_count.desc(), HSNCode.code)
-    
-    # Execute query
-    results = query.limit(limit).all()
-    
-    print(f"DEBUG: Found {len(results)} HSN/SAC codes")
-    
-    # Format response
-    return [
-        {
-            "id": hsn.id,
-            "code": hsn.code,
-            "desc": hsn.description,
-            "description": hsn.description,
-            "gst": hsn.gst_rate,
-            "gst_rate": hsn.gst_rate,
-            "type": hsn.type,
-            "category": hsn.category,
-            "subcategory": hsn.subcategory,
-            "unit": hsn.unit,
-            "keywords": hsn.keywords
-        }
-        for hsn in results
-    ]
+    """Search HSN/SAC codes via the in-memory index, ranked by match quality then popularity"""
+    return hsn_search(db, q, category=category, type=type, limit=limit)
 
 @app.post("/hsn/{hsn_id}/use")
-async def record_hsn_usage(hsn_id: int, db: Session = Depends(get_db)):
-    """Record HSN code usage for analytics"""
-    hsn = db.query(HSNCode).filter(HSNCode.id == hsn_id).first()
-    if hsn:
-        hsn.usage_count += 1
-        db.commit()
+async def record_hsn_usage(hsn_id: int):
+    """Record HSN code usage for analytics; written to the database in batches"""
+    usage_counters.add("hsn_codes", hsn_id)
+    hsn_index.record_use(hsn_id)
     return {"status": "recorded"}
 
 # Legacy HSN API (for backward compatibility)
 @app.get("/hsn/suggest")
-async def hsn_suggest(q: str, db: Session = Depends(get_db)):
-    """Legacy HSN suggest endpoint - now uses database instead of JSON"""
-    # Use the new database search but format as old response
+async def hsn_suggest(q: str, db: Session = Depends(get_read_db)):
+    """Legacy HSN suggest endpoint - served from the same index as /hsn/search"""
     try:
-        results = await search_hsn_codes(q=q, limit=8, db=db)
-        return results
-    except Exception as e:
-        print(f"HSN search error: {e}")
-        # Fallback to old system if needed
-        from hsn_service import suggest_hsn
-    return suggest_hsn(q)
+        return hsn_search(db, q, limit=8)
+    except SQLAlchemyError:
+        # The index is built from hsn_codes; without the database, fall back to the bundled list
+        logger.warning("HSN index unavailable, falling back to hsn_service", exc_info=True)
+        return suggest_hsn(q)
 
 
 # ---- PDF preview/generation (MVP HTML-to-PDF placeholder) ----
@@ -731,8 +784,40 @@ async def invoice_preview(invoice_id: int, db: Session = Depends(get_db), curren
     }
 
 
+async def invoice_pdf_response(inv: Invoice, bp, template, if_none_match: str | None, headers: dict):
+    """Serve the invoice PDF from the content-addressed cache, rendering only on a miss.
+
+    The cache key is also the ETag, so a client that already has this exact
+    PDF gets a 304 without the PDF being read or rendered.
+    """
+    key = pdf_fingerprint(inv, bp, template)
+    etag = f'"{key}"'
+    headers = {**headers, "ETag": etag}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    pdf_bytes = pdf_cache.get(key)
+    record_cache_lookup("pdf", pdf_bytes is not None)
+    if pdf_bytes is None:
+        try:
+            pdf_bytes = await pdf_executor.render(inv, bp, template)
+        except PDFRenderBusy:
+            raise HTTPException(
+                status_code=503,
+                detail="PDF rendering is busy, please retry shortly",
+                headers={"Retry-After": str(RETRY_AFTER_SECONDS)},
+            )
+        pdf_cache.put(key, pdf_bytes)
+    return StreamingResponse(iter([pdf_bytes]), media_type="application/pdf", headers=headers)
+
+
 @app.get("/my/invoices/{invoice_id:int}/pdf")
-async def my_invoice_pdf(invoice_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def my_invoice_pdf(
+    invoice_id: int,
+    db: Session = Depends(get_db),
+    identity: Identity = Depends(get_identity),
+    if_none_match: str | None = Header(default=None),
+):
+    current_user, bp = identity
     inv = (
         db.query(Invoice)
         .filter(Invoice.user_id == current_user.id, Invoice.id == invoice_id)
@@ -741,19 +826,6 @@ async def my_invoice_pdf(invoice_id: int, db: Session = Depends(get_db), current
     if not inv:
         raise HTTPException(status_code=404, detail="Invoice not found")
     
-    # Get business profile
-    bp = db.query(BusinessProfile).filter(BusinessProfile.user_id == current_user.id).first()
-    
-    # Debug business profile data
-    if bp:
-        print(f"DEBUG: Business Profile found for user {current_user.id}")
-        print(f"DEBUG: Bank Name: {bp.bank_name}")
-        print(f"DEBUG: Bank IFSC: {bp.bank_ifsc}")
-        print(f"DEBUG: Default Terms: {bp.default_terms}")
-        print(f"DEBUG: Primary Color: {bp.primary_color}")
-    else:
-        print(f"DEBUG: No Business Profile found for user {current_user.id}")
-    
     # Get template if invoice was created with one
     template = None
     if inv.template_id:
@@ -761,22 +833,29 @@ async def my_invoice_pdf(invoice_id: int, db: Session = Depends(get_db), current
             InvoiceTemplate.id == inv.template_id,
             InvoiceTemplate.user_id == current_user.id
         ).first()
-        print(f"DEBUG: Invoice {inv.id} has template_id: {inv.template_id}")
-        print(f"DEBUG: Template found: {template.name if template else 'None'}")
-        if template:
-            print(f"DEBUG: Template file path: {template.template_file_path}")
-    else:
-        print(f"DEBUG: Invoice {inv.id} has no template_id")
+    logger.debug("Invoice PDF requested", extra={
+        "user_id": current_user.id,
+        "invoice_id": inv.id,
+        "has_business_profile": bp is not None,
+        "template_id": template.id if template else None,
+    })
     
-    pdf_bytes = render_invoice_pdf(inv, bp, template)
-    return StreamingResponse(iter([pdf_bytes]), media_type="application/pdf", headers={"Content-Disposition": f"inline; filename={inv.invoice_number}.pdf"})
+    return await invoice_pdf_response(inv, bp, template, if_none_match, {
+        "Content-Disposition": f"inline; filename={inv.invoice_number}.pdf",
+        "Cache-Control": "private, no-cache",  # Revalidate with the ETag on every open
+    })
 
 
 # Backward compatibility - deprecated endpoint
 @app.get("/invoices/{invoice_id:int}/pdf", deprecated=True)
-async def invoice_pdf_deprecated(invoice_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def invoice_pdf_deprecated(
+    invoice_id: int,
+    db: Session = Depends(get_db),
+    identity: Identity = Depends(get_identity),
+    if_none_match: str | None = Header(default=None),
+):
     """Deprecated: Use /my/invoices/{invoice_id}/pdf instead"""
-    return await my_invoice_pdf(invoice_id, db, current_user)
+    return await my_invoice_pdf(invoice_id, db, identity, if_none_match)
 
 
 def generate_public_token(invoice_id: int, secret_key: str = "your-secret-key") -> str:
@@ -784,9 +863,7 @@ def generate_public_token(invoice_id: int, secret_key: str = "your-secret-key")
     # Simplified approach - just use invoice ID and secret for now
     secret = os.getenv("PDF_SECRET_KEY", secret_key)
     token_data = f"{invoice_id}:{secret}"
-    token = hashlib.sha256(token_data.encode()).hexdigest()
-    print(f"DEBUG: Generated token for invoice {invoice_id}: {token[:20]}...")
-    return token
+    return hashlib.sha256(token_data.encode()).hexdigest()
 
 
 def verify_public_token(invoice_id: int, token: str, secret_key: str = "your-secret-key") -> bool:
@@ -794,17 +871,19 @@ def verify_public_token(invoice_id: int, token: str, secret_key: str = "your-sec
     secret = os.getenv("PDF_SECRET_KEY", secret_key)
     token_data = f"{invoice_id}:{secret}"
     expected_token = hashlib.sha256(token_data.encode()).hexdigest()
-    
-    print(f"DEBUG: Verifying token for invoice {invoice_id}")
-    print(f"DEBUG: Expected token: {expected_token[:20]}...")
-    print(f"DEBUG: Received token: {token[:20]}...")
-    print(f"DEBUG: Tokens match: {token == expected_token}")
-    
-    return token == expected_token
+    matches = secrets.compare_digest(token.encode(), expected_token.encode())
+    # Never log either token: the expected one is a standing credential for this invoice
+    logger.debug("Public invoice token checked", extra={"invoice_id": invoice_id, "matches": matches})
+    return matches
 
 
 @app.get("/public/invoices/{invoice_id:int}/pdf")
-async def public_invoice_pdf(invoice_id: int, token: str, db: Session = Depends(get_db)):
+async def public_invoice_pdf(
+    invoice_id: int,
+    token: str,
+    db: Session = Depends(get_db),
+    if_none_match: str | None = Header(default=None),
+):
     """
     Public PDF endpoint for customers to access invoice PDFs without authentication.
     Requires a secure, time-limited token for access.
@@ -834,19 +913,15 @@ async def public_invoice_pdf(invoice_id: int, token: str, db: Session = Depends(
             InvoiceTemplate.user_id == inv.user_id
         ).first()
     
-    pdf_bytes = render_invoice_pdf(inv, bp, template)
-    return StreamingResponse(
-        iter([pdf_bytes]), 
-        media_type="application/pdf", 
-        headers={
-            "Content-Disposition": f"attachment; filename={inv.invoice_number}.pdf",  # Force download
-            "Cache-Control": "private, max-age=1800"  # 30 minutes private cache
-        }
-    )
+    return await invoice_pdf_response(inv, bp, template, if_none_match, {
+        "Content-Disposition": f"attachment; filename={inv.invoice_number}.pdf",  # Force download
+        "Cache-Control": "private, max-age=1800"  # 30 minutes private cache
+    })
 
 
 @app.get("/my/invoices/{invoice_id:int}/share")
-async def my_invoice_share(invoice_id: int, request: Request, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def my_invoice_share(invoice_id: int, request: Request, db: Session = Depends(get_db), identity: Identity = Depends(get_identity)):
+    current_user, bp = identity
     inv = (
         db.query(Invoice)
         .filter(Invoice.user_id == current_user.id, Invoice.id == invoice_id)
@@ -863,7 +938,6 @@ async def my_invoice_share(invoice_id: int, request: Request, db: Session = Depe
     
     # Professional message format for WhatsApp
     business_name = "Your Business"  # Default fallback
-    bp = db.query(BusinessProfile).filter(BusinessProfile.user_id == current_user.id).first()
     if bp and bp.business_name:
         business_name = bp.business_name
     
@@ -907,94 +981,13 @@ Thank you for your business! 🙏"""
 
 # ---- Dashboard summary ----
 @app.get("/invoices/summary")
-async def invoices_summary(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    today = date.today()
-    # Outstanding: unpaid/overdue sums
-    unpaid = (
-        db.query(Invoice)
-        .filter(Invoice.user_id == current_user.id, Invoice.status != "PAID")
-        .all()
-    )
-    outstanding_total = sum(i.total or 0 for i in unpaid)
-    overdue = [
-        {
-            "id": i.id,
-            "invoice_number": i.invoice_number,
-            "customer": i.buyer.name if i.buyer else None,
-            "due_date": str(i.due_date) if i.due_date else None,
-            "days_overdue": (today - i.due_date).days if i.due_date and i.due_date < today else 0,
-            "total": i.total,
-        }
-        for i in unpaid
-        if i.due_date and i.due_date < today
-    ]
-    overdue.sort(key=lambda x: x["days_overdue"], reverse=True)
-
-    # This month
-    start_month = today.replace(day=1)
-    this_month_paid = (
-        db.query(Invoice)
-        .filter(Invoice.user_id == current_user.id, Invoice.status == "PAID", Invoice.date >= start_month, Invoice.date <= today)
-        .all()
-    )
-    this_month_revenue = sum(i.total or 0 for i in this_month_paid)
-    invoices_this_month = (
-        db.query(Invoice)
-        .filter(Invoice.user_id == current_user.id, Invoice.date >= start_month, Invoice.date <= today)
-        .count()
-    )
-
-    # Last 6 months revenue series
-    series = []
-    for m in range(5, -1, -1):
-        ref = (start_month - timedelta(days=1)).replace(day=1)
-        # compute month by stepping back
-        ref_dt = (start_month.replace(day=1) - timedelta(days=1))
-        # Adjust for m steps
-        dt = start_month
-        for _ in range(m):
-            dt = (dt.replace(day=1) - timedelta(days=1)).replace(day=1)
-        month_start = dt
-        next_month = (month_start.replace(day=28) + timedelta(days=4)).replace(day=1)
-        month_end = next_month - timedelta(days=1)
-        rows = (
-            db.query(Invoice)
-            .filter(Invoice.user_id == current_user.id, Invoice.status == "PAID", Invoice.date >= month_start, Invoice.date <= month_end)
-            .all()
-        )
-        total = sum(i.total or 0 for i in rows)
-        label = month_start.strftime("%b")
-        series.append({"label": label, "total": round(total, 2)})
-
-    # Top customers by total (last 90 days)
-    since = today - timedelta(days=90)
-    recent = (
-        db.query(Invoice)
-        .filter(Invoice.user_id == current_user.id, Invoice.date >= since)
-        .all()
-    )
-    cust_totals = {}
-    for i in recent:
-        name = i.buyer.name if i.buyer else "-"
-        cust_totals[name] = cust_totals.get(name, 0) + (i.total or 0)
-    top_customers = [
-        {"name": k, "total": round(v, 2)} for k, v in sorted(cust_totals.items(), key=lambda kv: kv[1], reverse=True)[:5]
-    ]
-
-    return {
-        "outstanding_total": round(outstanding_total, 2),
-        "overdue_count": len(overdue),
-        "this_month_revenue": round(this_month_revenue, 2),
-        "invoices_this_month": invoices_this_month,
-        "monthly_revenue": series,
-        "overdue_list": overdue[:5],
-        "top_customers": top_customers,
-    }
+async def invoices_summary(db: AsyncSession = Depends(get_async_read_db), current_user: User = Depends(get_current_user)):
+    return await db.run_sync(build_summary, current_user.id)
 
 
 # Alias to avoid routing conflict with /invoices/{invoice_id}
 @app.get("/summary")
-async def summary_alias(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def summary_alias(db: AsyncSession = Depends(get_async_read_db), current_user: User = Depends(get_current_user)):
     return await invoices_summary(db=db, current_user=current_user)
 
 
@@ -1005,60 +998,16 @@ async def export_invoices(
     date_from: date | None = Query(default=None),
     date_to: date | None = Query(default=None),
     customer_id: int | None = Query(default=None),
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """Export invoices to CSV format"""
-    from fastapi.responses import Response
-    import csv
-    from io import StringIO
-    
-    # Build query same as list_invoices
-    qry = db.query(Invoice).filter(Invoice.user_id == current_user.id)
-    if status:
-        qry = qry.filter(Invoice.status == status.upper())
-    if date_from:
-        qry = qry.filter(Invoice.date >= date_from)
-    if date_to:
-        qry = qry.filter(Invoice.date <= date_to)
-    if customer_id:
-        qry = qry.filter(Invoice.buyer_id == customer_id)
-    
-    invoices = qry.order_by(Invoice.date.desc()).all()
-    
-    # Generate CSV
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # Header
-    writer.writerow([
-        'Invoice Number', 'Date', 'Customer', 'GSTIN', 'State', 'Subtotal', 
-        'CGST', 'SGST', 'IGST', 'Total', 'Status', 'Paid On'
-    ])
-    
-    # Data rows
-    for inv in invoices:
-        writer.writerow([
-            inv.invoice_number,
-            inv.date.strftime('%Y-%m-%d') if inv.date else '',
-            inv.buyer.name if inv.buyer else '',
-            inv.buyer.gstin if inv.buyer else '',
-            inv.buyer.state_code if inv.buyer else '',
-            f"{inv.subtotal:.2f}" if inv.subtotal else '0.00',
-            f"{inv.cgst:.2f}" if inv.cgst else '0.00',
-            f"{inv.sgst:.2f}" if inv.sgst else '0.00',
-            f"{inv.igst:.2f}" if inv.igst else '0.00',
-            f"{inv.total:.2f}" if inv.total else '0.00',
-            inv.status or 'UNPAID',
-            inv.paid_on.strftime('%Y-%m-%d') if inv.paid_on else ''
-        ])
-    
-    csv_content = output.getvalue()
-    output.close()
+    # Same filters as list_invoices, streamed straight from the cursor
+    stmt = invoice_export_query(current_user.id, status=status, date_from=date_from, date_to=date_to, customer_id=customer_id)
     
     filename = f"invoices_export_{date.today().strftime('%Y%m%d')}.csv"
-    return Response(
-        content=csv_content,
+    return StreamingResponse(
+        stream_csv(db.get_bind(), stmt, INVOICE_COLUMNS),
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
@@ -1067,55 +1016,20 @@ async def export_invoices(
 @app.get("/customers/{customer_id}/invoices/export")
 async def export_customer_invoices(
     customer_id: int,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """Export customer-specific invoices to CSV"""
-    from fastapi.responses import Response
-    import csv
-    from io import StringIO
-    
     # Get customer
     customer = db.query(Customer).filter(Customer.user_id == current_user.id, Customer.id == customer_id).first()
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
     
-    # Get invoices for this customer
-    invoices = db.query(Invoice).filter(
-        Invoice.user_id == current_user.id,
-        Invoice.buyer_id == customer_id
-    ).order_by(Invoice.date.desc()).all()
-    
-    # Generate CSV
-    output = StringIO()
-    writer = csv.writer(output)
-    
-    # Header
-    writer.writerow([
-        'Invoice Number', 'Date', 'Subtotal', 'CGST', 'SGST', 'IGST', 
-        'Total', 'Status', 'Paid On'
-    ])
-    
-    # Data rows
-    for inv in invoices:
-        writer.writerow([
-            inv.invoice_number,
-            inv.date.strftime('%Y-%m-%d') if inv.date else '',
-            f"{inv.subtotal:.2f}" if inv.subtotal else '0.00',
-            f"{inv.cgst:.2f}" if inv.cgst else '0.00',
-            f"{inv.sgst:.2f}" if inv.sgst else '0.00',
-            f"{inv.igst:.2f}" if inv.igst else '0.00',
-            f"{inv.total:.2f}" if inv.total else '0.00',
-            inv.status or 'UNPAID',
-            inv.paid_on.strftime('%Y-%m-%d') if inv.paid_on else ''
-        ])
-    
-    csv_content = output.getvalue()
-    output.close()
+    stmt = invoice_export_query(current_user.id, customer_id=customer_id)
     
     filename = f"invoices_{customer.name}_{date.today().strftime('%Y%m%d')}.csv"
-    return Response(
-        content=csv_content,
+    return StreamingResponse(
+        stream_csv(db.get_bind(), stmt, CUSTOMER_INVOICE_COLUMNS),
         media_type="text/csv",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
@@ -1226,7 +1140,9 @@ async def delete_template(
             os.remove(template.template_file_path)
         except Exception:
             pass  # Don't fail if file removal fails
-    
+
+    # Invoices keep their data and fall back to the default layout
+    db.query(Invoice).filter(Invoice.template_id == template.id).update({Invoice.template_id: None}, synchronize_session=False)
     db.delete(template)
     db.commit()
     return {"message": "Template deleted"}
@@ -1327,7 +1243,7 @@ async def create_library_item(
 @app.get("/item-library", response_model=List[LibraryItemOut])
 async def list_library_items(
     q: str | None = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
     current_user: User = Depends(get_current_user)
 ):
     """List all items in the user's library with optional search"""
@@ -1466,15 +1382,17 @@ async def add_sample_library_items(
 async def update_user_onboarding(
     body: UserOnboardingUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    identity: Identity = Depends(get_attached_identity)
 ):
     """Update user onboarding status and business type"""
+    current_user = identity.user
     for k, v in body.model_dump(exclude_unset=True).items():
         setattr(current_user, k, v)
     
     current_user.updated_at = datetime.utcnow()
     db.commit()
     db.refresh(current_user)
+    identity_cache.invalidate(current_user.cognito_sub)
     return current_user
 
 
@@ -1494,11 +1412,10 @@ async def get_user_onboarding_status(
 async def create_business_profile(
     body: BusinessProfileCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    identity: Identity = Depends(get_attached_identity)
 ):
     """Create or update business profile"""
-    # Check if business profile exists
-    bp = db.query(BusinessProfile).filter(BusinessProfile.user_id == current_user.id).first()
+    current_user, bp = identity
     
     if not bp:
         # Create new business profile - only use fields that exist in the model
@@ -1507,7 +1424,7 @@ async def create_business_profile(
         # Filter to only include fields that exist in BusinessProfile model
         valid_fields = {
             'business_name', 'gstin', 'pan', 'address', 'state_code', 'phone', 'email',
-            'turnover_category', 'current_financial_year', 'next_invoice_seq', 'invoice_prefix',
+            'turnover_category', 'current_financial_year', 'invoice_prefix',
             'logo_path', 'signature_path', 'primary_color', 'bank_account_name', 'bank_name',
             'bank_branch', 'bank_account_number', 'bank_ifsc', 'upi_id', 'default_terms',
             'accepts_cash', 'cash_note'
@@ -1525,7 +1442,7 @@ async def create_business_profile(
         # Only update fields that exist in the model
         valid_fields = {
             'business_name', 'gstin', 'pan', 'address', 'state_code', 'phone', 'email',
-            'turnover_category', 'current_financial_year', 'next_invoice_seq', 'invoice_prefix',
+            'turnover_category', 'current_financial_year', 'invoice_prefix',
             'logo_path', 'signature_path', 'primary_color', 'bank_account_name', 'bank_name',
             'bank_branch', 'bank_account_number', 'bank_ifsc', 'upi_id', 'default_terms',
             'accepts_cash', 'cash_note'
@@ -1537,6 +1454,7 @@ async def create_business_profile(
     
     db.commit()
     db.refresh(bp)
+    identity_cache.invalidate(current_user.cognito_sub)
     return bp
 
 
@@ -1544,21 +1462,14 @@ async def create_business_profile(
 async def create_service_template(
     body: ServiceTemplateIn,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    identity: Identity = Depends(get_identity)
 ):
     """Create a new service template"""
+    current_user, bp = identity
     try:
-        print(f"DEBUG: Creating service template for user {current_user.id}")
-        print(f"DEBUG: Request body: {body.model_dump()}")
-        
-        # Get or create business profile
-        bp = db.query(BusinessProfile).filter(BusinessProfile.user_id == current_user.id).first()
         if not bp:
-            print(f"DEBUG: No business profile found for user {current_user.id}")
             raise HTTPException(status_code=400, detail="Business profile not found. Please create business profile first.")
         
-        print(f"DEBUG: Found business profile {bp.id}")
-        
         # Create service template with template_type field
         template_data = body.model_dump()
         template = ServiceTemplate(
@@ -1567,21 +1478,15 @@ async def create_service_template(
             **template_data
         )
         
-        print(f"DEBUG: Created template object: {template}")
-        print(f"DEBUG: Template type: {template.template_type}")
-        
         db.add(template)
         db.commit()
         db.refresh(template)
         
-        print(f"DEBUG: Successfully created template with ID {template.id}")
+        logger.debug("Created service template", extra={"user_id": current_user.id, "template_id": template.id})
         return template
         
     except Exception as e:
-        print(f"ERROR: Failed to create service template: {e}")
-        print(f"ERROR: Exception type: {type(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Failed to create service template", extra={"user_id": current_user.id})
         raise HTTPException(status_code=400, detail=f"Failed to create service template: {str(e)}")
 
 
@@ -1667,11 +1572,10 @@ async def delete_service_template(
 async def generate_service_templates(
     service_ids: List[str],
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    identity: Identity = Depends(get_identity)
 ):
     """Generate service templates from selected service categories"""
-    # Get or create business profile
-    bp = db.query(BusinessProfile).filter(BusinessProfile.user_id == current_user.id).first()
+    current_user, bp = identity
     if not bp:
         raise HTTPException(status_code=400, detail="Business profile not found. Please create business profile first.")
     
@@ -1778,11 +1682,10 @@ async def generate_service_templates(
 async def generate_product_templates(
     product_ids: List[str],
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    identity: Identity = Depends(get_identity)
 ):
     """Generate product templates from selected product categories"""
-    # Get or create business profile
-    bp = db.query(BusinessProfile).filter(BusinessProfile.user_id == current_user.id).first()
+    current_user, bp = identity
     if not bp:
         raise HTTPException(status_code=400, detail="Business profile not found. Please create business profile first.")
     
@@ -1837,11 +1740,11 @@ async def generate_product_templates(
 @app.get("/debug/user-status")
 async def debug_user_status(
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    identity: Identity = Depends(get_identity)
 ):
     """Debug endpoint to check user authentication and business profile"""
+    current_user, bp = identity
     try:
-        bp = db.query(BusinessProfile).filter(BusinessProfile.user_id == current_user.id).first()
         
         return {
             "user_id": current_user.id,
@@ -1893,28 +1796,18 @@ async def search_master_services(
     category: str | None = Query(None, description="Filter by category"),
     business_type: str | None = Query(None, description="Filter by business type"),
     limit: int = Query(10, le=50, description="Maximum number of results"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Search master services with intelligent filtering"""
     # Clean the search query
     q = q.strip()
-    print(f"DEBUG: Search query: {q}, category: {category}, business_type: {business_type}")
-    
-    # First, check if we have any master services at all
-    total_count = db.query(MasterService).count()
-    print(f"DEBUG: Total master services in DB: {total_count}")
     
     query = db.query(MasterService).filter(MasterService.is_active == True)
-    active_count = query.count()
-    print(f"DEBUG: Active master services: {active_count}")
     
     # Simplified search - just search names first
     search_term = f"%{q.lower()}%"
     query = query.filter(func.lower(MasterService.name).like(search_term))
     
-    search_count = query.count()
-    print(f"DEBUG: Services matching search term '{search_term}': {search_count}")
-    
     # Category filter
     if category:
         query = query.filter(func.lower(MasterService.category) == category.lower())
@@ -1932,9 +1825,19 @@ async def search_master_services(
         MasterService.name
     ).limit(limit).all()
     
-    print(f"DEBUG: Final results count: {len(services)}")
-    for service in services:
-        print(f"DEBUG: - {service.name}")
+    if logger.isEnabledFor(logging.DEBUG):
+        # Three extra COUNT queries: only worth running when someone reads the result
+        logger.debug("Master service search", extra={
+            "q": q,
+            "category": category,
+            "business_type": business_type,
+            "total": db.query(MasterService).count(),
+            "active": db.query(MasterService).filter(MasterService.is_active == True).count(),
+            "name_matches": db.query(MasterService).filter(
+                MasterService.is_active == True, func.lower(MasterService.name).like(search_term)
+            ).count(),
+            "results": len(services),
+        })
     
     return services
 
@@ -1950,15 +1853,9 @@ async def get_master_service_categories(db: Session = Depends(get_db)):
 
 
 @app.post("/master-services/{service_id}/use")
-async def increment_service_usage(
-    service_id: int,
-    db: Session = Depends(get_db)
-):
-    """Increment usage count for analytics"""
-    service = db.query(MasterService).filter(MasterService.id == service_id).first()
-    if service:
-        service.usage_count += 1
-        db.commit()
+async def increment_service_usage(service_id: int):
+    """Increment usage count for analytics; written to the database in batches"""
+    usage_counters.add("master_services", service_id)
     return {"message": "Usage recorded"}
 
 
@@ -1969,21 +1866,19 @@ async def get_service_categories(db: Session = Depends(get_db)):
     Now returns both categories AND specific services within each category
     """
     
-    # Get all unique categories from our specific services
-    categories = db.query(MasterService.category).filter(
-        MasterService.is_active == True
-    ).distinct().all()
+    # The 8 most popular active services of every category in one query (was one query per category)
+    ranked = select(
+        MasterService,
+        func.row_number().over(partition_by=MasterService.category, order_by=MasterService.usage_count.desc()).label("rank"),
+        func.min(MasterService.id).over(partition_by=MasterService.category).label("category_order"),
+    ).where(MasterService.is_active == True, MasterService.category.isnot(None)).subquery()
+    popular = aliased(MasterService, ranked)
+    services = db.query(popular).filter(ranked.c.rank <= 8).order_by(ranked.c.category_order, ranked.c.rank).all()
     
     result = {"categories": []}
     
-    for category_tuple in categories:
-        category_name = category_tuple[0]
-        
-        # Get specific services for this category (limit to popular ones for onboarding)
-        specific_services = db.query(MasterService).filter(
-            MasterService.category == category_name,
-            MasterService.is_active == True
-        ).order_by(MasterService.usage_count.desc()).limit(8).all()
+    for category_name, group in groupby(services, key=lambda service: service.category):
+        specific_services = list(group)
         
         if specific_services:
             # Use the first service's data as category defaults
@@ -2024,13 +1919,11 @@ async def search_master_products(
     q: str = Query(..., min_length=1, description="Search query"),
     category: str | None = Query(None, description="Filter by category"),
     limit: int = Query(10, le=50, description="Maximum number of results"),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """Search master products with intelligent filtering"""
     # Clean the search query
     q = q.strip()
-    print(f"DEBUG: Product search query: {q}, category: {category}")
-    
     # Build the query - use the correct field that exists
     query = db.query(HSNCode).filter(
         HSNCode.type == 'HSN',  # Use 'type' field that actually exists
@@ -2046,7 +1939,7 @@ async def search_master_products(
         HSNCode.description
     ).limit(limit).all()
     
-    print(f"DEBUG: Products found: {len(products)}")
+    logger.debug("Master product search", extra={"q": q, "category": category, "results": len(products)})
     
     # Convert to product format
     result = []
@@ -2097,8 +1990,6 @@ async def search_master_data(
     Now prioritizes SPECIFIC services over generic categories
     """
     q = q.strip()
-    print(f"DEBUG: Enhanced search query: {q}, type: {data_type}, category: {category}")
-    
     results = []
     
     # Search services if requested
@@ -2192,7 +2083,7 @@ async def search_master_data(
         x['name'].lower()
     ), reverse=True)[:limit]
     
-    print(f"DEBUG: Unified search results: {len(results)}")
+    logger.debug("Master data search", extra={"q": q, "type": data_type, "category": category, "results": len(results)})
     return results
 
 
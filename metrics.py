@@ -0,0 +1,120 @@
+"""
+Prometheus metrics for GET /metrics.
+
+``MetricsMiddleware`` is a plain ASGI middleware. It wraps ``send``, so
+streamed responses (CSV exports, PDFs) are timed and sized up to their last
+body chunk, which an ``@app.middleware("http")`` function cannot see. Each
+request is labelled with its route template (``/my/invoices/{invoice_id}``),
+never the raw path, so the series count stays bounded. Paths that match no
+route share the ``<unmatched>`` label. The domain counters for invoices,
+PDF renders, HSN searches and cache lookups are incremented where the work
+happens.
+
+With several uvicorn workers, each process only sees its own requests. Set
+``PROMETHEUS_MULTIPROC_DIR`` to an empty directory that all workers share,
+and wipe it on every deploy before the workers start. Each worker then
+writes its samples to memory-mapped files there, and /metrics, whichever
+worker answers, adds them all up. The variable is read when
+``prometheus_client`` is first imported, so it must be in the environment
+or in .env. Without it, /metrics reports the answering worker only, which
+is fine for a single process.
+"""
+import os
+import time
+
+import database  # noqa: F401  (loads .env before prometheus_client reads PROMETHEUS_MULTIPROC_DIR)
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+RENDER_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+HTTP_REQUESTS = Counter("http_requests_total", "Requests handled", ["method", "route", "status"])
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time from request start to last body byte", ["method", "route"],
+    buckets=LATENCY_BUCKETS,
+)
+HTTP_RESPONSE_SIZE = Histogram(
+    "http_response_size_bytes", "Response body size", ["method", "route"], buckets=SIZE_BUCKETS,
+)
+HTTP_IN_PROGRESS = Gauge(
+    "http_requests_in_progress", "Requests being handled", ["method"], multiprocess_mode="livesum",
+)
+
+INVOICES_CREATED = Counter("invoices_created_total", "Invoices created")
+PDF_RENDERS = Counter("pdf_renders_total", "PDF render attempts by outcome", ["result"])
+PDF_RENDER_SECONDS = Histogram("pdf_render_seconds", "Time to render one invoice PDF", buckets=RENDER_BUCKETS)
+HSN_SEARCHES = Counter("hsn_searches_total", "HSN/SAC code searches")
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Cache lookups by cache and result", ["cache", "result"])
+
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    """Count one lookup in ``cache``; the hit ratio is hit / (hit + miss) per cache."""
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def route_label(scope: dict) -> str:
+    route = scope.get("route")  # set by FastAPI once the request is routed
+    return getattr(route, "path", "<unmatched>")
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        method = scope["method"]
+        status = 500  # what the client gets if the app raises before responding
+        size = 0
+
+        async def send_and_measure(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        in_progress = HTTP_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_and_measure)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_progress.dec()
+            route = route_label(scope)
+            HTTP_REQUESTS.labels(method, route, str(status)).inc()
+            HTTP_LATENCY.labels(method, route).observe(elapsed)
+            HTTP_RESPONSE_SIZE.labels(method, route).observe(size)
+
+
+def render_latest() -> bytes:
+    """The text exposition for /metrics, summed over every worker when multiprocess mode is on."""
+    if not PROMETHEUS_MULTIPROC_DIR:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+def mark_worker_exited() -> None:
+    """Drop this worker's live gauges (in-progress requests) from the shared directory."""
+    if PROMETHEUS_MULTIPROC_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
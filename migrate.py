@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Versioned schema migrations.
+
+Each step in ``MIGRATIONS`` runs once per database and is recorded in the
+``schema_version`` table. Steps are idempotent, so they can run safely
+against a database that was patched by hand or by the old scripts in
+``migrations/``. New steps are appended with the next version number and are
+never reordered or edited once released. A new table or index in models.py
+therefore gets its own step; steps 1 and 5 only know the release lists below.
+Columns added later go in an ``_add_columns`` step, which skips the ones that a
+fresh database already got from step 1.
+
+The API no longer touches the schema at import. Its startup hook calls
+``ensure_schema``, which costs one ``max(version)`` query once the database
+is current. In production, a database behind this build stops the worker
+with an error that says to run this CLI. With ``AUTO_MIGRATE`` on (the
+default in development) the worker applies the pending steps itself. On
+Postgres, concurrent runs are serialized with an advisory lock.
+
+    python migrate.py            # apply pending steps
+    python migrate.py --status   # show applied and pending steps
+"""
+import argparse
+import os
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, func, inspect, select
+from sqlalchemy.orm import Session
+
+from database import Base, ENVIRONMENT, engine
+import models  # noqa: F401  (registers the tables on Base)
+
+
+AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "true" if ENVIRONMENT == "development" else "false").lower() == "true"
+ADVISORY_LOCK_ID = 7245001  # arbitrary; shared by every process migrating this database
+
+_metadata = MetaData()
+schema_version = Table(
+    "schema_version",
+    _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False, default=datetime.utcnow),
+)
+
+
+def _columns(conn, table: str) -> set:
+    return {col["name"] for col in inspect(conn).get_columns(table)}
+
+
+def _add_columns(conn, table: str, columns) -> None:
+    existing = _columns(conn, table)
+    for name, ddl in columns:
+        if name not in existing:
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}")
+
+
+# The tables and indexes that existed when steps 1 and 5 were released. The steps
+# create only these, so a table or index added to models.py later needs a new step
+# instead of silently riding along with an old one on databases that have not run it yet.
+RELEASE_TABLES = (
+    "hsn_codes", "master_services", "users", "business_profiles", "customers",
+    "invoice_counters", "invoice_templates", "library_items", "tenant_monthly_rollup",
+    "invoices", "service_templates", "invoice_items", "payments",
+)
+RELEASE_INDEXES = (
+    "ix_hsn_codes_code", "ix_hsn_codes_id",
+    "ix_master_services_id",
+    "ix_users_cognito_sub", "ix_users_email", "ix_users_id",
+    "ix_business_profiles_gstin", "ix_business_profiles_id",
+    "ix_customers_gstin", "ix_customers_id", "ix_customers_user_id_name",
+    "ix_invoice_templates_id",
+    "ix_library_items_id", "ix_library_items_user_id_description",
+    "ix_invoices_id", "ix_invoices_invoice_number", "ix_invoices_user_id_buyer_id",
+    "ix_invoices_user_id_date", "ix_invoices_user_id_status_due_date",
+    "ix_service_templates_id", "ix_service_templates_user_id_is_active_description",
+    "ix_invoice_items_id", "ix_invoice_items_invoice_id",
+    "ix_payments_id", "ix_payments_invoice_id_date",
+)
+
+
+def _model_indexes() -> dict:
+    return {index.name: index for table in Base.metadata.sorted_tables for index in table.indexes}
+
+
+def create_tables(conn):
+    """Create the release tables that do not exist yet, from their definitions in models.py."""
+    Base.metadata.create_all(bind=conn, tables=[Base.metadata.tables[name] for name in RELEASE_TABLES], checkfirst=True)
+
+
+# Columns added to the models after the first SQLite dev databases were created
+LEGACY_SQLITE_COLUMNS = {
+    "invoices": [
+        ("paid_on", "DATE"),
+        ("status", "VARCHAR DEFAULT 'UNPAID'"),
+        ("template_id", "INTEGER"),
+        ("financial_year", "VARCHAR NOT NULL DEFAULT '2024-25'"),
+        ("seller_pan", "VARCHAR"),
+        ("place_of_supply", "VARCHAR"),
+        ("place_of_supply_code", "VARCHAR"),
+        ("reverse_charge", "BOOLEAN DEFAULT 0"),
+        ("ecommerce_gstin", "VARCHAR"),
+        ("export_type", "VARCHAR"),
+        ("signature_path", "VARCHAR"),
+        ("discount", "FLOAT DEFAULT 0.0"),
+        ("taxable_value", "FLOAT DEFAULT 0.0"),
+        ("round_off", "FLOAT DEFAULT 0.0"),
+        ("total_in_words", "VARCHAR"),
+        ("terms_and_conditions", "TEXT"),
+        ("notes", "TEXT"),
+        ("updated_at", "DATETIME"),
+    ],
+    "business_profiles": [
+        ("bank_account_name", "VARCHAR"),
+        ("bank_name", "VARCHAR"),
+        ("bank_branch", "VARCHAR"),
+        ("bank_account_number", "VARCHAR"),
+        ("bank_ifsc", "VARCHAR"),
+        ("upi_id", "VARCHAR"),
+        ("default_terms", "TEXT"),
+        ("accepts_cash", "VARCHAR"),
+        ("cash_note", "TEXT"),
+        ("pan", "VARCHAR"),
+        ("turnover_category", "VARCHAR"),
+        ("current_financial_year", "VARCHAR"),
+        ("invoice_prefix", "VARCHAR"),
+        ("logo_path", "VARCHAR"),
+        ("signature_path", "VARCHAR"),
+        ("primary_color", "VARCHAR"),
+    ],
+    "invoice_items": [
+        ("sac_code", "VARCHAR"),
+        ("unit", "VARCHAR"),
+        ("discount_percent", "FLOAT DEFAULT 0.0"),
+        ("discount_amount", "FLOAT DEFAULT 0.0"),
+        ("taxable_value", "FLOAT DEFAULT 0.0"),
+        ("cgst_rate", "FLOAT DEFAULT 0.0"),
+        ("cgst_amount", "FLOAT DEFAULT 0.0"),
+        ("sgst_rate", "FLOAT DEFAULT 0.0"),
+        ("sgst_amount", "FLOAT DEFAULT 0.0"),
+        ("igst_rate", "FLOAT DEFAULT 0.0"),
+        ("igst_amount", "FLOAT DEFAULT 0.0"),
+        ("total_amount", "FLOAT DEFAULT 0.0"),
+        ("notes", "TEXT"),
+        ("created_at", "DATETIME"),
+        ("updated_at", "DATETIME"),
+    ],
+    "invoice_templates": [
+        ("template_file_path", "VARCHAR"),
+        ("is_default", "BOOLEAN DEFAULT 0"),
+        ("description", "TEXT"),
+        ("created_at", "DATETIME"),
+        ("updated_at", "DATETIME"),
+    ],
+    "users": [
+        ("phone", "VARCHAR"),
+        ("profile_picture", "VARCHAR"),
+        ("onboarding_completed", "BOOLEAN DEFAULT 0"),
+        ("business_type", "VARCHAR"),
+        ("onboarding_step", "VARCHAR DEFAULT 'business_type'"),
+        ("updated_at", "DATETIME"),
+        ("last_login", "DATETIME"),
+    ],
+    "master_services": [
+        ("subcategory", "VARCHAR"),
+        ("business_type", "VARCHAR"),
+        ("keywords", "TEXT"),
+        ("tags", "TEXT"),
+        ("usage_count", "INTEGER DEFAULT 0"),
+        ("created_at", "DATETIME"),
+        ("updated_at", "DATETIME"),
+    ],
+}
+
+
+def add_legacy_sqlite_columns(conn):
+    """Bring pre-GST SQLite dev databases up to the model columns. Postgres was always created from the models."""
+    if conn.dialect.name != "sqlite":
+        return
+    for table, columns in LEGACY_SQLITE_COLUMNS.items():
+        _add_columns(conn, table, columns)
+
+
+def add_service_template_name_and_type(conn):
+    """Formerly migrations/add_template_name.py and add_template_type.py."""
+    _add_columns(conn, "service_templates", [("template_name", "VARCHAR"), ("template_type", "VARCHAR DEFAULT 'service'")])
+    conn.exec_driver_sql("UPDATE service_templates SET template_name = description WHERE template_name IS NULL")
+    conn.exec_driver_sql("UPDATE service_templates SET template_type = 'service' WHERE template_type IS NULL")
+
+
+LEGACY_BACKFILLS = [
+    ("invoices", "financial_year", "financial_year = '2024-25'"),
+    ("business_profiles", "current_financial_year", "current_financial_year = '2024-25'"),
+    ("invoices", "updated_at", "updated_at = created_at"),
+    ("users", "updated_at", "updated_at = created_at"),
+    ("invoice_items", "created_at", "created_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP"),
+    ("business_profiles", "updated_at", "updated_at = CURRENT_TIMESTAMP"),
+]
+
+
+def backfill_legacy_defaults(conn):
+    """Fill the NULLs left in rows that existed before each column was added."""
+    for table, column, assignment in LEGACY_BACKFILLS:
+        if column in _columns(conn, table):
+            conn.exec_driver_sql(f"UPDATE {table} SET {assignment} WHERE {column} IS NULL")
+
+
+def create_missing_indexes(conn):
+    """Release indexes on tables that predate them.
+
+    Plain CREATE INDEX blocks writes to the table while it builds. On a large
+    live Postgres database, run migrations/add_tenant_indexes.py first to
+    build them CONCURRENTLY; this step then finds them in place.
+    """
+    indexes = _model_indexes()
+    for name in RELEASE_INDEXES:
+        indexes[name].create(bind=conn, checkfirst=True)
+
+
+def backfill_monthly_rollups(conn):
+    """Tenants with invoices but no rollup rows (same as ``monthly_rollup.py backfill``)."""
+    from monthly_rollup import backfill
+
+    with Session(bind=conn) as db:
+        backfill(db)
+
+
+# (version, name, step): append only
+MIGRATIONS = [
+    (1, "create tables", create_tables),
+    (2, "add legacy SQLite columns", add_legacy_sqlite_columns),
+    (3, "service template name and type", add_service_template_name_and_type),
+    (4, "backfill legacy defaults", backfill_legacy_defaults),
+    (5, "create missing indexes", create_missing_indexes),
+    (6, "backfill monthly rollups", backfill_monthly_rollups),
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def current_version(conn) -> int:
+    if not inspect(conn).has_table("schema_version"):
+        return 0
+    return conn.execute(select(func.max(schema_version.c.version))).scalar() or 0
+
+
+def applied_versions(conn) -> set:
+    if not inspect(conn).has_table("schema_version"):
+        return set()
+    return set(conn.execute(select(schema_version.c.version)).scalars())
+
+
+def migrate(bind=engine, verbose: bool = True) -> int:
+    """Apply every pending step, each in its own transaction; returns the number applied."""
+    applied = 0
+    with bind.connect() as lock_conn:
+        if lock_conn.dialect.name == "postgresql":
+            lock_conn.exec_driver_sql(f"SELECT pg_advisory_lock({ADVISORY_LOCK_ID})")
+            lock_conn.commit()
+        try:
+            with bind.begin() as conn:
+                _metadata.create_all(bind=conn)
+                done = applied_versions(conn)
+            for version, name, step in MIGRATIONS:
+                if version in done:
+                    continue
+                if verbose:
+                    print(f"Applying {version}: {name}...")
+                with bind.begin() as conn:
+                    step(conn)
+                    conn.execute(schema_version.insert().values(version=version, name=name))
+                applied += 1
+        finally:
+            if lock_conn.dialect.name == "postgresql":
+                lock_conn.exec_driver_sql(f"SELECT pg_advisory_unlock({ADVISORY_LOCK_ID})")
+                lock_conn.commit()
+    return applied
+
+
+def ensure_schema(bind=engine) -> None:
+    """Startup check: return at once if the schema is current, otherwise migrate or refuse to start."""
+    with bind.connect() as conn:
+        version = current_version(conn)
+    if version >= LATEST_VERSION:
+        return
+    if not AUTO_MIGRATE:
+        raise RuntimeError(
+            f"Database schema is at version {version}, this build needs {LATEST_VERSION}. Run `python migrate.py`."
+        )
+    migrate(bind)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply versioned schema migrations")
+    parser.add_argument("--status", action="store_true", help="List applied and pending steps without applying anything")
+    args = parser.parse_args()
+
+    if args.status:
+        with engine.connect() as conn:
+            done = applied_versions(conn)
+        for version, name, _ in MIGRATIONS:
+            print(f"{'applied' if version in done else 'pending':>8}  {version:>3}  {name}")
+        return
+
+    count = migrate(engine)
+    if count:
+        print(f"✅ Applied {count} migrations; schema is at version {LATEST_VERSION}")
+    else:
+        print(f"✅ Schema is up to date (version {LATEST_VERSION})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Create the composite tenant indexes declared in models.py on an existing database.
+
+``python migrate.py`` creates them too, but with a plain ``CREATE INDEX`` that
+blocks writes while it builds. Run this first on a large live database:
+every statement is ``CREATE INDEX IF NOT EXISTS``, so the script can be
+re-run safely. On Postgres the indexes are built ``CONCURRENTLY`` so
+invoices stay writable while they build. The tables are analyzed afterwards
+so the planner starts using them straight away.
+
+    python migrations/add_tenant_indexes.py
+"""
+import sys
+from pathlib import Path
+
+from sqlalchemy import inspect
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database import Base, engine  # noqa: E402  (same URL and .env loading as the API and migrate.py)
+import models  # noqa: E402,F401  (registers the tables on Base)
+
+TENANT_TABLES = ["invoices", "customers", "invoice_items", "payments", "library_items", "service_templates"]
+
+
+def tenant_indexes():
+    """Every non-unique index declared on the tenant tables."""
+    for name in TENANT_TABLES:
+        table = Base.metadata.tables[name]
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            if not index.unique:
+                yield index
+
+
+def run_migration():
+    concurrently = "CONCURRENTLY " if engine.dialect.name == "postgresql" else ""
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        inspector = inspect(conn)
+        for index in tenant_indexes():
+            if index.name in {ix["name"] for ix in inspector.get_indexes(index.table.name)}:
+                print(f"{index.name} already exists. Skipping.")
+                continue
+            columns = ", ".join(column.name for column in index.columns)
+            print(f"Creating {index.name} on {index.table.name} ({columns})...")
+            conn.exec_driver_sql(f"CREATE INDEX {concurrently}IF NOT EXISTS {index.name} ON {index.table.name} ({columns})")
+        for name in TENANT_TABLES:
+            conn.exec_driver_sql(f"ANALYZE {name}")
+    print("✅ Tenant indexes are in place.")
+
+
+if __name__ == "__main__":
+    run_migration()
@@ -1,5 +1,5 @@
 from datetime import datetime, date
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Date, Text, Boolean, UniqueConstraint
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Date, Text, Boolean, Index, UniqueConstraint
 from sqlalchemy.orm import relationship
 
 try:
@@ -52,7 +52,7 @@ class BusinessProfile(Base):
     
     # Invoice Sequence Management
     current_financial_year = Column(String, nullable=True)  # e.g., "2024-25"
-    next_invoice_seq = Column(Integer, default=1)
+    next_invoice_seq = Column(Integer, default=1)  # Deprecated: numbers come from invoice_counters; kept for existing rows
     invoice_prefix = Column(String, nullable=True)  # Custom prefix for invoice numbers
     
     # Branding
@@ -89,6 +89,10 @@ class Customer(Base):
 
     invoices = relationship("Invoice", back_populates="buyer")
 
+    __table_args__ = (
+        Index("ix_customers_user_id_name", "user_id", "name"),  # Customer list, sorted by name
+    )
+
 
 class Invoice(Base):
     __tablename__ = "invoices"
@@ -151,11 +155,40 @@ class Invoice(Base):
     payments = relationship("Payment", back_populates="invoice", cascade="all, delete-orphan")
     
     # Composite unique constraint: invoice_number must be unique per user
+    # (it also serves lookups and sorting by number within a tenant)
     __table_args__ = (
         UniqueConstraint('user_id', 'invoice_number', name='uq_user_invoice_number'),
+        Index("ix_invoices_user_id_date", "user_id", "date"),  # Invoice list/export by date, date ranges
+        Index("ix_invoices_user_id_status_due_date", "user_id", "status", "due_date"),  # Status filter, overdue
+        Index("ix_invoices_user_id_buyer_id", "user_id", "buyer_id"),  # Per-customer lists and exports
     )
 
 
+class InvoiceCounter(Base):
+    __tablename__ = "invoice_counters"
+
+    # One row per tenant per financial year; next_value is the next unallocated sequence number
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    financial_year = Column(String, primary_key=True)  # e.g., "2024-2025"
+    next_value = Column(Integer, nullable=False, default=1)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class TenantMonthlyRollup(Base):
+    __tablename__ = "tenant_monthly_rollup"
+
+    # Per-tenant totals for invoices dated in a month, kept in step with invoice writes
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    month = Column(String, primary_key=True)  # "YYYY-MM" of the invoice date
+    invoiced = Column(Float, nullable=False, default=0.0)  # Sum of invoice totals
+    paid = Column(Float, nullable=False, default=0.0)  # Totals of PAID invoices
+    outstanding = Column(Float, nullable=False, default=0.0)  # Totals of UNPAID / PARTIALLY_PAID invoices
+    cgst = Column(Float, nullable=False, default=0.0)
+    sgst = Column(Float, nullable=False, default=0.0)
+    igst = Column(Float, nullable=False, default=0.0)
+    invoice_count = Column(Integer, nullable=False, default=0)
+
+
 class InvoiceItem(Base):
     __tablename__ = "invoice_items"
 
@@ -201,6 +234,10 @@ class InvoiceItem(Base):
     # Relationships
     invoice = relationship("Invoice", back_populates="items")
 
+    __table_args__ = (
+        Index("ix_invoice_items_invoice_id", "invoice_id"),
+    )
+
 
 class Payment(Base):
     __tablename__ = "payments"
@@ -216,6 +253,10 @@ class Payment(Base):
 
     invoice = relationship("Invoice", back_populates="payments")
 
+    __table_args__ = (
+        Index("ix_payments_invoice_id_date", "invoice_id", "date"),  # Payments of an invoice, newest first
+    )
+
 
 class InvoiceTemplate(Base):
     __tablename__ = "invoice_templates"
@@ -259,6 +300,10 @@ class LibraryItem(Base):
     
     # Relationships
     user = relationship("User", back_populates="library_items")
+
+    __table_args__ = (
+        Index("ix_library_items_user_id_description", "user_id", "description"),
+    )
     
     def __repr__(self):
         return f"<LibraryItem(id={self.id}, description='{self.description}', user_id={self.user_id})>"
@@ -302,6 +347,10 @@ class ServiceTemplate(Base):
     # Relationships
     user = relationship("User", back_populates="service_templates")
     business_profile = relationship("BusinessProfile", back_populates="service_templates")
+
+    __table_args__ = (
+        Index("ix_service_templates_user_id_is_active_description", "user_id", "is_active", "description"),
+    )
     
     def __repr__(self):
         return f"<ServiceTemplate(id={self.id}, description='{self.description}', user_id={self.user_id})>"
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Per-tenant monthly rollup of invoice totals (``tenant_monthly_rollup``).
+
+Handlers that change an invoice take a ``contribution()`` snapshot before the
+change and pass it to ``record_change()`` together with the updated invoice
+before committing. The rollup is then adjusted by the difference in the same
+transaction as the invoice write, using one upsert per affected month.
+
+``rebuild`` recomputes the table from ``invoices`` for backfills and drift
+repair; ``backfill`` only rebuilds tenants that have no rollup rows yet.
+
+    python monthly_rollup.py rebuild [--user-id N]
+    python monthly_rollup.py backfill
+"""
+import argparse
+from datetime import date
+from typing import Optional, Tuple
+
+from sqlalchemy import case, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import Invoice, TenantMonthlyRollup
+
+
+_rollup = TenantMonthlyRollup.__table__
+AMOUNT_COLUMNS = ("invoiced", "paid", "outstanding", "cgst", "sgst", "igst", "invoice_count")
+
+# (user_id, month, {column: amount})
+Contribution = Tuple[int, str, dict]
+
+
+def month_key(value: date) -> str:
+    return value.strftime("%Y-%m")
+
+
+def month_bucket(db: Session, column):
+    """SQL expression formatting a date column as 'YYYY-MM' for the session's dialect."""
+    if db.get_bind().dialect.name == "postgresql":
+        return func.to_char(column, "YYYY-MM")
+    return func.strftime("%Y-%m", column)
+
+
+def contribution(inv: Optional[Invoice]) -> Optional[Contribution]:
+    """What ``inv`` currently adds to its month's rollup row, as plain values."""
+    if inv is None or inv.date is None:
+        return None
+    total = inv.total or 0.0
+    is_paid = inv.status == "PAID"
+    # Mirrors the dashboard's SQL filters, where a NULL status is neither paid nor outstanding
+    is_outstanding = inv.status is not None and not is_paid
+    return (inv.user_id, month_key(inv.date), {
+        "invoiced": total,
+        "paid": total if is_paid else 0.0,
+        "outstanding": total if is_outstanding else 0.0,
+        "cgst": inv.cgst or 0.0,
+        "sgst": inv.sgst or 0.0,
+        "igst": inv.igst or 0.0,
+        "invoice_count": 1,
+    })
+
+
+def record_change(db: Session, before: Optional[Contribution], after: Optional[Invoice]) -> None:
+    """Move the rollup from the ``before`` snapshot to ``after``'s current values, in ``db``'s transaction."""
+    after = contribution(after)
+    if before == after:
+        return
+    if before is not None:
+        _apply(db, before, -1)
+    if after is not None:
+        _apply(db, after, 1)
+
+
+def _apply(db: Session, contrib: Contribution, sign: int) -> None:
+    user_id, month, amounts = contrib
+    values = {col: sign * amounts[col] for col in AMOUNT_COLUMNS}
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    stmt = dialect.insert(_rollup).values(user_id=user_id, month=month, **values)
+    # Increment in SQL so concurrent writers to the same month cannot lose updates
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[_rollup.c.user_id, _rollup.c.month],
+        set_={col: _rollup.c[col] + stmt.excluded[col] for col in AMOUNT_COLUMNS},
+    )
+    db.execute(stmt)
+
+
+def rebuild(db: Session, user_id: Optional[int] = None) -> int:
+    """Recompute rollup rows from invoices (one tenant, or all) and return the number of rows written."""
+    bucket = month_bucket(db, Invoice.date)
+    is_paid = Invoice.status == "PAID"
+    is_outstanding = Invoice.status != "PAID"
+    qry = (
+        select(
+            Invoice.user_id,
+            bucket.label("month"),
+            func.coalesce(func.sum(Invoice.total), 0.0),
+            func.coalesce(func.sum(case((is_paid, Invoice.total), else_=0.0)), 0.0),
+            func.coalesce(func.sum(case((is_outstanding, Invoice.total), else_=0.0)), 0.0),
+            func.coalesce(func.sum(Invoice.cgst), 0.0),
+            func.coalesce(func.sum(Invoice.sgst), 0.0),
+            func.coalesce(func.sum(Invoice.igst), 0.0),
+            func.count(Invoice.id),
+        )
+        .where(Invoice.date.isnot(None))
+        .group_by(Invoice.user_id, bucket)
+    )
+    delete = _rollup.delete()
+    if user_id is not None:
+        qry = qry.where(Invoice.user_id == user_id)
+        delete = delete.where(_rollup.c.user_id == user_id)
+
+    rows = [
+        dict(zip(("user_id", "month") + AMOUNT_COLUMNS, row))
+        for row in db.execute(qry)
+    ]
+    db.execute(delete)
+    if rows:
+        db.execute(_rollup.insert(), rows)
+    db.commit()
+    return len(rows)
+
+
+def backfill(db: Session) -> int:
+    """Rebuild every tenant that has invoices but no rollup rows; returns the number of tenants."""
+    missing = db.execute(
+        select(Invoice.user_id)
+        .where(Invoice.user_id.not_in(select(_rollup.c.user_id)))
+        .distinct()
+    ).scalars().all()
+    for user_id in missing:
+        rebuild(db, user_id)
+    return len(missing)
+
+
+def main():
+    from database import Base, SessionLocal, engine
+
+    parser = argparse.ArgumentParser(description="Maintain the tenant monthly rollup table")
+    parser.add_argument("command", choices=["rebuild", "backfill"])
+    parser.add_argument("--user-id", type=int, default=None, help="Only rebuild this tenant")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            count = rebuild(db, args.user_id)
+            print(f"✅ Rebuilt {count} rollup rows")
+        else:
+            count = backfill(db)
+            print(f"✅ Backfilled rollups for {count} tenants")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Keyset (cursor) pagination helpers.
+
+A cursor records the sort key and direction plus the sort value and id of the
+last row on a page. The next page is then fetched with a plain
+``WHERE (col, id) < (value, last_id)`` style filter, so page N costs the
+same as page 1 regardless of how many rows precede it.
+
+The sort column may be NULL (``Invoice.date``, ``Invoice.total``). NULLs sort
+as the smallest value on every backend, i.e. first ascending and last
+descending, and ``keyset_order`` and ``keyset_filter`` agree on that. The
+column is not wrapped in ``coalesce`` so that its index can still be used.
+"""
+import base64
+import json
+from datetime import date
+from typing import Any, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(sort_by: str, descending: bool, value: Any, row_id: int) -> str:
+    if isinstance(value, date):
+        value = {"date": value.isoformat()}
+    payload = json.dumps([sort_by, "desc" if descending else "asc", value, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str, descending: bool) -> Tuple[Any, int]:
+    """Return ``(value, id)`` from a cursor, rejecting cursors issued for a different ordering."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        cur_sort, cur_dir, value, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if isinstance(value, dict):
+            value = date.fromisoformat(value["date"])
+        row_id = int(row_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cur_sort != sort_by or cur_dir != ("desc" if descending else "asc"):
+        raise HTTPException(status_code=400, detail="Cursor does not match sort_by/sort_dir")
+    return value, row_id
+
+
+def keyset_order(order_col, id_col, descending: bool):
+    """``ORDER BY`` clauses matching ``keyset_filter``."""
+    if descending:
+        return order_col.desc().nulls_last(), id_col.desc()
+    return order_col.asc().nulls_first(), id_col.asc()
+
+
+def keyset_filter(order_col, id_col, after: Tuple[Any, int], descending: bool):
+    """Filter for rows strictly after ``after`` in the order given by ``keyset_order``."""
+    value, row_id = after
+    if descending:
+        if value is None:
+            # Already in the NULL tail
+            return and_(order_col.is_(None), id_col < row_id)
+        return or_(order_col < value, and_(order_col == value, id_col < row_id), order_col.is_(None))
+    if value is None:
+        return or_(order_col.is_not(None), id_col > row_id)
+    return or_(order_col > value, and_(order_col == value, id_col > row_id))
@@ -0,0 +1,192 @@
+"""
+Content-addressed cache for rendered invoice PDFs.
+
+The cache key is a SHA-256 over everything the renderer reads: the invoice
+row, its items, the buyer, the business profile (branding, bank and terms
+fields), the logo/signature files' size and mtime, and
+``pdf_render.RENDERER_VERSION``. Any change to those inputs produces a new
+key, so entries never need explicit invalidation; stale ones simply age out
+of the LRU. The key doubles as the response ``ETag``.
+
+Backends are chosen with ``PDF_CACHE_BACKEND``:
+
+- ``disk`` (default): files under ``PDF_CACHE_DIR``, shared by all workers on
+  the host, evicted least-recently-used once ``PDF_CACHE_MAX_MB`` is exceeded.
+- ``memory``: a per-process LRU with the same size budget.
+- ``none``: caching disabled.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from pdf_render import RENDERER_VERSION
+
+
+PDF_CACHE_BACKEND = os.getenv("PDF_CACHE_BACKEND", "disk").lower()
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", "cache/pdf")
+PDF_CACHE_MAX_BYTES = int(float(os.getenv("PDF_CACHE_MAX_MB", "256")) * 1024 * 1024)
+
+
+def _columns(obj) -> Optional[dict]:
+    if obj is None:
+        return None
+    return {col.key: getattr(obj, col.key) for col in obj.__table__.columns}
+
+
+def _file_stamp(path: Optional[str]):
+    if not path or not os.path.exists(path):
+        return None
+    st = os.stat(path)
+    return [path, st.st_size, st.st_mtime_ns]
+
+
+def pdf_fingerprint(invoice, business_profile=None, template=None) -> str:
+    """Hex digest identifying the PDF that ``render_invoice_pdf`` would produce for these inputs."""
+    payload = {
+        "renderer": RENDERER_VERSION,
+        "invoice": _columns(invoice),
+        "items": sorted((_columns(it) for it in invoice.items), key=lambda it: it["id"] or 0),
+        "buyer": _columns(invoice.buyer),
+        "business_profile": _columns(business_profile),
+        "template": _columns(template),
+        "logo": _file_stamp(business_profile.logo_path if business_profile else None),
+        "signature": _file_stamp(business_profile.signature_path if business_profile else None),
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Whether an ``If-None-Match`` header value matches ``etag`` (weak comparison)."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class MemoryPDFCache:
+    """Per-process LRU bounded by total bytes."""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old)
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+class DiskPDFCache:
+    """Files named by key under ``directory``; mtime is bumped on every hit and used as the LRU clock."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = self._scan_size()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.pdf"
+
+    def _scan_size(self) -> int:
+        if not self.directory.exists():
+            return 0
+        return sum(p.stat().st_size for p in self.directory.glob("*/*.pdf"))
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write then rename so concurrent readers never see a partial file
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        with self._lock:
+            self._size += len(data)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Delete least recently used files until the cache is back under 90% of its budget.
+
+        Other workers write to the same directory, so the running size is
+        re-measured from disk here rather than trusted.
+        """
+        entries = []
+        for p in self.directory.glob("*/*.pdf"):
+            try:
+                st = p.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        for _, size, p in entries:
+            if total <= target:
+                break
+            try:
+                p.unlink()
+            except OSError:
+                continue
+            total -= size
+        self._size = total
+
+
+class NullPDFCache:
+    def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    def put(self, key: str, data: bytes) -> None:
+        pass
+
+
+def _make_cache():
+    if PDF_CACHE_BACKEND == "memory":
+        return MemoryPDFCache(PDF_CACHE_MAX_BYTES)
+    if PDF_CACHE_BACKEND in {"none", "off", "disabled"}:
+        return NullPDFCache()
+    return DiskPDFCache(PDF_CACHE_DIR, PDF_CACHE_MAX_BYTES)
+
+
+pdf_cache = _make_cache()
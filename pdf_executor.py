@@ -0,0 +1,145 @@
+"""
+Off-event-loop PDF rendering.
+
+``render_invoice_pdf`` is CPU-bound, and calling it from an ``async def``
+handler stalls every other request on the worker. ``pdf_executor.render``
+instead copies the invoice, its buyer and items, the business profile and
+template into plain picklable snapshots. It then renders them in a
+``ProcessPoolExecutor``.
+
+At most ``PDF_RENDER_MAX_QUEUE`` renders may be running or waiting at once;
+beyond that ``PDFRenderBusy`` is raised so the API can answer 503 with
+``Retry-After`` instead of building an unbounded backlog.
+
+Settings:
+
+- ``PDF_RENDER_WORKERS``: pool size (default: up to 2, bounded by CPU count);
+  0 renders in a thread instead of a separate process.
+- ``PDF_RENDER_MAX_QUEUE``: in-flight limit (default: 4 per worker).
+- ``PDF_RENDER_START_METHOD``: multiprocessing start method (default: spawn,
+  which is safe to use from a threaded server).
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from types import SimpleNamespace
+from typing import Optional
+
+from metrics import PDF_RENDER_SECONDS, PDF_RENDERS
+from pdf_render import render_invoice_pdf
+
+
+PDF_RENDER_WORKERS = int(os.getenv("PDF_RENDER_WORKERS", str(min(2, os.cpu_count() or 1))))
+PDF_RENDER_MAX_QUEUE = int(os.getenv("PDF_RENDER_MAX_QUEUE", str(max(1, PDF_RENDER_WORKERS) * 4)))
+PDF_RENDER_START_METHOD = os.getenv("PDF_RENDER_START_METHOD", "spawn")
+RETRY_AFTER_SECONDS = 2
+
+
+class PDFRenderBusy(Exception):
+    """Raised when the render queue is full."""
+
+
+def snapshot(obj) -> Optional[SimpleNamespace]:
+    """Plain copy of an ORM row's column values that can be pickled to a worker process."""
+    if obj is None:
+        return None
+    return SimpleNamespace(**{col.key: getattr(obj, col.key) for col in obj.__table__.columns})
+
+
+def invoice_snapshot(invoice) -> SimpleNamespace:
+    snap = snapshot(invoice)
+    snap.buyer = snapshot(invoice.buyer)
+    snap.items = [snapshot(it) for it in invoice.items]
+    return snap
+
+
+class PDFRenderExecutor:
+    def __init__(self, workers: int, max_queue: int, start_method: str):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.start_method = start_method
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._rendered = 0
+        self._rejected = 0
+        self._failed = 0
+        self._render_seconds = 0.0
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        if self.workers <= 0:
+            return None
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(self.start_method),
+                )
+            return self._pool
+
+    async def render(self, invoice, business_profile=None, template=None) -> bytes:
+        with self._lock:
+            if self._in_flight >= self.max_queue:
+                self._rejected += 1
+                PDF_RENDERS.labels("rejected").inc()
+                raise PDFRenderBusy()
+            self._in_flight += 1
+        try:
+            args = (invoice_snapshot(invoice), snapshot(business_profile), snapshot(template))
+            pool = self._get_pool()
+            start = time.perf_counter()
+            try:
+                if pool is None:
+                    pdf_bytes = await asyncio.to_thread(render_invoice_pdf, *args)
+                else:
+                    # Pickled by reference to pdf_render, so worker processes never import this module (or metrics)
+                    pdf_bytes = await asyncio.get_running_loop().run_in_executor(pool, render_invoice_pdf, *args)
+            except BrokenProcessPool:
+                # A worker died; drop the pool so the next render starts a fresh one
+                with self._lock:
+                    if self._pool is pool:
+                        self._pool = None
+                self._failed += 1
+                PDF_RENDERS.labels("failed").inc()
+                raise
+            except Exception:
+                self._failed += 1
+                PDF_RENDERS.labels("failed").inc()
+                raise
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._rendered += 1
+                self._render_seconds += elapsed
+            PDF_RENDERS.labels("rendered").inc()
+            PDF_RENDER_SECONDS.observe(elapsed)
+            return pdf_bytes
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "mode": "process" if self.workers > 0 else "thread",
+                "workers": self.workers,
+                "max_queue": self.max_queue,
+                "in_flight": self._in_flight,
+                "queued": max(0, self._in_flight - max(1, self.workers)),
+                "rendered": self._rendered,
+                "rejected": self._rejected,
+                "failed": self._failed,
+                "avg_render_ms": round(self._render_seconds / self._rendered * 1000, 2) if self._rendered else None,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+pdf_executor = PDFRenderExecutor(PDF_RENDER_WORKERS, PDF_RENDER_MAX_QUEUE, PDF_RENDER_START_METHOD)
@@ -6,12 +6,14 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import mm
 import os
 
+# Bump whenever the rendered output changes so cached PDFs (see pdf_cache.py) are not reused
+RENDERER_VERSION = "1"
+
 def render_invoice_pdf(invoice, business_profile=None, template=None) -> bytes:
     """
     Generate PDF invoice using default design.
     Template support removed for simplicity.
     """
-    print(f"DEBUG: render_invoice_pdf called - using default PDF generation")
     return render_default_pdf(invoice, business_profile)
 
 def render_default_pdf(invoice, business_profile=None) -> bytes:
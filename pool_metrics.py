@@ -0,0 +1,123 @@
+"""
+Connection pool telemetry.
+
+``TimedQueuePool`` and ``TimedAsyncAdaptedQueuePool`` time every checkout:
+the wait for a free connection, plus opening one and the pre-ping when that
+happens. Each pool keeps running totals, a wait-time histogram and a count
+of checkouts that hit ``pool_timeout``. ``pool_snapshot`` adds the live
+gauges (size, checked out, overflow) for the /db/pool/stats endpoint, which
+needs the ``X-Profile-Token`` header (see profiling.py).
+
+Checkouts made while handling a request are also added to that request's
+total, which the middleware in main.py returns as ``X-DB-Pool-Wait``.
+Together these show whether workers are queueing on the database or on
+their own pool, and so how to size one against the other.
+"""
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+
+WAIT_BUCKETS_MS = (1, 5, 10, 50, 100, 500, 1000, 5000)
+
+# Mutable [seconds, checkouts] for the current request; shared with the threads sync handlers run on
+_request_wait: ContextVar[Optional[List[float]]] = ContextVar("db_pool_wait", default=None)
+
+
+def start_request() -> List[float]:
+    """Begin collecting checkout time for the current request; returns the accumulator."""
+    acc = [0.0, 0]
+    _request_wait.set(acc)
+    return acc
+
+
+class PoolWaitStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def record(self, seconds: float, timed_out: bool) -> None:
+        ms = seconds * 1000
+        slot = next((i for i, bound in enumerate(WAIT_BUCKETS_MS) if ms <= bound), len(WAIT_BUCKETS_MS))
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            self.buckets[slot] += 1
+        acc = _request_wait.get()
+        if acc is not None:
+            acc[0] += seconds
+            acc[1] += 1
+
+    def as_dict(self) -> Dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_ms_total": round(self.wait_seconds_total * 1000, 3),
+                "wait_ms_avg": round(self.wait_seconds_total * 1000 / self.checkouts, 3) if self.checkouts else 0.0,
+                "wait_ms_max": round(self.wait_seconds_max * 1000, 3),
+                "wait_ms_buckets": {
+                    **{f"le_{bound}": sum(self.buckets[: i + 1]) for i, bound in enumerate(WAIT_BUCKETS_MS)},
+                    "le_inf": sum(self.buckets),
+                },
+            }
+
+
+class _TimedPool:
+    """Mixin for a ``QueuePool`` subclass; ``recreate`` (engine.dispose) keeps the class and the stats."""
+
+    def __init__(self, *args, wait_stats: Optional[PoolWaitStats] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.wait_stats = wait_stats or PoolWaitStats()
+
+    def recreate(self):
+        pool = super().recreate()
+        pool.wait_stats = self.wait_stats
+        return pool
+
+    def connect(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super().connect()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            self.wait_stats.record(time.perf_counter() - start, timed_out)
+
+
+class TimedQueuePool(_TimedPool, QueuePool):
+    pass
+
+
+class TimedAsyncAdaptedQueuePool(_TimedPool, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_snapshot(engine) -> Dict:
+    """Gauges and checkout timing for ``engine``'s pool (sync or async engine)."""
+    pool = getattr(engine, "sync_engine", engine).pool
+    snapshot = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        snapshot.update({
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": pool._max_overflow,
+            "timeout_seconds": pool.timeout(),
+        })
+    if isinstance(pool, _TimedPool):
+        snapshot.update(pool.wait_stats.as_dict())
+    return snapshot
@@ -0,0 +1,174 @@
+"""
+On-demand profiling of single requests.
+
+A slow request for one tenant in production rarely reproduces locally. With
+``PROFILE_TOKEN`` set, a request that sends ``X-Profile-Token: <token>``
+runs under pyinstrument's sampling profiler (every ``PROFILE_INTERVAL_MS``).
+A browser can add ``?profile=<token>`` instead, but that form is written to
+access logs, so rotate the token after sharing such a link. In async mode
+the profiler follows the request's own task. Time the event loop spends on
+other requests shows up as ``await``, not as this request's work. A sync
+(``def``) handler runs in the threadpool and shows up as one await.
+
+The response carries ``X-Profile-Id``. The run is stored in ``PROFILE_DIR``
+as an HTML flame/timeline view, a ``.pstats`` file (``python -m pstats``,
+snakeviz) and a ``.json`` record of the route, user id, status, duration
+and DB query count and time. GET /debug/profiles lists the newest runs and
+GET /debug/profiles/{id} returns one; both need the same token. Only the
+newest ``PROFILE_KEEP`` runs are kept, and a worker profiles one request at
+a time. A second profiled request meanwhile is served normally with
+``X-Profile-Skipped: busy``.
+
+Without ``PROFILE_TOKEN`` the middleware is not installed, so requests pay
+nothing. With it, a request without the header costs one header lookup.
+"""
+import asyncio
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+from urllib.parse import parse_qs
+
+from pyinstrument import Profiler
+from pyinstrument.renderers import HTMLRenderer, PstatsRenderer
+
+from query_metrics import current_request
+
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "1"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+
+PROFILE_FORMATS = {"html": "text/html", "pstats": "application/octet-stream"}
+_ID_RE = re.compile(r"^[0-9]{8}T[0-9]{12}-[0-9a-f]{8}$")
+
+logger = logging.getLogger(__name__)
+
+
+class ProfileRun:
+    __slots__ = ("id", "user_id")
+
+    def __init__(self):
+        self.id = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{secrets.token_hex(4)}"  # sorts by start time
+        self.user_id: Optional[int] = None
+
+
+_active: ContextVar[Optional[ProfileRun]] = ContextVar("profile_run", default=None)
+_busy = threading.Lock()
+
+
+def authorized(token: Optional[str]) -> bool:
+    return bool(PROFILE_TOKEN) and bool(token) and secrets.compare_digest(token.encode(), PROFILE_TOKEN.encode())
+
+
+def tag_user(user_id: int) -> None:
+    """Record the signed-in user on the profile of the current request, if it is being profiled."""
+    run = _active.get()
+    if run is not None:
+        run.user_id = user_id
+
+
+def _requested_token(scope: dict) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"x-profile-token":
+            return value.decode("latin-1")
+    query = scope.get("query_string", b"")
+    if b"profile=" in query:
+        return parse_qs(query.decode("latin-1")).get("profile", [None])[0]
+    return None
+
+
+def save_profile(run: ProfileRun, profiler: Profiler, record: dict) -> None:
+    directory = Path(PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / f"{run.id}.html").write_text(profiler.output(HTMLRenderer()))
+    # PstatsRenderer returns the marshalled stats as a surrogate-escaped str
+    (directory / f"{run.id}.pstats").write_bytes(profiler.output(PstatsRenderer()).encode("utf-8", "surrogateescape"))
+    (directory / f"{run.id}.json").write_text(json.dumps(record))
+    for stale in sorted(directory.glob("*.json"), reverse=True)[PROFILE_KEEP:]:
+        for suffix in (".json", ".html", ".pstats"):
+            stale.with_suffix(suffix).unlink(missing_ok=True)
+
+
+def recent_profiles(limit: int = 50) -> List[dict]:
+    """Records of the newest stored runs, newest first."""
+    directory = Path(PROFILE_DIR)
+    if not directory.exists():
+        return []
+    return [json.loads(path.read_text()) for path in sorted(directory.glob("*.json"), reverse=True)[:limit]]
+
+
+def profile_path(profile_id: str, fmt: str) -> Optional[Path]:
+    if not _ID_RE.match(profile_id) or fmt not in PROFILE_FORMATS:
+        return None
+    path = Path(PROFILE_DIR) / f"{profile_id}.{fmt}"
+    return path if path.exists() else None
+
+
+class ProfilerMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        # Fetching stored profiles sends the token too; profiling those would only evict real runs
+        if scope["type"] != "http" or scope["path"].startswith("/debug/profiles") or not authorized(_requested_token(scope)):
+            return await self.app(scope, receive, send)
+        if not _busy.acquire(blocking=False):
+            return await self.app(scope, receive, _with_header(send, b"x-profile-skipped", b"busy"))
+
+        run = ProfileRun()
+        status = 500
+
+        async def send_and_record_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        reset = _active.set(run)
+        profiler = Profiler(interval=PROFILE_INTERVAL_MS / 1000, async_mode="enabled")
+        start = time.perf_counter()
+        profiler.start()
+        try:
+            await self.app(scope, receive, _with_header(send_and_record_status, b"x-profile-id", run.id.encode()))
+        finally:
+            profiler.stop()
+            elapsed = time.perf_counter() - start
+            _active.reset(reset)
+            queries = current_request()
+            route = scope.get("route")  # set by FastAPI once the request is routed
+            record = {
+                "id": run.id,
+                "method": scope["method"],
+                "route": getattr(route, "path", scope["path"]),
+                "path": scope["path"],
+                "user_id": run.user_id,
+                "status": status,
+                "duration_ms": round(elapsed * 1000, 2),
+                "db_queries": queries.count if queries is not None else None,
+                "db_ms": round(queries.seconds * 1000, 2) if queries is not None else None,
+            }
+            try:
+                await asyncio.to_thread(save_profile, run, profiler, record)
+                logger.info("Request profiled", extra=record)
+            except Exception:
+                logger.exception("Failed to store request profile", extra={"profile_id": run.id})
+            finally:
+                _busy.release()
+
+
+def _with_header(send, name: bytes, value: bytes):
+    async def send_with_header(message):
+        if message["type"] == "http.response.start":
+            message = {**message, "headers": [*message.get("headers", []), (name, value)]}
+        await send(message)
+
+    return send_with_header
@@ -0,0 +1,162 @@
+"""
+Per-request query counting and a slow-query log.
+
+``instrument`` hooks an engine's ``before/after_cursor_execute`` events. Each
+statement run while handling a request is added to that request's count and
+database time, which the middleware in main.py returns as ``X-DB-Queries``
+and ``X-DB-Time`` (ms). A statement slower than ``SLOW_QUERY_MS`` is logged
+with the route that ran it. It is also aggregated by normalised statement
+(literals and parameter lists collapsed to ``?``) for /db/queries/slow,
+which needs the ``X-Profile-Token`` header (see profiling.py).
+
+``assert_max_queries`` is for tests and scripts. It counts every statement
+run inside the block and, when the count is over budget, fails with the
+statements grouped, so an N+1 shows up as one statement repeated N times::
+
+    with assert_max_queries(3, "GET /invoices"):
+        client.get("/invoices")
+"""
+import logging
+import os
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from sqlalchemy import event
+
+
+logger = logging.getLogger(__name__)
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+SLOW_QUERY_MAX_STATEMENTS = 500
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_LIST_RE = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize(statement: str) -> str:
+    """``statement`` with literals replaced by ``?``, expanded IN lists collapsed and whitespace squeezed."""
+    statement = _STRING_RE.sub("?", statement)
+    statement = _NUMBER_RE.sub("?", statement)
+    statement = _LIST_RE.sub("(?...)", statement)
+    return _SPACE_RE.sub(" ", statement).strip()
+
+
+class RequestQueries:
+    __slots__ = ("count", "seconds", "scope")
+
+    def __init__(self, scope: Optional[dict]):
+        self.count = 0
+        self.seconds = 0.0
+        self.scope = scope
+
+    @property
+    def route(self) -> Optional[str]:
+        if self.scope is None:
+            return None
+        route = self.scope.get("route")  # set by FastAPI once the request is routed
+        return f"{self.scope.get('method')} {getattr(route, 'path', self.scope.get('path'))}"
+
+
+_request: ContextVar[Optional[RequestQueries]] = ContextVar("db_queries", default=None)
+_captures: List[list] = []
+
+
+def start_request(scope: Optional[dict] = None) -> RequestQueries:
+    """Begin counting statements for the current request; returns the accumulator."""
+    acc = RequestQueries(scope)
+    _request.set(acc)
+    return acc
+
+
+def current_request() -> Optional[RequestQueries]:
+    """The accumulator of the request being handled, or None outside a request."""
+    return _request.get()
+
+
+class SlowQueryLog:
+    def __init__(self, threshold_ms: float, max_statements: int):
+        self.threshold_ms = threshold_ms
+        self.max_statements = max_statements
+        self._entries: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def record(self, statement: str, seconds: float, route: Optional[str]) -> None:
+        ms = seconds * 1000
+        if ms < self.threshold_ms:
+            return
+        normalized = normalize(statement)
+        logger.warning("Slow query", extra={"ms": round(ms, 1), "route": route or "background", "statement": normalized})
+        key = (route, normalized)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= self.max_statements:
+                    return
+                entry = self._entries[key] = [0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += ms
+            entry[2] = max(entry[2], ms)
+
+    def top(self, limit: int = 50) -> List[dict]:
+        with self._lock:
+            items = sorted(self._entries.items(), key=lambda kv: kv[1][1], reverse=True)[:limit]
+        return [
+            {"route": route, "statement": statement, "count": count, "total_ms": round(total, 1), "max_ms": round(worst, 1)}
+            for (route, statement), (count, total, worst) in items
+        ]
+
+
+slow_query_log = SlowQueryLog(SLOW_QUERY_MS, SLOW_QUERY_MAX_STATEMENTS)
+
+
+def instrument(engine) -> None:
+    """Count and time every statement ``engine`` runs (sync or async engine)."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        seconds = time.perf_counter() - conn.info["query_started"].pop()
+        acc = _request.get()
+        if acc is not None:
+            acc.count += 1
+            acc.seconds += seconds
+        for captured in _captures:
+            captured.append(normalize(statement))
+        slow_query_log.record(statement, seconds, acc.route if acc is not None else None)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def drop_timer(context):
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+
+@contextmanager
+def capture_queries():
+    """Collect the normalised text of every statement run inside the block, on any instrumented engine."""
+    captured: List[str] = []
+    _captures.append(captured)
+    try:
+        yield captured
+    finally:
+        _captures.remove(captured)
+
+
+@contextmanager
+def assert_max_queries(limit: int, label: str = "block"):
+    with capture_queries() as captured:
+        yield captured
+    if len(captured) > limit:
+        detail = "\n".join(f"  {n}x {statement}" for statement, n in Counter(captured).most_common())
+        raise AssertionError(f"{label} ran {len(captured)} queries, budget is {limit}:\n{detail}")
@@ -1,14 +1,22 @@
-from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, NamedTuple
 
 import httpx
-from jose import jwt
+from jose import jwk, jwt
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 import os
 
-from database import get_db
-from models import User
+from database import SessionLocal, get_db
+from identity_cache import identity_cache
+from metrics import record_cache_lookup
+from profiling import tag_user
+from models import BusinessProfile, User
 from sqlalchemy.orm import Session
 from dotenv import load_dotenv, find_dotenv
 from pathlib import Path
@@ -20,6 +28,7 @@ load_dotenv(find_dotenv(), override=False)
 backend_env_path = Path(__file__).resolve().parent / ".env"
 load_dotenv(backend_env_path, override=False)
 
+logger = logging.getLogger(__name__)
 
 COGNITO_REGION = os.getenv("COGNITO_REGION")
 COGNITO_USER_POOL_ID = os.getenv("COGNITO_USER_POOL_ID")
@@ -32,58 +41,127 @@ if not (COGNITO_REGION and COGNITO_USER_POOL_ID and COGNITO_APP_CLIENT_ID) and n
 ISSUER = f"https://cognito-idp.{COGNITO_REGION}.amazonaws.com/{COGNITO_USER_POOL_ID}"
 JWKS_URL = f"{ISSUER}/.well-known/jwks.json"
 
-_jwks_cache: Dict[str, Any] = {"keys": None, "ts": None}
+JWKS_TTL_SECONDS = 12 * 3600
+# A token signed with an unknown kid forces a refetch (key rotation), but no more often than this
+JWKS_MIN_REFRESH_SECONDS = 60
+TOKEN_CACHE_TTL_SECONDS = int(os.getenv("TOKEN_CACHE_TTL_SECONDS", "300"))
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+
+
+class JWKSCache:
+    """Signing keys (with their algorithm) by kid, refreshed by a single in-flight fetch.
+
+    Once keys are loaded, an expired set keeps being served while one
+    background task refetches it, so a refresh never blocks requests or
+    fans out into one HTTP call per concurrent request.
+    """
+
+    def __init__(self, url: str):
+        self.url = url
+        self.keys: Dict[str, Any] = {}
+        self.fetched_at: Optional[float] = None
+        self._refresh: Optional[asyncio.Task] = None
+
+    async def _fetch(self) -> None:
+        try:
+            async with httpx.AsyncClient(timeout=10) as client:
+                resp = await client.get(self.url)
+                resp.raise_for_status()
+                data = resp.json()
+            self.keys = {
+                k["kid"]: (jwk.construct(k, k.get("alg", "RS256")), k.get("alg", "RS256"))
+                for k in data.get("keys", [])
+                if k.get("kid")
+            }
+            self.fetched_at = time.monotonic()
+        finally:
+            self._refresh = None
+
+    def _start_refresh(self) -> asyncio.Task:
+        if self._refresh is None:
+            self._refresh = asyncio.create_task(self._fetch())
+            self._refresh.add_done_callback(_log_refresh_failure)
+        return self._refresh
+
+    async def get_key(self, kid: Optional[str]):
+        age = time.monotonic() - self.fetched_at if self.fetched_at is not None else None
+        if age is None:
+            await self._start_refresh()
+        elif kid not in self.keys and age >= JWKS_MIN_REFRESH_SECONDS:
+            await self._start_refresh()
+        elif age >= JWKS_TTL_SECONDS:
+            self._start_refresh()
+        return self.keys.get(kid)
+
+
+def _log_refresh_failure(task: asyncio.Task) -> None:
+    # Retrieving the exception also stops asyncio warning about background refreshes nobody awaited
+    if not task.cancelled() and task.exception() is not None:
+        logger.warning("JWKS refresh failed", exc_info=task.exception())
+
+
+class VerifiedTokenCache:
+    """Decoded claims of recently verified tokens, keyed by the token's SHA-256.
+
+    An entry lives for ``TOKEN_CACHE_TTL_SECONDS`` but never past the
+    token's own ``exp``; the oldest entries are evicted beyond ``max_entries``.
+    """
+
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    @staticmethod
+    def key(token: str) -> str:
+        return hashlib.sha256(token.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        claims, expires_at = entry
+        if time.time() >= expires_at:
+            self._entries.pop(key, None)
+            return None
+        return claims
+
+    def put(self, key: str, claims: Dict[str, Any]) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        if isinstance(claims.get("exp"), (int, float)):
+            expires_at = min(expires_at, claims["exp"])
+        self._entries[key] = (claims, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+jwks_cache = JWKSCache(JWKS_URL)
+verified_tokens = VerifiedTokenCache(TOKEN_CACHE_TTL_SECONDS, TOKEN_CACHE_MAX_ENTRIES)
+
+
+async def verify_token(token: str) -> Dict[str, Any]:
+    """Claims of a valid Cognito id/access token, from the cache when this token was verified recently."""
+    cache_key = verified_tokens.key(token)
+    claims = verified_tokens.get(cache_key)
+    record_cache_lookup("verified_token", claims is not None)
+    if claims is not None:
+        return claims
 
-
-async def get_jwks() -> Dict[str, Any]:
-    now = datetime.utcnow()
-    if _jwks_cache["keys"] and _jwks_cache["ts"] and now - _jwks_cache["ts"] < timedelta(hours=12):
-        return _jwks_cache["keys"]
-    async with httpx.AsyncClient(timeout=10) as client:
-        resp = await client.get(JWKS_URL)
-        resp.raise_for_status()
-        data = resp.json()
-        _jwks_cache["keys"] = data
-        _jwks_cache["ts"] = now
-        return data
-
-
-bearer_scheme = HTTPBearer(auto_error=False)
-
-
-async def get_current_user(
-    creds: HTTPAuthorizationCredentials = Depends(bearer_scheme),
-    db: Session = Depends(get_db),
-):
-    # Local/dev bypass to keep working when Cognito is unreachable
-    if DEV_AUTH_BYPASS:
-        user = db.query(User).filter(User.cognito_sub == "dev-sub").first()
-        if not user:
-            user = User(cognito_sub="dev-sub", email="dev@example.com", full_name="Dev User")
-            db.add(user)
-            db.commit()
-            db.refresh(user)
-        return user
-
-    if not creds or creds.scheme.lower() != "bearer":
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
-
-    token = creds.credentials
-    unverified = jwt.get_unverified_header(token)
-    kid = unverified.get("kid")
-    jwks = await get_jwks()
-    key = None
-    for k in jwks.get("keys", []):
-        if k.get("kid") == kid:
-            key = k
-            break
-    if key is None:
+    try:
+        kid = jwt.get_unverified_header(token).get("kid")
+    except Exception as e:
+        raise HTTPException(status_code=401, detail=f"Token invalid: {str(e)}")
+    signing_key = await jwks_cache.get_key(kid)
+    if signing_key is None:
         raise HTTPException(status_code=401, detail="Invalid token key")
+    key, alg = signing_key
 
     try:
-        decoded = jwt.decode(
+        claims = jwt.decode(
             token,
             key,
+            algorithms=[alg],
             audience=COGNITO_APP_CLIENT_ID,
             issuer=ISSUER,
             options={"verify_at_hash": False},
@@ -92,18 +170,69 @@ async def get_current_user(
         raise HTTPException(status_code=401, detail=f"Token invalid: {str(e)}")
 
     # Ensure token_use is id or access
-    token_use = decoded.get("token_use")
-    if token_use not in {"id", "access"}:
+    if claims.get("token_use") not in {"id", "access"}:
         raise HTTPException(status_code=401, detail="Invalid token use")
 
-    sub = decoded.get("sub")
-    email = decoded.get("email")
-    name = decoded.get("name") or decoded.get("cognito:username")
-
-    user = db.query(User).filter(User.cognito_sub == sub).first()
-    if not user:
-        user = User(cognito_sub=sub, email=email, full_name=name)
-        db.add(user)
-        db.commit()
-        db.refresh(user)
-    return user
+    verified_tokens.put(cache_key, claims)
+    return claims
+
+
+bearer_scheme = HTTPBearer(auto_error=False)
+
+
+class Identity(NamedTuple):
+    user: User
+    business_profile: Optional[BusinessProfile]
+
+
+async def get_identity(creds: HTTPAuthorizationCredentials = Depends(bearer_scheme)) -> Identity:
+    """The signed-in user and their business profile (None until one is created) as detached copies.
+
+    Reading them needs no session. A handler that changes either row uses
+    ``get_attached_identity`` instead.
+    """
+    # Local/dev bypass to keep working when Cognito is unreachable
+    if DEV_AUTH_BYPASS:
+        sub, email, name = "dev-sub", "dev@example.com", "Dev User"
+    else:
+        if not creds or creds.scheme.lower() != "bearer":
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Missing token")
+
+        decoded = await verify_token(creds.credentials)
+        sub = decoded.get("sub")
+        email = decoded.get("email")
+        name = decoded.get("name") or decoded.get("cognito:username")
+
+    cached = identity_cache.get(sub)
+    record_cache_lookup("identity", cached is not None and cached[1] is not None)
+    if cached is None or cached[1] is None:
+        # A sync lookup (and the insert for a new user) would hold the event loop for the round trip
+        cached = await run_in_threadpool(_load_identity, sub, email, name)
+    user, bp = (identity_cache.copy(obj) for obj in cached)
+    tag_user(user.id)
+    return Identity(user, bp)
+
+
+def get_attached_identity(identity: Identity = Depends(get_identity), db: Session = Depends(get_db)) -> Identity:
+    """``get_identity`` reloaded in the request's sync session, for handlers that modify and commit the rows"""
+    return Identity(*(identity_cache.reload(db, obj) for obj in identity))
+
+
+def _load_identity(sub: str, email: Optional[str], name: Optional[str]):
+    """Fetch (creating the user if new) and cache the rows on a session of their own.
+
+    Runs in the threadpool; the connection goes straight back to the pool.
+    """
+    with SessionLocal() as lookup:
+        user = lookup.query(User).filter(User.cognito_sub == sub).first()
+        if not user:
+            user = User(cognito_sub=sub, email=email, full_name=name)
+            lookup.add(user)
+            lookup.commit()
+            lookup.refresh(user)
+        bp = lookup.query(BusinessProfile).filter(BusinessProfile.user_id == user.id).first()
+        return identity_cache.put(user, bp)
+
+
+async def get_current_user(identity: Identity = Depends(get_identity)) -> User:
+    return identity.user
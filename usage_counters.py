@@ -0,0 +1,117 @@
+"""
+Write-behind ``usage_count`` increments for HSN codes and master services.
+
+The /hsn/{id}/use and /master-services/{id}/use pings used to load the row,
+bump ``usage_count`` in Python and commit, one transaction per click. Popular
+rows became a lock hotspot, and two concurrent read-modify-writes could lose
+an increment. ``usage_counters.add`` now only adds to a per-worker dict. A
+background thread flushes it every ``USAGE_FLUSH_INTERVAL_SECONDS`` (sooner
+once ``USAGE_MAX_PENDING`` distinct rows are waiting). Each table gets one
+batched ``UPDATE ... SET usage_count = usage_count + :n`` in a single
+transaction. The increment is applied by the database, so nothing is lost
+between workers, and a failed flush puts its counts back for the next one.
+
+``updated_at`` is left alone: a popularity bump is not an edit, and touching
+it would make the HSN search index rebuild after every flush. The shutdown
+hook stops the thread and flushes whatever is left.
+"""
+import logging
+import os
+import threading
+from collections import Counter
+from typing import Dict
+
+from sqlalchemy import bindparam, func, update
+
+from database import engine
+from models import HSNCode, MasterService
+
+
+logger = logging.getLogger(__name__)
+
+USAGE_FLUSH_INTERVAL_SECONDS = float(os.getenv("USAGE_FLUSH_INTERVAL_SECONDS", "5"))
+USAGE_MAX_PENDING = 5000
+
+TABLES = {"hsn_codes": HSNCode.__table__, "master_services": MasterService.__table__}
+
+
+def _increment_statement(table):
+    return (
+        update(table)
+        .where(table.c.id == bindparam("row_id"))
+        .values(usage_count=func.coalesce(table.c.usage_count, 0) + bindparam("n"), updated_at=table.c.updated_at)
+    )
+
+
+class UsageCounters:
+    def __init__(self, bind, flush_interval: float, max_pending: int):
+        self.bind = bind
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[str, Counter] = {name: Counter() for name in TABLES}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+
+    def add(self, table: str, row_id: int, count: int = 1) -> None:
+        with self._lock:
+            pending = self._pending[table]
+            pending[row_id] += count
+            full = sum(len(c) for c in self._pending.values()) >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def pending(self) -> int:
+        with self._lock:
+            return sum(sum(c.values()) for c in self._pending.values())
+
+    def flush(self) -> int:
+        """Write every pending increment; returns the number of rows updated."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {name: Counter() for name in TABLES}
+            if not any(batch.values()):
+                return 0
+            try:
+                with self.bind.begin() as conn:
+                    for name, counts in batch.items():
+                        if counts:
+                            conn.execute(
+                                _increment_statement(TABLES[name]),
+                                [{"row_id": row_id, "n": n} for row_id, n in counts.items()],
+                            )
+            except Exception:
+                with self._lock:
+                    for name, counts in batch.items():
+                        self._pending[name].update(counts)
+                raise
+            return sum(len(c) for c in batch.values())
+
+    def _run(self) -> None:
+        while not self._stopping:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.warning("Usage counter flush failed, will retry", exc_info=True)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="usage-counters", daemon=True)
+            self._thread.start()
+
+    def shutdown(self) -> None:
+        """Stop the flusher and write what is still pending."""
+        if self._thread is not None:
+            self._stopping = True
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+
+usage_counters = UsageCounters(engine, USAGE_FLUSH_INTERVAL_SECONDS, USAGE_MAX_PENDING)